@@ -1,7 +1,6 @@
 """Given a Maven project, expand its pom twice:
 first with undeclared used dependencies, second expand SoftVers with ranges."""
 import argparse
-import os.path
 import subprocess
 from pathlib import Path
 import shutil
@@ -11,6 +10,7 @@ from lxml import etree as ET
 
 import core
 from core import get_available_versions, namespace, dependencies_are_equal, get_text_of_child, GAV
+from core.range_converter import convert_to_range
 
 RANGE_CONVERSION_SCRIPT = Path(__file__).parent.resolve() / "range_converter.py"
 SERVER_URL = "http://127.0.0.1:5000"
@@ -61,14 +61,22 @@ def get_import_gavs(pom: ET.Element, properties: dict) -> list[GAV]:
     return gavs
 
 
-def convert_compat_list_to_range(g: str, a: str, compatible_versions: list[str], use_local=False):
+def convert_compat_list_to_range_with_jython(available_versions: list[str], compatible_versions: list[str]) -> str:
     """Calls the range converter which uses Maven's ComparableVersion via Jython."""
-    available_versions = get_available_versions(g, a, use_remote=use_local)
     # Need to call range converter via subprocess as it uses a different python environment (Python 2)
     output = subprocess.run(["jython", RANGE_CONVERSION_SCRIPT, "-a"] + available_versions +
                             ["-c"] + compatible_versions, stdout=subprocess.PIPE)
     print(output)
-    return output.stdout
+    return output.stdout.decode('utf-8')
+
+
+def convert_compat_list_to_range(g: str, a: str, compatible_versions: list[str], use_local=False, use_jython=False):
+    """Converts the compatible versions into a Maven range spec using the in-process port of Maven's
+    ComparableVersion, or the Jython range converter if use_jython is set."""
+    available_versions = get_available_versions(g, a, use_remote=use_local)
+    if use_jython:
+        return convert_compat_list_to_range_with_jython(available_versions, compatible_versions)
+    return convert_to_range(compatible_versions, available_versions)
 
 
 def is_softver(v: str) -> bool:
@@ -157,17 +165,48 @@ def replace_dep(soft_dep: ET.Element, range: str, pom: ET.Element, properties: d
 
 def get_compatible_version_list(g: str, a: str, v: str):
     """Query server for, and return, the pre-calculated compatible versions of GAV"""
+    compatible_versions, _ = get_compatible_version_list_and_range(g, a, v)
+    return compatible_versions
+
+
+def get_compatible_version_list_and_range(g: str, a: str, v: str) -> tuple[list[str] | None, str | None]:
+    """Query server for, and return, the pre-calculated compatible versions of GAV and their range if the server
+    has precomputed it"""
     query = f"{SERVER_URL}/compatibilities/{g}:{a}:{v}"
     response = requests.get(query)
     if response.status_code == 200:
-        return response.json()['compatible_versions']
+        return response.json()['compatible_versions'], response.json().get('range')
+    elif response.status_code == 202:
+        # The server has no mapping yet and queued its generation
+        print(f"Compatible versions of {g}:{a}:{v} are being generated (job {response.json().get('job_id')})")
+        return None, None
     else:
-        return None
+        return None, None
 
 
-def get_compatible_version_range(dep: ET.Element, properties: dict, use_local=False):
-    """Given a <dependency>-element, query the server for the list of compatible versions, convert the list
-    into a valid Maven range spec and return it."""
+def get_compatible_version_lists(gavs: list[str]) -> tuple[dict[str, list[str] | None], dict[str, str | None]]:
+    """Query server for, and return, the pre-calculated compatible versions of all given GAVs in a single request,
+    together with the ranges the server precomputed for them. If the batch request fails (e.g. a server without the
+    batch endpoint), the GAVs are looked up one by one instead"""
+    if not gavs:
+        return {}, {}
+    query = f"{SERVER_URL}/compatibilities"
+    response = requests.post(query, json={'gavs': gavs})
+    if response.status_code == 200:
+        jobs = response.json().get('jobs', {})
+        if jobs:
+            print(f"Compatible versions of {len(jobs)} GAVs are being generated: {sorted(jobs)}")
+        return response.json()['compatibilities'], response.json().get('ranges', {})
+
+    print(f"Batch lookup of compatible versions failed with status {response.status_code}, looking up each GAV")
+    compatibilities, ranges = {}, {}
+    for gav in gavs:
+        compatibilities[gav], ranges[gav] = get_compatible_version_list_and_range(*gav.split(":"))
+    return compatibilities, ranges
+
+
+def get_dependency_gav(dep: ET.Element, properties: dict) -> tuple[str, str, str] | None:
+    """Given a <dependency>-element, return its (groupId, artifactId, version) with the version property resolved."""
     g = get_text_of_child(dep, "groupId")
     a = get_text_of_child(dep, "artifactId")
     v = get_text_of_child(dep, "version")
@@ -175,10 +214,25 @@ def get_compatible_version_range(dep: ET.Element, properties: dict, use_local=Fa
         v = properties.get(v, "")
     if not v:
         return None
-    compatible_versions = get_compatible_version_list(g, a, v)
+    return g, a, v
+
+
+def get_compatible_version_range(dep: ET.Element, properties: dict, use_local=False, compatible_versions=None,
+                                 range=None, use_jython=False):
+    """Given a <dependency>-element, query the server for the list of compatible versions, convert the list
+    into a valid Maven range spec and return it. The query is skipped if compatible_versions is already given,
+    and the conversion is skipped if the server precomputed the range."""
+    gav = get_dependency_gav(dep, properties)
+    if not gav:
+        return None
+    g, a, v = gav
+    if compatible_versions is None:
+        compatible_versions, range = get_compatible_version_list_and_range(g, a, v)
     if not compatible_versions:
         return None
-    return convert_compat_list_to_range(g, a, compatible_versions, use_local=use_local).decode('utf-8')
+    if range:
+        return range
+    return convert_compat_list_to_range(g, a, compatible_versions, use_local=use_local, use_jython=use_jython)
 
 
 def get_softver_deps(pom: ET.Element, effective_pom: ET.Element) -> (list[ET.Element], dict):
@@ -199,14 +253,14 @@ def get_softver_deps(pom: ET.Element, effective_pom: ET.Element) -> (list[ET.Ele
     return softvers, properties
 
 
-def replace_softvers(pom: ET.Element, effective_pom: ET.Element, write_to=None, use_local=False):
+def replace_softvers(pom: ET.Element, effective_pom: ET.Element, write_to=None, use_local=False, use_jython=False):
     """Replaces all declared soft version constraints with their compatible ranges."""
     soft_deps, properties = get_softver_deps(pom, effective_pom)
     num_replaced = 0
+    replaceable_deps = []
     for dep in soft_deps:
         g = get_text_of_child(dep, "groupId")
         a = get_text_of_child(dep, "artifactId")
-        v = get_text_of_child(dep, "version")
         if a == "plexus-utils":
             # Do not replace plexus-utils due to maven plugins relying on it
             continue
@@ -216,8 +270,24 @@ def replace_softvers(pom: ET.Element, effective_pom: ET.Element, write_to=None,
         if g == "org.apache.velocity" and a == "velocity":
             # Do not replace velocity due to maven plugins relying on it
             continue
+        gav = get_dependency_gav(dep, properties)
+        if gav:
+            replaceable_deps.append((dep, ":".join(gav)))
+
+    # Resolve the compatible versions of all soft dependencies with a single request
+    compatibilities, ranges = get_compatible_version_lists(sorted({gav for _, gav in replaceable_deps}))
+
+    for dep, gav in replaceable_deps:
+        g = get_text_of_child(dep, "groupId")
+        a = get_text_of_child(dep, "artifactId")
+        v = get_text_of_child(dep, "version")
+        compatible_versions = compatibilities.get(gav)
+        if not compatible_versions:
+            continue
 
-        range = get_compatible_version_range(dep, properties, use_local=use_local)
+        range = get_compatible_version_range(dep, properties, use_local=use_local,
+                                             compatible_versions=compatible_versions, range=ranges.get(gav),
+                                             use_jython=use_jython)
         if not range:
             continue
         range = range.replace("\n", "")
@@ -286,16 +356,13 @@ def parse_missing(output: subprocess.CompletedProcess) -> list[ET.Element]:
 
 
 def expand_pom(project: Path, pom: ET.Element, pom_path=None, write_to=None):
-    old_dir = os.getcwd()
-    os.chdir(project)
     if pom_path:
         commands = ["mvn", "dependency:analyze-only", "-DoutputXML", "-f", pom_path]
     else:
         commands = ["mvn", "dependency:analyze-only", "-DoutputXML"]
-    output = subprocess.run(commands, stdout=subprocess.PIPE, universal_newlines=True)
+    output = subprocess.run(commands, cwd=project, stdout=subprocess.PIPE, universal_newlines=True)
     missing_deps: list[ET.Element] = parse_missing(output)
     num_expansions = 0 if len(missing_deps) == 0 else insert_deps(missing_deps, pom, write_to=write_to)
-    os.chdir(old_dir)
     return num_expansions
 
 
@@ -317,7 +384,8 @@ def clean_effective_pom(effective_pom_file: Path):
         file.write(filtered_xml)
 
 
-def expand_and_replace(read_from: Path, write_to: Path, m2_path: Path, write_to_copy=None, override=False, visited=None, injection=True, use_local=False):
+def expand_and_replace(read_from: Path, write_to: Path, m2_path: Path, write_to_copy=None, override=False, visited=None, injection=True, use_local=False,
+                       use_jython=False):
     """
     Expand and replace the <read_from> POM and write new POM to <write_to>
     :param injection: if False, does not perform injection; useful for library POMs.
@@ -327,6 +395,7 @@ def expand_and_replace(read_from: Path, write_to: Path, m2_path: Path, write_to_
     :param override: If True, do nothing if write_to already exists
     :param visited: None, or a set of already replaced <read_from>s
                         to avoid infinite recursion in case of circular imports
+    :param use_jython: if True, convert compatible versions to ranges with the Jython range converter.
     """
     # Unless we are overriding, to nothing if <write_to> already exists
     if not override and Path.is_file(write_to):
@@ -396,7 +465,7 @@ def expand_and_replace(read_from: Path, write_to: Path, m2_path: Path, write_to_
     # 3. Do replacement
     pom = ET.parse(read_from)
     try:
-        num_replacements = replace_softvers(pom, effective_pom, use_local=use_local)
+        num_replacements = replace_softvers(pom, effective_pom, use_local=use_local, use_jython=use_jython)
     except core.MavenMetadataNotFound as e:
         # Could not replace soft constraints due to missing metadata
         # (happens for net.jcip:jcip-annotations)
@@ -440,7 +509,8 @@ def expand_and_replace(read_from: Path, write_to: Path, m2_path: Path, write_to_
             shutil.copy(dependency_pom_path, dependency_pom_backup_path)
         expansions, replacements = expand_and_replace(read_from=dependency_pom_path, write_to=dependency_pom_path,
                                                       m2_path=m2_path, write_to_copy=dep_copy, override=override, visited=visited,
-                                                      injection=False)  # Disable injection for libraries, it rarely applies
+                                                      injection=False,  # Disable injection for libraries, it rarely applies
+                                                      use_jython=use_jython)
         visited.add(dependency_pom_path)
         print(f"Made {expansions} expansions and {replacements} replacements in imported POM: {dependency_path}")
 
@@ -458,6 +528,8 @@ def main():
     parser.add_argument('override', action='store_true', help='Toggle to redo already expanded POMs')
     parser.add_argument('--use_local', action='store_true', default=False,
                         help='Flag to indicate use of local Maven repository')
+    parser.add_argument('--use_jython', action='store_true', default=False,
+                        help='Flag to convert compatible versions to ranges with the Jython range converter')
 
     args = parser.parse_args()
     read_from = Path(args.read_from).resolve()
@@ -468,7 +540,8 @@ def main():
     confirm = input('Confirm (y/n)?: ')
     if confirm == "y":
         expansions, replacements = expand_and_replace(read_from=read_from, write_to=write_to,
-                                                      m2_path=m2_path, override=args.override, use_local=args.use_local)
+                                                      m2_path=m2_path, override=args.override, use_local=args.use_local,
+                                                      use_jython=args.use_jython)
         print(f"Made {expansions} expansions, and {replacements} replacements")
     else:
         print(f"Aborted.")
@@ -0,0 +1,65 @@
+"""Compares the in-process range converter (core.range_converter) with the Jython range converter on the real version
+strings of a compatibility store, and reports every GAV for which the two produce a different range spec.
+
+Example: python -m client.validate_range_converter path/to/compatibilities.json
+"""
+import argparse
+import json
+from pathlib import Path
+
+from core import get_available_versions, MavenMetadataNotFound
+from core.range_converter import convert_to_range
+from client import convert_compat_list_to_range_with_jython
+
+
+def get_corpus(compatibility_store: Path, fetch_available=False) -> list[tuple[str, list[str], list[str]]]:
+    """
+    Returns (gav, compatible_versions, available_versions) for each GAV in the store. The available versions are
+    either fetched from Maven Central, or, to run offline, all versions of the GA that occur in the store.
+    """
+    with open(compatibility_store, 'r') as f:
+        store = json.load(f)
+
+    versions_per_ga = {}
+    for gav, compatible_versions in store.items():
+        g, a, v = gav.split(":")
+        versions_per_ga.setdefault((g, a), set()).update(compatible_versions + [v])
+
+    corpus = []
+    for gav, compatible_versions in store.items():
+        g, a, v = gav.split(":")
+        available_versions = sorted(versions_per_ga[(g, a)])
+        if fetch_available:
+            try:
+                available_versions = get_available_versions(g, a)
+            except MavenMetadataNotFound as e:
+                print(e)
+        corpus.append((gav, compatible_versions, available_versions))
+    return corpus
+
+
+def validate(compatibility_store: Path, fetch_available=False) -> list[tuple[str, str, str]]:
+    """Returns the list of (gav, python range, jython range) for which the two range converters disagree."""
+    mismatches = []
+    for gav, compatible_versions, available_versions in get_corpus(compatibility_store, fetch_available):
+        python_range = convert_to_range(compatible_versions, available_versions)
+        jython_range = convert_compat_list_to_range_with_jython(available_versions, compatible_versions).strip()
+        if python_range != jython_range:
+            print(f"Mismatch for {gav}: python={python_range}, jython={jython_range}")
+            mismatches.append((gav, python_range, jython_range))
+    return mismatches
+
+
+def main():
+    cli = argparse.ArgumentParser(description='Range Converter Validation')
+    cli.add_argument('compatibility_store', type=str, help='/path/to/compatibilities.json')
+    cli.add_argument('--fetch_available', action='store_true', default=False,
+                     help='Flag to fetch the available versions of each GA from Maven Central')
+
+    args = cli.parse_args()
+    mismatches = validate(Path(args.compatibility_store).resolve(), fetch_available=args.fetch_available)
+    print(f"Found {len(mismatches)} mismatches")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
+import json
 import os
 import re
+import subprocess
+import threading
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -8,6 +12,10 @@ from bs4 import BeautifulSoup
 from github import Auth, Github, Repository, UnknownObjectException
 from lxml import etree as ET
 
+from core.http_cache import fetch, write_atomically, CACHE_DIR
+
+MAVEN_CENTRAL_URL = "https://repo1.maven.org/maven2"
+LOCAL_REPOSITORY_URL = "http://127.0.0.1:5000/maven"
 HTTP_headers = {'User-Agent': '',
                 'Cookie': ''}
 namespace = {'maven': 'http://maven.apache.org/POM/4.0.0'}
@@ -82,14 +90,23 @@ def get_text_of_child(element: ET.Element, child_tag: str) -> str:
     return child.text if child is not None else ""
 
 
+def get_repository_url(use_remote=False) -> str:
+    """Returns the base url of the local MaRCo Maven repository if use_remote is set, otherwise of Maven Central."""
+    return LOCAL_REPOSITORY_URL if use_remote else MAVEN_CENTRAL_URL
+
+
+def get_cache_ttl(url: str) -> Optional[int]:
+    """
+    Returns the TTL of cached responses of the url: the local MaRCo repository changes whenever versions are put into
+    it, so its responses are always revalidated, while the default TTL applies to Maven Central.
+    """
+    return 0 if url.startswith(LOCAL_REPOSITORY_URL) else None
+
+
 def scrape_available_versions(g: str, a: str, use_remote=False) -> list[str]:
     # Returns all available versions of GA from Maven Central as a sorted list, most recent first
-    if use_remote:
-        base_url = "http://127.0.0.1:5000/maven"
-    else:
-        base_url = "https://repo1.maven.org/maven2"
-    query = f"{base_url}/{g.replace('.', '/')}/{a}/"
-    response = requests.get(query, headers=HTTP_headers)
+    query = f"{get_repository_url(use_remote)}/{g.replace('.', '/')}/{a}/"
+    response = fetch(query, headers=HTTP_headers, ttl=get_cache_ttl(query))
     versions = []
 
     if response.status_code == 200:
@@ -108,23 +125,37 @@ def scrape_available_versions(g: str, a: str, use_remote=False) -> list[str]:
 def get_available_versions(g: str, a: str, use_remote=False, max_num=None) -> list[str]:
     """Given a GA, returns all the available versions from Maven Central or remote if max_num is not specified"""
     # Returns all available versions of GA from Maven Central as a sorted list, most recent first
-    if use_remote:
-        base_url = "http://127.0.0.1:5000/maven"
-    else:
-        base_url = "https://repo1.maven.org/maven2"
-    query = f"{base_url}/{g.replace('.', '/')}/{a}/maven-metadata.xml"
-    response = requests.get(query, headers=HTTP_headers)
+    query = f"{get_repository_url(use_remote)}/{g.replace('.', '/')}/{a}/maven-metadata.xml"
+    response = fetch(query, headers=HTTP_headers, ttl=get_cache_ttl(query))
 
     if response.headers["Content-Type"] != "text/xml" and not use_remote:
         raise MavenMetadataNotFound(f"Could not find maven-metadata.xml for {g}:{a} from {query}.")
 
-    root = ET.fromstring(response.content)
-    versions = root.find('versioning', namespace).find("versions", namespace).findall("version")
+    version_list = parse_available_versions(response.content)
+    return version_list[:max_num] if max_num else version_list
+
+
+def parse_available_versions(content: bytes) -> list[str]:
+    """Returns the versions listed in the content of a maven-metadata.xml, most recent first."""
+    try:
+        root = ET.fromstring(content)
+        versions = root.find('versioning', namespace).find("versions", namespace).findall("version")
+    except (ET.XMLSyntaxError, AttributeError):
+        raise MavenMetadataNotFound("Could not parse the versions of maven-metadata.xml")
 
     version_list = [version.text for version in versions]
     version_list.reverse()  # Reverse the list so that the newest versions are listed first
+    return version_list
 
-    return version_list[:max_num] if max_num else version_list
+
+def get_metadata_ga(url: str) -> Optional[tuple[str, str]]:
+    """Returns the GA of a url of a maven-metadata.xml in Maven Central or the local repository, None for other urls."""
+    for repository_url in [MAVEN_CENTRAL_URL, LOCAL_REPOSITORY_URL]:
+        if url.startswith(f"{repository_url}/") and url.endswith("/maven-metadata.xml"):
+            parts = url[len(repository_url) + 1:].split("/")[:-1]
+            if len(parts) >= 2:
+                return ".".join(parts[:-1]), parts[-1]
+    return None
 
 
 def get_github_token(filename: str = "github_api.token") -> str:
@@ -143,12 +174,80 @@ def get_github_session():
     return Github(auth=auth)
 
 
+REPO_CACHE_DIR = CACHE_DIR / "github"
+REPO_CACHE_TTL = int(os.environ.get("MARCO_REPO_CACHE_TTL", 7 * 24 * 3600))  # Seconds before repo metadata is refetched
+
+
+class LazyRepository:
+    """
+    Stands in for a PyGithub Repository. Its full_name, clone_url and default_branch come from the repo metadata cache
+    (REPO_CACHE_DIR), so the GitHub API is only called when the metadata is not cached or expired, or when any other
+    attribute of the Repository (e.g. get_tags) is accessed.
+    """
+    def __init__(self, repo_name: str):
+        self.repo_name = repo_name
+        self._metadata: dict | None = None
+        self._repository: Repository | None = None
+
+    def __repr__(self):
+        return f"LazyRepository({self.repo_name})"
+
+    def _get_cache_path(self) -> Path:
+        return REPO_CACHE_DIR / f"{self.repo_name.lower()}.json"
+
+    def get_repository(self) -> Repository:
+        """Returns the PyGithub Repository, raises UnknownObjectException if it does not exist."""
+        if self._repository is None:
+            with get_github_session() as session:
+                self._repository = session.get_repo(self.repo_name)
+        return self._repository
+
+    @property
+    def metadata(self) -> dict:
+        if self._metadata is None:
+            try:
+                with open(self._get_cache_path(), 'r') as f:
+                    metadata = json.load(f)
+                if time.time() - metadata['fetched_at'] < REPO_CACHE_TTL:
+                    self._metadata = metadata
+            except (FileNotFoundError, json.JSONDecodeError, KeyError):
+                pass
+        if self._metadata is None:
+            repository = self.get_repository()
+            self._metadata = {'full_name': repository.full_name, 'clone_url': repository.clone_url,
+                              'default_branch': repository.default_branch, 'fetched_at': time.time()}
+            try:
+                os.makedirs(self._get_cache_path().parent, exist_ok=True)
+                write_atomically(self._get_cache_path(), json.dumps(self._metadata).encode())
+            except OSError as e:
+                print(f"Could not cache the metadata of {self.repo_name}: {e}")
+        return self._metadata
+
+    @property
+    def full_name(self) -> str:
+        return self.metadata['full_name']
+
+    @property
+    def clone_url(self) -> str:
+        return self.metadata['clone_url']
+
+    @property
+    def default_branch(self) -> str:
+        return self.metadata['default_branch']
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not cached, which need the actual Repository
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get_repository(), name)
+
+
 def get_pom(groupId: str, artifactId: str, version: str) -> requests.Response:
     """Given a GAV coordinate, request its POM from Maven Central and return the http response."""
     groupId = groupId.replace(".", "/")
-    pom_link = f"https://repo1.maven.org/maven2/{groupId}/{artifactId}/{version}/{artifactId}-{version}.pom"
+    pom_link = f"{MAVEN_CENTRAL_URL}/{groupId}/{artifactId}/{version}/{artifactId}-{version}.pom"
     print(f"Downloading pom from {pom_link}")
-    return requests.get(pom_link, headers=HTTP_headers)
+    return fetch(pom_link, headers=HTTP_headers, ttl=get_cache_ttl(pom_link))
 
 
 def get_project_name_from_connection(connection: str) -> str | None:
@@ -252,7 +351,8 @@ def get_github_repo_from_scm(scm: ET.Element, github_session: Github) -> Reposit
     # Get Github repo from SCM connection
     try:
         print(f"Getting repo from Github with name {project_name}")
-        github_repo = github_session.get_repo(project_name)
+        github_repo = LazyRepository(project_name)
+        github_repo.metadata  # Checks that the repo exists, via the repo metadata cache
         return github_repo
     except UnknownObjectException:
         print("Could not find repo via scm; scm is possibly broken. Skipping project.")
@@ -285,16 +385,90 @@ def extract_semver(string: str) -> str:
     return match.group() if match else ""
 
 
+_tag_indices: dict[str, dict[str, str]] = {}
+_tag_indices_lock = threading.Lock()
+
+
+def parse_ls_remote_tags(output: str) -> dict[str, str]:
+    """
+    Parses the output of git ls-remote --tags into a dict from tag name to commit sha, in the order of the output.
+    Annotated tags are listed twice: refs/tags/<TAG_NAME> points to the tag object and refs/tags/<TAG_NAME>^{} to the
+    commit it is peeled to, which is the sha that is kept.
+    """
+    tags = {}
+    for line in output.splitlines():
+        sha, _, ref = line.partition("\t")
+        if not ref.startswith("refs/tags/"):
+            continue
+        name = ref[len("refs/tags/"):]
+        if name.endswith("^{}"):
+            tags[name[:-len("^{}")]] = sha
+        else:
+            tags.setdefault(name, sha)
+    return tags
+
+
+def get_tag_index(repo: Repository) -> dict[str, str] | None:
+    """
+    Returns the tag index of the repository, a dict from tag name to commit sha built with a single
+    git ls-remote --tags (so without using the GitHub API), or None if the tags could not be listed.
+    The index is built once per repository and process.
+    """
+    with _tag_indices_lock:
+        if repo.full_name in _tag_indices:
+            return _tag_indices[repo.full_name]
+    try:
+        out = subprocess.run(["git", "ls-remote", "--tags", f"https://github.com/{repo.full_name}.git"],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=120,
+                             env={**os.environ, 'GIT_TERMINAL_PROMPT': "0"})
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Could not list the tags of {repo.full_name}: {e}")
+        return None
+    if out.returncode != 0:
+        print(f"Could not list the tags of {repo.full_name}: {out.stderr}")
+        return None
+    tag_index = parse_ls_remote_tags(out.stdout)
+    with _tag_indices_lock:
+        _tag_indices[repo.full_name] = tag_index
+    return tag_index
+
+
+def match_tag(tag_index: dict[str, str], artifact_id: str, version: str) -> GitHubTag | None:
+    """Same matching as get_github_tag, but against a tag index instead of the GitHub API."""
+    for candidate in get_candidate_tag_names(artifact_id, version):
+        if candidate in tag_index:
+            print(f"Found tag by exact match: {candidate}")
+            return GitHubTag(candidate, tag_index[candidate], exact_match=True)
+
+    print(f"Could not find tag by exact match, performing inexact match...")
+    version_underscores = version.replace(".", "_")
+    tag_candidates = [name for name in tag_index if version in name or version_underscores in name]
+    print(tag_candidates)
+    if len(tag_candidates) == 0:
+        print("Could not find tag for project")
+        return None
+    # If there is more than one tag match, select the closest match which will be the shortest match
+    chosen_tag = min(tag_candidates, key=len)
+    print(f"Found commit {tag_index[chosen_tag]} for tag {chosen_tag}")
+    return GitHubTag(chosen_tag, tag_index[chosen_tag], exact_match=False)
+
+
 def get_github_tag(repo: Repository, artifact_id: str, version: str, max_num_tags=100) -> GitHubTag | None:
     """
     Given a GitHub repository, its Maven artifact ID and version, return the likely GitHub tag based on exact
     matching of commonly used tag versioning patterns and inexact string match if no exact match can be found.
+    Matching is done against the tag index of the repository, and only falls back to the GitHub API if the tags of the
+    repository cannot be listed with git.
     :param repo: The GitHub repository
     :param artifact_id: Artifact ID of the repository's corresponding Maven GAV
     :param version: version of the repository's corresponding Maven GAV
-    :param max_num_tags: The max number of tags that will be checked for inexact string match
+    :param max_num_tags: The max number of tags that will be checked for inexact string match via the GitHub API
     :return: GitHubTag if a tag was found, None otherwise
     """
+    tag_index = get_tag_index(repo)
+    if tag_index is not None:
+        return match_tag(tag_index, artifact_id, version)
+
     # First get tag by exact match
     for candidate in get_candidate_tag_names(artifact_id, version):
         tag = get_github_tag_by_name(repo, candidate)
@@ -392,7 +566,7 @@ def get_github_repo_and_tag(g: str, a: str, v: str,
     with get_github_session() as session:
         if repo_name:
             print(f"Using provided repo_name={repo_name}")
-            repo = session.get_repo(repo_name)
+            repo = LazyRepository(repo_name)
         else:
             repo = get_github_repo_from_scm(scm, session)
         if repo is None and pom_element is not None:
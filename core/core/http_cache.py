@@ -0,0 +1,175 @@
+"""
+Shared HTTP layer used to fetch resources (maven-metadata.xml, POMs, directory listings) from Maven repositories.
+All requests go through one pooled requests.Session. Successful responses are kept in an in-process LRU and in an
+on-disk cache; once an entry is older than the TTL it is revalidated with a conditional request (ETag/Last-Modified),
+so unchanged resources are not downloaded again. Functions registered with add_change_listener are called whenever a
+fetched resource differs from the cached one, e.g. a maven-metadata.xml listing a new version.
+The cache location and TTL can be configured with the MARCO_CACHE_DIR and MARCO_HTTP_CACHE_TTL environment variables.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+CACHE_DIR = Path(os.environ.get("MARCO_CACHE_DIR", Path.home() / ".cache" / "marco"))
+HTTP_CACHE_DIR = CACHE_DIR / "http"
+HTTP_CACHE_TTL = int(os.environ.get("MARCO_HTTP_CACHE_TTL", 3600))  # Seconds before a cached entry is revalidated
+LRU_MAX_ENTRIES = 512
+POOL_MAXSIZE = 32
+
+_session = None
+_session_lock = threading.Lock()
+_lru: OrderedDict[str, dict] = OrderedDict()
+_lru_lock = threading.Lock()
+_change_listeners: list[Callable[[str, bytes], None]] = []
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, whose connection pool is shared by all fetches."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE,
+                                  max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _get_cache_path(url: str) -> Path:
+    digest = hashlib.sha256(url.encode()).hexdigest()
+    return HTTP_CACHE_DIR / digest[:2] / digest
+
+
+def _read_from_disk(url: str) -> dict | None:
+    path = _get_cache_path(url)
+    try:
+        with open(f"{path}.json", 'r') as f:
+            entry = json.load(f)
+        with open(f"{path}.body", 'rb') as f:
+            entry['content'] = f.read()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return entry if entry.get('url') == url else None
+
+
+def write_atomically(path: Path, content: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _write_to_disk(entry: dict):
+    path = _get_cache_path(entry['url'])
+    try:
+        os.makedirs(path.parent, exist_ok=True)
+        metadata = {key: value for key, value in entry.items() if key != 'content'}
+        # Write the body first, so the metadata never points at a body that is not there yet
+        write_atomically(Path(f"{path}.body"), entry['content'])
+        write_atomically(Path(f"{path}.json"), json.dumps(metadata).encode())
+    except OSError as e:
+        print(f"Could not write HTTP cache entry for {entry['url']}: {e}")
+
+
+def _get_entry(url: str) -> dict | None:
+    with _lru_lock:
+        entry = _lru.get(url)
+        if entry is not None:
+            _lru.move_to_end(url)
+            return entry
+    entry = _read_from_disk(url)
+    if entry is not None:
+        _put_entry_in_lru(entry)
+    return entry
+
+
+def _put_entry_in_lru(entry: dict):
+    with _lru_lock:
+        _lru[entry['url']] = entry
+        _lru.move_to_end(entry['url'])
+        while len(_lru) > LRU_MAX_ENTRIES:
+            _lru.popitem(last=False)
+
+
+def _store_entry(entry: dict):
+    _put_entry_in_lru(entry)
+    _write_to_disk(entry)
+
+
+def _to_response(entry: dict) -> requests.Response:
+    response = requests.Response()
+    response.url = entry['url']
+    response.status_code = entry['status_code']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response._content = entry['content']
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def fetch(url: str, headers: dict = None, ttl: int = None) -> requests.Response:
+    """
+    GETs the url through the shared session and cache. Cached entries younger than ttl seconds are returned without
+    any request, older ones are revalidated. Only successful responses are cached.
+    """
+    ttl = HTTP_CACHE_TTL if ttl is None else ttl
+    entry = _get_entry(url)
+    if entry is not None and time.time() - entry['fetched_at'] < ttl:
+        return _to_response(entry)
+
+    request_headers = dict(headers) if headers else {}
+    if entry is not None:
+        cached_headers = CaseInsensitiveDict(entry['headers'])
+        if cached_headers.get('ETag'):
+            request_headers['If-None-Match'] = cached_headers['ETag']
+        if cached_headers.get('Last-Modified'):
+            request_headers['If-Modified-Since'] = cached_headers['Last-Modified']
+
+    response = get_session().get(url, headers=request_headers)
+    if response.status_code == 304 and entry is not None:
+        entry = dict(entry, fetched_at=time.time())
+        _store_entry(entry)
+        return _to_response(entry)
+    if response.status_code == 200:
+        _store_entry({
+            'url': url,
+            'status_code': response.status_code,
+            'headers': dict(response.headers),
+            'content': response.content,
+            'fetched_at': time.time(),
+        })
+        if entry is None or entry['content'] != response.content:
+            _notify_change(url, response.content)
+    return response
+
+
+def add_change_listener(listener: Callable[[str, bytes], None]):
+    """Registers a function called with the url and the new content of every fetched resource that changed."""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def _notify_change(url: str, content: bytes):
+    for listener in list(_change_listeners):
+        try:
+            listener(url, content)
+        except Exception as e:
+            print(f"Could not handle the change of {url}: {e!r}")
+
+
+def clear_cache():
+    """Empties the in-process LRU. The on-disk cache is left untouched."""
+    with _lru_lock:
+        _lru.clear()
@@ -0,0 +1,243 @@
+"""
+Pure-Python port of the range converter in client/range_converter.py, which no longer needs a Jython process.
+ComparableVersion follows Maven's org.apache.maven.artifact.versioning.ComparableVersion as shipped in
+maven-artifact-3.0-alpha-1 (the jar used by the Jython range converter), including its qualifier order in which
+"snapshot" sorts before "alpha".
+"""
+from functools import cmp_to_key, total_ordering
+
+INTEGER_ITEM = 0
+STRING_ITEM = 1
+LIST_ITEM = 2
+
+QUALIFIERS = ["snapshot", "alpha", "beta", "milestone", "rc", "", "sp"]
+ALIASES = {"ga": "", "final": "", "cr": "rc"}
+RELEASE_VERSION_INDEX = str(QUALIFIERS.index(""))
+
+
+def compare(x, y) -> int:
+    return (x > y) - (x < y)
+
+
+class IntegerItem:
+    type = INTEGER_ITEM
+
+    def __init__(self, value: str = "0"):
+        self.value = int(value)
+
+    def is_null(self) -> bool:
+        return self.value == 0
+
+    def compare_to(self, item) -> int:
+        if item is None:
+            return 0 if self.value == 0 else 1  # 1.0 == 1, 1.1 > 1
+        if item.type == INTEGER_ITEM:
+            return compare(self.value, item.value)
+        return 1  # 1.1 > 1-sp, 1.1 > 1-1
+
+    def __str__(self):
+        return str(self.value)
+
+
+class StringItem:
+    type = STRING_ITEM
+
+    def __init__(self, value: str, followed_by_digit: bool):
+        if followed_by_digit and len(value) == 1:
+            # a1 = alpha-1, b1 = beta-1, m1 = milestone-1
+            value = {"a": "alpha", "b": "beta", "m": "milestone"}.get(value, value)
+        self.value = ALIASES.get(value, value)
+
+    @staticmethod
+    def comparable_qualifier(qualifier: str) -> str:
+        """Well-known qualifiers are compared by their index in QUALIFIERS, unknown qualifiers come after all of them
+        and are compared lexically. Note that the indices are compared as strings, as Maven does."""
+        if qualifier in QUALIFIERS:
+            return str(QUALIFIERS.index(qualifier))
+        return f"{len(QUALIFIERS)}-{qualifier}"
+
+    def is_null(self) -> bool:
+        return self.comparable_qualifier(self.value) == RELEASE_VERSION_INDEX
+
+    def compare_to(self, item) -> int:
+        if item is None:
+            # 1-rc < 1, 1-ga == 1, 1-sp > 1
+            return compare(self.comparable_qualifier(self.value), RELEASE_VERSION_INDEX)
+        if item.type == STRING_ITEM:
+            return compare(self.comparable_qualifier(self.value), self.comparable_qualifier(item.value))
+        return -1  # 1.any < 1.1, 1-any < 1-1
+
+    def __str__(self):
+        return self.value
+
+
+class ListItem(list):
+    type = LIST_ITEM
+
+    def is_null(self) -> bool:
+        return len(self) == 0
+
+    def normalize(self):
+        """Removes trailing null items, e.g. 1.0.0 == 1"""
+        while self and self[-1].is_null():
+            self.pop()
+
+    def compare_to(self, item) -> int:
+        if item is None:
+            if len(self) == 0:
+                return 0  # 1-0 = 1- (normalize) = 1
+            return self[0].compare_to(None)
+        if item.type == INTEGER_ITEM:
+            return -1  # 1-1 < 1.0.x
+        if item.type == STRING_ITEM:
+            return 1  # 1-1 > 1-sp
+        for i in range(max(len(self), len(item))):
+            left = self[i] if i < len(self) else None
+            right = item[i] if i < len(item) else None
+            # If left is None, the right item is compared to None and the result is inverted
+            result = -1 * right.compare_to(left) if left is None else left.compare_to(right)
+            if result != 0:
+                return result
+        return 0
+
+    def __str__(self):
+        return "(" + ",".join(str(item) for item in self) + ")"
+
+
+def parse_item(is_digit: bool, buf: str):
+    return IntegerItem(buf) if is_digit else StringItem(buf, False)
+
+
+@total_ordering
+class ComparableVersion:
+    """Generic version of a Maven artifact, ordered according to Maven's version ordering."""
+
+    def __init__(self, version: str):
+        self.value = version
+        self.items = ListItem()
+        self.parse_version(version)
+        self.canonical = str(self.items)
+
+    def parse_version(self, version: str):
+        version = version.lower()
+        current = self.items
+        stack = [current]
+        is_digit = False
+        start_index = 0
+
+        for i, c in enumerate(version):
+            if c == ".":
+                if i == start_index:
+                    current.append(IntegerItem())
+                else:
+                    current.append(parse_item(is_digit, version[start_index:i]))
+                start_index = i + 1
+            elif c == "-":
+                if i == start_index:
+                    current.append(IntegerItem())
+                else:
+                    current.append(parse_item(is_digit, version[start_index:i]))
+                start_index = i + 1
+                if is_digit:
+                    current.normalize()  # 1.0-* = 1-*
+                    if i + 1 < len(version) and version[i + 1].isdecimal():
+                        # New ListItem only if previous were digits and new char is a digit,
+                        # i.e. need to differentiate only 1.1 from 1-1
+                        sublist = ListItem()
+                        current.append(sublist)
+                        current = sublist
+                        stack.append(current)
+            elif c.isdecimal():
+                if not is_digit and i > start_index:
+                    current.append(StringItem(version[start_index:i], True))
+                    start_index = i
+                is_digit = True
+            else:
+                if is_digit and i > start_index:
+                    current.append(parse_item(True, version[start_index:i]))
+                    start_index = i
+                is_digit = False
+
+        if len(version) > start_index:
+            current.append(parse_item(is_digit, version[start_index:]))
+
+        while stack:
+            stack.pop().normalize()
+
+    def compare_to(self, other) -> int:
+        return self.items.compare_to(other.items)
+
+    def __lt__(self, other):
+        return self.compare_to(other) < 0
+
+    def __eq__(self, other):
+        return isinstance(other, ComparableVersion) and self.canonical == other.canonical
+
+    def __hash__(self):
+        return hash(self.canonical)
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return f"ComparableVersion({self.value})"
+
+
+def create_range_spec_from_list(versions: list[ComparableVersion]) -> str:
+    """
+    Given a list of ComparableVersions, e.g. [1,2,3], return the corresponding range, i.e. [1,3]
+    """
+    lower_bound = str(versions[0])
+    upper_bound = str(versions[-1])
+    if lower_bound == upper_bound:
+        return f"[{lower_bound}]"
+    return f"[{lower_bound},{upper_bound}]"
+
+
+def get_continuous_ranges(compatible_versions: list[ComparableVersion],
+                          available_versions: list[ComparableVersion]) -> list[list[ComparableVersion]]:
+    """
+    Groups elements in compatible_versions that appear consecutively in available_versions.
+    """
+    continuous_ranges = []
+    current_range = []
+
+    for av in available_versions:
+        if av in compatible_versions:
+            current_range.append(av)
+        elif current_range:
+            continuous_ranges.append(current_range)
+            current_range = []
+
+    if current_range:
+        continuous_ranges.append(current_range)
+
+    return continuous_ranges
+
+
+def create_range_spec(compatible_versions: list[ComparableVersion],
+                      available_versions: list[ComparableVersion]) -> str:
+    """
+    Creates a valid Maven range spec based on the given compatible and available versions.
+    """
+    if len(compatible_versions) == 0:
+        # If there are no compatible versions, then the compatible version range is empty.
+        return "[]"
+
+    continuous_ranges = get_continuous_ranges(compatible_versions, available_versions)
+    return ",".join(create_range_spec_from_list(cr) for cr in continuous_ranges)
+
+
+def create_ordered_list_of_comparable_versions(string_versions: list[str]) -> list[ComparableVersion]:
+    """
+    Takes a list of strings representing versions, and returns a list of ComparableVersions ordered according to
+    Maven's version sorting algorithm (ascending). Versions that Maven considers equal (e.g. 1.0 and 1) are deduplicated.
+    """
+    comparable_versions = list(dict.fromkeys(ComparableVersion(x) for x in string_versions))
+    return sorted(comparable_versions, key=cmp_to_key(ComparableVersion.compare_to))
+
+
+def convert_to_range(compatible_versions: list[str], available_versions: list[str]) -> str:
+    """Returns the Maven range spec of the compatible versions, given all available versions of the GA."""
+    return create_range_spec(create_ordered_list_of_comparable_versions(compatible_versions),
+                             create_ordered_list_of_comparable_versions(available_versions))
@@ -0,0 +1,82 @@
+import hashlib
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from core import (get_available_versions, get_cache_ttl, get_metadata_ga, parse_available_versions,
+                  LOCAL_REPOSITORY_URL, MavenMetadataNotFound)
+from core import http_cache
+
+URL = "https://repo1.maven.org/maven2/marco/demo/c/maven-metadata.xml"
+
+
+class FakeSession:
+    def __init__(self):
+        self.content = b"1"
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append(headers)
+        response = requests.Response()
+        response.url = url
+        etag = f'"{hashlib.sha256(self.content).hexdigest()}"'
+        if headers and headers.get('If-None-Match') == etag:
+            response.status_code = 304
+        else:
+            response.status_code, response._content = 200, self.content
+        response.headers = CaseInsensitiveDict({'ETag': etag, 'Content-Type': "text/xml"})
+        return response
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(http_cache, "get_session", lambda: session)
+    monkeypatch.setattr(http_cache, "_change_listeners", [])
+    http_cache.clear_cache()
+    yield session
+    http_cache.clear_cache()
+
+
+def test_listeners_are_notified_of_changes(session):
+    changes = []
+    http_cache.add_change_listener(lambda url, content: changes.append(content))
+    http_cache.fetch(URL, ttl=0)
+    http_cache.fetch(URL, ttl=0)  # Not modified
+    session.content = b"2"
+    http_cache.fetch(URL, ttl=0)
+    http_cache.fetch(URL, ttl=0)
+    assert changes == [b"1", b"2"]
+    assert len(session.requests) == 4
+
+
+def test_failing_listener_does_not_break_fetch(session):
+    http_cache.add_change_listener(lambda url, content: 1 / 0)
+    assert http_cache.fetch(URL, ttl=0).content == b"1"
+
+
+def test_local_repository_is_always_revalidated(session):
+    session.content = b"<metadata><versioning><versions><version>1</version></versions></versioning></metadata>"
+    assert get_available_versions("marco.demo", "c", use_remote=True) == ["1"]
+    session.content = session.content.replace(b"</versions>", b"<version>2</version></versions>")
+    assert get_available_versions("marco.demo", "c", use_remote=True) == ["2", "1"]
+    assert len(session.requests) == 2
+    assert get_cache_ttl(f"{LOCAL_REPOSITORY_URL}/marco/demo/c/maven-metadata.xml") == 0
+    assert get_cache_ttl(URL) is None
+
+
+def test_metadata_ga():
+    assert get_metadata_ga(URL) == ("marco.demo", "c")
+    assert get_metadata_ga("http://127.0.0.1:5000/maven/a/b/c/maven-metadata.xml") == ("a.b", "c")
+    assert get_metadata_ga("https://repo1.maven.org/maven2/marco/demo/c/1/c-1.pom") is None
+    assert get_metadata_ga("https://example.com/marco/demo/c/maven-metadata.xml") is None
+
+
+def test_parse_available_versions():
+    content = b"<metadata><versioning><versions><version>1</version><version>2</version></versions></versioning>" \
+              b"</metadata>"
+    assert parse_available_versions(content) == ["2", "1"]
+    with pytest.raises(MavenMetadataNotFound):
+        parse_available_versions(b"Not Found")
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from core.range_converter import ComparableVersion, convert_to_range, create_ordered_list_of_comparable_versions
+
+# Ascending according to maven-artifact-3.0-alpha-1, in which "snapshot" sorts before "alpha"
+ORDERED_VERSIONS = ["1.0-SNAPSHOT", "1.0-alpha-1", "1.0-alpha-2", "1.0-beta", "1.0-milestone-1", "1.0-rc1", "1.0",
+                    "1.0-sp", "1.0-foo", "1-1", "1.0.1", "1.1-SNAPSHOT", "1.1", "1.10", "2.0"]
+
+
+def test_ordering():
+    shuffled = ORDERED_VERSIONS[:]
+    random.Random(42).shuffle(shuffled)
+    assert [str(cv) for cv in create_ordered_list_of_comparable_versions(shuffled)] == ORDERED_VERSIONS
+
+
+@pytest.mark.parametrize("lower, higher", [
+    ("1.0-SNAPSHOT", "1.0-alpha"),
+    ("1.0-alpha", "1.0-beta"),
+    ("1.0-beta", "1.0-rc"),
+    ("1.0-rc", "1.0"),
+    ("1.0", "1.0-sp"),
+    ("1.0-sp", "1.0-unknown"),  # Unknown qualifiers come after all known ones
+    ("1.0-a1", "1.0-b1"),  # a1 = alpha-1, b1 = beta-1
+    ("1", "1-1"),
+    ("1-1", "1.1"),
+    ("1.9", "1.10"),
+])
+def test_compare(lower, higher):
+    assert ComparableVersion(lower) < ComparableVersion(higher)
+    assert ComparableVersion(higher) > ComparableVersion(lower)
+
+
+@pytest.mark.parametrize("left, right", [
+    ("1", "1.0"),
+    ("1", "1.0.0"),
+    ("1.0", "1-ga"),
+    ("1.0", "1.0-final"),
+    ("1.0-cr1", "1.0-rc1"),
+    ("1.0-alpha1", "1.0-alpha-1"),
+    ("1.0-RC1", "1.0-rc1"),
+])
+def test_equal(left, right):
+    assert ComparableVersion(left) == ComparableVersion(right)
+    assert ComparableVersion(left).compare_to(ComparableVersion(right)) == 0
+
+
+def test_equal_versions_are_deduplicated():
+    assert [str(cv) for cv in create_ordered_list_of_comparable_versions(["1.0", "2", "1"])] == ["1.0", "2"]
+
+
+@pytest.mark.parametrize("compatible, expected", [
+    ([], "[]"),
+    (["1.1"], "[1.1]"),
+    (["1.1-SNAPSHOT", "1.1", "1.10"], "[1.1-SNAPSHOT,1.10]"),
+    (["1.0", "1.1"], "[1.0],[1.1]"),
+    (["1.0-SNAPSHOT", "1.0-alpha-1"], "[1.0-SNAPSHOT,1.0-alpha-1]"),
+    (["1.0-rc1", "1.0", "1.0-sp"], "[1.0-rc1,1.0-sp]"),
+    (["1.0-alpha-1", "1.0-beta", "1.0.1", "2.0"], "[1.0-alpha-1],[1.0-beta],[1.0.1],[2.0]"),
+    (["2.0", "1.10", "1.1"], "[1.1,2.0]"),
+])
+def test_convert_to_range(compatible, expected):
+    available = ORDERED_VERSIONS[::-1]  # Order of the available versions does not matter
+    assert convert_to_range(compatible, available) == expected
@@ -0,0 +1,118 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.List;
+import java.util.logging.Handler;
+import java.util.logging.Level;
+import java.util.logging.LogManager;
+import java.util.logging.Logger;
+import java.util.logging.SimpleFormatter;
+import java.util.logging.StreamHandler;
+
+/**
+ * Runs japicmp on many jar pairs in a single JVM, so the JVM startup is paid once instead of once per pair.
+ *
+ * Usage: java -cp japicmp-jar-with-dependencies.jar BatchJapicmp.java [japicmp options...]
+ *
+ * Reads one "old_jar\tnew_jar" pair per line from stdin and, for each pair, runs japicmp with the given options and
+ * writes "OK\told_jar\tnew_jar", "FAIL\told_jar\tnew_jar" or "ERROR\told_jar\tnew_jar\tcause" to stdout. japicmp's
+ * own output is discarded.
+ *
+ * The verdicts match those of one "java -jar japicmp.jar" call per pair, where a pair fails if anything is written to
+ * stderr: a pair fails if japicmp reports an incompatibility (--error-on-binary-incompatibility and
+ * --error-on-source-incompatibility) or writes to System.err, or if anything is logged through java.util.logging at the
+ * level the default console handler prints (INFO). The default console handler keeps the stderr of the JVM start, so
+ * it is replaced by a handler writing to the captured stream of the current pair.
+ * Any other exception (e.g. an unreadable jar, or running out of memory) is not a verdict on the pair: it is answered
+ * with ERROR, so the caller can retry the pair with a single call instead of recording it as incompatible.
+ *
+ * Written against japicmp 0.18.3 (PATH_TO_JAPICMP). JApiCmp.run is not part of japicmp's public API, so check this
+ * helper when upgrading japicmp.
+ */
+public class BatchJapicmp {
+    private static final String JAPICMP_EXCEPTION = "japicmp.exception.JApiCmpException";
+    private static final String INCOMPATIBILITY_REASON = "IncompatibleChange";  // JApiCmpException.Reason
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocolOut = new PrintStream(System.out, true, StandardCharsets.UTF_8);
+        PrintStream originalErr = System.err;
+        LogManager.getLogManager().reset();  // Drops the console handler bound to the original stderr
+        Logger rootLogger = Logger.getLogger("");
+        rootLogger.setLevel(Level.INFO);
+
+        Class<?> japicmpClass = Class.forName("japicmp.JApiCmp");
+        Method run = japicmpClass.getDeclaredMethod("run", String[].class);
+        run.setAccessible(true);
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isBlank()) {
+                continue;
+            }
+            String[] pair = line.split("\t");
+            if (pair.length != 2) {
+                protocolOut.println("ERROR\t" + line.replace('\t', ' ') + "\t\texpected an old_jar and a new_jar");
+                continue;
+            }
+
+            List<String> japicmpArgs = new ArrayList<>(Arrays.asList(args));
+            japicmpArgs.addAll(Arrays.asList("--old", pair[0], "--new", pair[1]));
+
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            Handler logHandler = new StreamHandler(err, new SimpleFormatter());
+            logHandler.setLevel(Level.INFO);
+            rootLogger.addHandler(logHandler);
+            String verdict;
+            String cause = null;
+            System.setOut(new PrintStream(OutputStream.nullOutputStream()));
+            System.setErr(new PrintStream(err, true, StandardCharsets.UTF_8));
+            try {
+                run.invoke(japicmpClass.getDeclaredConstructor().newInstance(), (Object) japicmpArgs.toArray(new String[0]));
+                logHandler.flush();
+                verdict = err.size() == 0 ? "OK" : "FAIL";
+            } catch (InvocationTargetException e) {
+                verdict = isIncompatibility(e.getCause()) ? "FAIL" : "ERROR";
+                cause = describe(e.getCause());
+            } catch (Exception e) {
+                verdict = "ERROR";
+                cause = describe(e);
+            } finally {
+                rootLogger.removeHandler(logHandler);
+                logHandler.close();
+                System.setOut(protocolOut);
+                System.setErr(originalErr);
+            }
+            String answer = verdict + "\t" + pair[0] + "\t" + pair[1];
+            protocolOut.println(verdict.equals("ERROR") ? answer + "\t" + cause : answer);
+        }
+    }
+
+    /** Returns true if japicmp threw because it found an incompatible change between the jars. */
+    private static boolean isIncompatibility(Throwable cause) {
+        if (cause == null || !cause.getClass().getName().equals(JAPICMP_EXCEPTION)) {
+            return false;
+        }
+        try {
+            Object reason = cause.getClass().getMethod("getReason").invoke(cause);
+            return reason != null && INCOMPATIBILITY_REASON.equals(((Enum<?>) reason).name());
+        } catch (ReflectiveOperationException | ClassCastException e) {
+            return false;
+        }
+    }
+
+    /** Describes the throwable on a single line without tabs, so it fits in the protocol. */
+    private static String describe(Throwable throwable) {
+        if (throwable == null) {
+            return "unknown error";
+        }
+        return String.valueOf(throwable).replaceAll("[\\t\\r\\n]+", " ");
+    }
+}
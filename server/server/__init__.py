@@ -1,23 +1,42 @@
 """Given a Maven coordinate, generate its compatible versions and store them in the compatibility store."""
 import argparse
-import json
-from collections import defaultdict
+import time
+from concurrent.futures import Executor
+from functools import partial
 from typing import Optional
 
 from core import get_available_versions, scrape_available_versions, MavenMetadataNotFound
-from server.config import COMPATIBILITY_STORE
+from core.http_cache import add_change_listener
+from server.build_cache import TRANSIENT_OUTCOMES
+from server.config import RESULT_RETRY_AFTER
 from server.dynamic import dynamically_compatible
 from server.exceptions import (BaseJarNotFoundException, CandidateJarNotFoundException,
                                CandidateMavenCompileTimeout, CandidateMavenTestTimeout, MavenNoPomInDirectoryException,
                                MavenResolutionFailedException, MavenCompileFailedException,
                                MavenSurefireTestFailedException, GithubRepoNotFoundException,
                                GithubTagNotFoundException)
-from server.static import statically_compatible
+from server.parallel import create_executor, evaluate_in_order
+from server.prefetch import prefetch_jars
+from server.search import get_search_strategy, LinearSearch, SearchReport, SearchStrategy, STRATEGIES
+from server.static import statically_compatible, statically_compatible_batch
+from server.store import (get_compatibility_store, CompatibilityStore, JsonCompatibilityStore, refresh_ranges,
+                          refresh_ranges_of_metadata, update_range)
 from server.template.base_template import BaseTemplate
+from server.template.candidate_template import CandidateTemplate
+
+
+# Errors that depend on the environment or on data that can still change (e.g. a jar or tag published late), so
+# results with these errors are only reused for RESULT_RETRY_AFTER seconds. The build cache retries the transient build
+# failures after the same delay by default, so the retries build the candidate again.
+RETRY_ERRORS = {"NO_JAR", "NO_GITHUB", "NO_TAG", "CAND_TEST_TIMEOUT"} | TRANSIENT_OUTCOMES
+
+# Recompute the stored ranges of a GA as soon as the generator sees new available versions of it
+add_change_listener(refresh_ranges_of_metadata)
 
 
 class CompatibilityResult:
-    def __init__(self, group_id, artifact_id, v_base, v_cand, statically_compatible, dynamically_compatible, err=""):
+    def __init__(self, group_id, artifact_id, v_base, v_cand, statically_compatible, dynamically_compatible, err="",
+                 seconds=None, tested_at=None, retry_after=None, missed_regressions: list[str] = None):
         self.group_id = group_id
         self.artifact_id = artifact_id
         self.v_base = v_base
@@ -25,35 +44,137 @@ class CompatibilityResult:
         self.statically_compatible = statically_compatible
         self.dynamically_compatible = dynamically_compatible
         self.err = err
+        self.seconds = seconds
+        self.tested_at = tested_at
+        self.retry_after = retry_after  # Time after which a result with one of the RETRY_ERRORS is checked again
+        # Regressions that the test selection missed, found by auditing it with a full test run
+        self.missed_regressions = missed_regressions or []
+
+    def is_compatible(self, static_only=False) -> Optional[bool]:
+        """Returns True if compatible, False if incompatible, None if the candidate jar could not be found."""
+        if self.err == "NO_JAR":
+            return None
+        return bool(self.statically_compatible and (static_only or self.dynamically_compatible))
+
+    def is_decisive(self, static_only=False) -> bool:
+        """
+        Returns True if checking the version pair again would give the same result. Results with one of the
+        RETRY_ERRORS are taken as decisive until their retry time.
+        """
+        if self.err in RETRY_ERRORS:
+            return self.retry_after is not None and time.time() < self.retry_after
+        # A result of a static only check says nothing of the dynamic compatibility
+        return static_only or not (self.statically_compatible and self.dynamically_compatible is None)
+
+    def to_dict(self) -> dict:
+        return {'version': self.v_cand, 'statically_compatible': self.statically_compatible,
+                'dynamically_compatible': self.dynamically_compatible, 'err': self.err, 'seconds': self.seconds,
+                'tested_at': self.tested_at, 'retry_after': self.retry_after}
+
+    @classmethod
+    def from_dict(cls, g: str, a: str, v: str, record: dict) -> 'CompatibilityResult':
+        return cls(g, a, v, record['version'], record['statically_compatible'], record['dynamically_compatible'],
+                   err=record['err'], seconds=record['seconds'], tested_at=record['tested_at'],
+                   retry_after=record.get('retry_after'))
 
     def __repr__(self):
         return f"CompatibilityResult({self.group_id}:{self.artifact_id}:{self.v_base} => {self.v_cand}," \
                f" static={self.statically_compatible}, dynamic={self.dynamically_compatible}, err={self.err}"
 
 
-def load_compatibility_store() -> defaultdict[str, set]:
-    try:
-        with open(COMPATIBILITY_STORE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return defaultdict(set)
+def load_compatibility_store() -> dict[str, set]:
+    return get_compatibility_store().load()
+
+
+def save_compatibility_store(compatibility_store: dict[str, set], write_to_path=None, use_local=False):
+    """
+    Adds the given mappings to the configured store, or to the JSON store at write_to_path if given, and recomputes
+    their ranges.
+    """
+    store = JsonCompatibilityStore(write_to_path) if write_to_path else get_compatibility_store()
+    store.save(compatibility_store)
+    refresh_ranges(store, use_local=use_local, gavs=set(compatibility_store))
 
 
-def save_compatibility_store(compatibility_store: dict[str, set], write_to_path=COMPATIBILITY_STORE):
-    with open(write_to_path, 'w') as f:
-        return json.dump(compatibility_store, f, indent=4, default=set_default)
+def load_decisive_results(store: CompatibilityStore, g: str, a: str, v: str,
+                          static_only=False) -> dict[str, CompatibilityResult]:
+    """Returns the stored results of the GAV that do not need to be checked again."""
+    results = {cv: CompatibilityResult.from_dict(g, a, v, record)
+               for cv, record in store.get_results(f"{g}:{a}:{v}").items()}
+    return {cv: result for cv, result in results.items() if result.is_decisive(static_only)}
 
 
-def set_default(obj):
-    if isinstance(obj, set):
-        return list(obj)
-    raise TypeError
+def save_results(store: CompatibilityStore, results: list[CompatibilityResult],
+                 previous_results: dict[str, CompatibilityResult]):
+    """Stores the results that were not loaded from the store."""
+    new_results = [result for result in results if result.v_cand not in previous_results]
+    if new_results:
+        gav = f"{new_results[0].group_id}:{new_results[0].artifact_id}:{new_results[0].v_base}"
+        store.put_results(gav, [result.to_dict() for result in new_results])
 
 
-def get_compatibility_set(g: str, a: str, v: str, cv_versions: list[str], max_fail=None, use_local=False):
-    """Given a GAV and a set of candidate versions, it returns the set of compatible candidates."""
+def get_static_verdicts(g: str, a: str, v: str, cv_versions: list[str], use_local=False) -> dict[str, bool]:
+    """
+    Fetches the jars of the base and all candidates and runs their static checks in one go, leaving jar errors to the
+    per-candidate checks.
+    """
+    prefetch_jars(g, a, [v] + cv_versions, use_local=use_local)
+    try:
+        return statically_compatible_batch(g, a, v, cv_versions)
+    except BaseJarNotFoundException:
+        return {}
+
+
+def get_compatible_candidates(base_template: BaseTemplate, candidates: list[str], strategy: SearchStrategy = None,
+                              use_local=False, executor: Executor = None, jobs=1, rebuild=False, from_source=False,
+                              previous_results: dict[str, CompatibilityResult] = None) -> SearchReport:
+    """
+    Searches the candidates, which are ordered going away from the base version, for compatible versions with the
+    given search strategy (linear without a limit on failures by default). With an executor, linear searches evaluate
+    jobs candidates at a time; candidates started past the point where the search stops are cancelled or their results
+    ignored, while galloping and budgeted searches evaluate up to jobs of the probes they may need next at a time.
+    Candidates with a result in previous_results are not checked again, and do not count against the budget of budgeted
+    searches.
+    """
+    g, a, v = base_template.group_id, base_template.artifact_id, base_template.version
+    strategy = strategy or LinearSearch()
+    previous_results = previous_results or {}
+    if strategy.sparse:
+        # Few candidates are visited, so each jar is fetched and checked when its candidate is evaluated
+        static_verdicts = None
+    else:
+        static_verdicts = get_static_verdicts(g, a, v, [cv for cv in candidates if cv not in previous_results],
+                                              use_local=use_local)
+    evaluate = partial(get_compatibility_result, g, a, v, base_template=base_template, use_local=use_local,
+                       static_verdicts=static_verdicts, rebuild=rebuild, from_source=from_source,
+                       previous_results=previous_results, prefetch=strategy.sparse)
+    report = strategy.search(evaluate, candidates, executor=executor, window=jobs,
+                             verdict=CompatibilityResult.is_compatible, known=previous_results)
+    report.missed_regressions.update({cv: result.missed_regressions for cv, result in report.results.items()
+                                      if result.missed_regressions})
+    return report
+
+
+def get_compatibility_set(g: str, a: str, v: str, cv_versions: list[str], max_fail=None, use_local=False, jobs=1,
+                          rebuild=False, from_source=False, strategy: SearchStrategy = None, report_path=None):
+    """Given a GAV and a set of candidate versions, it returns the set of compatible candidates.
+    The candidates are searched with the given strategy, by default linearly until max_fail failures.
+    If jobs > 1, candidates are evaluated on a pool of jobs worker processes.
+    If rebuild is set, candidates are built even if the build cache records that their builds fail.
+    If from_source is set, candidates are built from source even if their released jars are available.
+    If report_path is set, the versions that were tested and those that were inferred are written to it.
+    The results of all checks are stored, and candidates with a decisive stored result are not checked again unless
+    rebuild is set."""
     gav = f"{g}:{a}:{v}"
     compatibility_set = {v}  # A GAV is always compatible with itself
+    strategy = strategy or LinearSearch(max_fail=max_fail)
+    report = SearchReport(strategy.name)
+    store = get_compatibility_store()
+    previous_results = {} if rebuild else load_decisive_results(store, g, a, v)
+
+    # Quit comparison if the base version cannot be found
+    if not prefetch_jars(g, a, [v], use_local=use_local)[v]:
+        raise BaseJarNotFoundException(f"Could not find jar of the base version for compatibility comparison: {gav}")
 
     # Prepare base for dynamic test: create persistent folder base_templates/g:a:v which contains
     # target/test-classes, target/generates-test-sources and target/surefire-report_BASE
@@ -68,130 +189,148 @@ def get_compatibility_set(g: str, a: str, v: str, cv_versions: list[str], max_fa
     downgrades = cv_versions[idx_base + 1:]
     assert v not in upgrades and v not in downgrades
 
+    executor = create_executor(jobs)
+    if executor is not None:
+        # The baseline candidate template is shared by all candidates, so create it before the workers need it
+        CandidateTemplate(g, a, v, use_local=use_local, rebuild=rebuild, from_source=from_source)
+
     # Run static and dynamic compatibility checks
-    compat_store: defaultdict[str, set] = load_compatibility_store()
-
-    # TODO: refactor the for-loops, they are near duplicate
-    up_fails = 0
-    for cv in upgrades:
-        if max_fail is not None and up_fails >= max_fail:
-            # If max_fail is set, stop after max_fail consecutive fails
-            break
-
-        try:
-            if statically_compatible(g, a, v, cv):
-                if dynamically_compatible(base_template, cv, use_local=use_local):
-                    compatibility_set.add(cv)
-                else:
-                    up_fails += 1
-            else:
-                up_fails += 1
-        except BaseJarNotFoundException:
-            # Quit comparison if the base version cannot be found
-            raise BaseJarNotFoundException(f"Could not find jar of the base version for compatibility comparison: "
-                                           f"{gav}")
-        except CandidateJarNotFoundException:
-            continue  # Move on to next available candidate version
-
-    down_fails = 0
-    for cv in downgrades:
-        if max_fail is not None and down_fails >= max_fail:
-            # If max_fail is set, stop after max_fail consecutive fails
-            break
-
-        try:
-            if statically_compatible(g, a, v, cv):
-                if dynamically_compatible(base_template, cv, use_local=use_local):
-                    compatibility_set.add(cv)
-                else:
-                    down_fails += 1
-            else:
-                down_fails += 1
-        except BaseJarNotFoundException:
-            # Quit comparison if the base version cannot be found
-            raise BaseJarNotFoundException(f"Could not find jar of the base version for compatibility comparison: "
-                                           f"{gav}")
-        except CandidateJarNotFoundException:
-            continue  # Move on to next available candidate version
-
-    # Add compatibility mapping to JSON store
-    stored_set = set(compat_store.get(gav, set()))
-    stored_set.update(compatibility_set)
-    compat_store[gav] = stored_set
-    save_compatibility_store(compat_store)
+    try:
+        for candidates in [upgrades, downgrades]:
+            report.update(get_compatible_candidates(base_template, candidates, strategy=strategy, use_local=use_local,
+                                                    executor=executor, jobs=jobs, rebuild=rebuild,
+                                                    from_source=from_source, previous_results=previous_results))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        save_results(store, list(report.results.values()), previous_results)
+    compatibility_set.update(report.compatible())
+    print(f"Searched {gav}: {report}")
+    if report.inferred:
+        print(f"Inferred versions of {gav}: {report.inferred}")
+    if report.missed_regressions:
+        print(f"Test selection missed regressions of {gav}: {report.missed_regressions}")
+    if report_path:
+        report.write(report_path, gav)
+
+    # Add compatibility mapping to the store, only touching the mapping of this GAV
+    stored_set = store.upsert(gav, compatibility_set)
+    update_range(store, gav, use_local=use_local)  # Precompute the range served to clients
     return stored_set
 
 
+def get_compatibility_result(g: str, a: str, v: str, cv: str, base_template: BaseTemplate = None,
+                             static_only=False, use_local=False, static_verdicts: dict[str, bool] = None,
+                             rebuild=False, from_source=False,
+                             previous_results: dict[str, CompatibilityResult] = None,
+                             prefetch=False) -> CompatibilityResult:
+    """
+    Returns the result of the candidate version in previous_results if there is one, and otherwise runs its static and
+    dynamic compatibility checks, classifies the outcome and records how long the checks took and, for outcomes that
+    may change, when to check again. If prefetch is set, the candidate jar is fetched first, for candidates whose jars
+    were not fetched along with the others.
+    """
+    if previous_results and cv in previous_results:
+        return previous_results[cv]
+    start = time.perf_counter()
+    if prefetch:
+        prefetch_jars(g, a, [cv], use_local=use_local)
+    result = run_compatibility_checks(g, a, v, cv, base_template=base_template, static_only=static_only,
+                                      use_local=use_local, static_verdicts=static_verdicts, rebuild=rebuild,
+                                      from_source=from_source)
+    result.seconds = time.perf_counter() - start
+    result.tested_at = time.time()
+    if result.err in RETRY_ERRORS:
+        result.retry_after = result.tested_at + RESULT_RETRY_AFTER
+    return result
+
+
+def run_compatibility_checks(g: str, a: str, v: str, cv: str, base_template: BaseTemplate = None,
+                             static_only=False, use_local=False, static_verdicts: dict[str, bool] = None,
+                             rebuild=False, from_source=False) -> CompatibilityResult:
+    """Runs the static and dynamic compatibility checks of the candidate version and classifies the outcome."""
+    try:
+        if statically_compatible(g, a, v, cv, verdicts=static_verdicts):
+            try:
+                if static_only:
+                    # A version pair being statically compatible tells us nothing of its dynamic compatibility
+                    return CompatibilityResult(g, a, v, cv, True, None)
+                missed = set()
+                is_compatible = dynamically_compatible(base_template, cv, use_local=use_local, rebuild=rebuild,
+                                                       from_source=from_source, missed_regressions=missed)
+                missed_regressions = sorted(f"{f.testcase_classname}#{f.testcase_name}" for f in missed)
+                return CompatibilityResult(g, a, v, cv, True, is_compatible, missed_regressions=missed_regressions)
+            except GithubRepoNotFoundException as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="NO_GITHUB")
+            except GithubTagNotFoundException as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="NO_TAG")
+            except CandidateMavenCompileTimeout as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="CAND_COMPILE_TIMEOUT")
+            except CandidateMavenTestTimeout as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="CAND_TEST_TIMEOUT")
+            except MavenNoPomInDirectoryException as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="NO_POM")
+            except MavenResolutionFailedException as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="NO_RESOLVE")
+            except MavenCompileFailedException as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="NO_COMPILE")
+            except MavenSurefireTestFailedException as e:
+                print(e)
+                return CompatibilityResult(g, a, v, cv, True, False, err="NO_TEST")
+        else:
+            # If two versions aren't statically compatible, then they also aren't dynamically compatible
+            return CompatibilityResult(g, a, v, cv, False, False)
+    except (BaseJarNotFoundException, CandidateJarNotFoundException):
+        # Quit comparison if the base version cannot be found
+        # If two versions aren't statically compatible, then they also aren't dynamically compatible
+        return CompatibilityResult(g, a, v, cv, False, False, err="NO_JAR")
+
+
 def get_compatibility_results_helper(g: str, a: str, v: str, cv_versions: list[str],
-                                     base_template: BaseTemplate, static_only=False) -> list[CompatibilityResult]:
+                                     base_template: BaseTemplate, static_only=False,
+                                     executor: Executor = None, jobs=1, rebuild=False,
+                                     from_source=False, max_consecutive_fails=3, max_versions=50,
+                                     previous_results: dict[str, CompatibilityResult] = None
+                                     ) -> list[CompatibilityResult]:
+    """
+    Evaluates the candidates in order, giving up after max_consecutive_fails incompatible versions in a row and never
+    evaluating more than max_versions versions. Candidates with a result in previous_results are not checked again.
+    """
     compatibility_results = []
-    max_consecutive_fails = 3   # Give up search after a certain number of incompatible versions in a row
     fails = 0
+    previous_results = previous_results or {}
+    static_verdicts = get_static_verdicts(g, a, v, [cv for cv in cv_versions[:max_versions]
+                                                    if cv not in previous_results])
+    evaluate = partial(get_compatibility_result, g, a, v, base_template=base_template, static_only=static_only,
+                       static_verdicts=static_verdicts, rebuild=rebuild, from_source=from_source,
+                       previous_results=previous_results)
     # Run static and dynamic compatibility checks
-    for i, cv in enumerate(cv_versions):
-        if fails < max_consecutive_fails and i < 50:  # Don't do more than 100 versions or more than max fails
-            try:
-                if statically_compatible(g, a, v, cv):
-                    try:
-                        if static_only:
-                            # A version pair being statically compatible tells us nothing of its dynamic compatibility
-                            result = CompatibilityResult(g, a, v, cv, True, None)
-                            fails = 0
-                        else:
-                            if dynamically_compatible(base_template, cv):
-                                result = CompatibilityResult(g, a, v, cv, True, True)
-                                fails = 0
-                            else:
-                                result = CompatibilityResult(g, a, v, cv, True, False)
-                                fails += 1
-                    except GithubRepoNotFoundException as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="NO_GITHUB")
-                        fails += 1
-                    except GithubTagNotFoundException as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="NO_TAG")
-                        fails += 1
-                    except CandidateMavenCompileTimeout as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="CAND_COMPILE_TIMEOUT")
-                        fails += 1
-                    except CandidateMavenTestTimeout as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="CAND_TEST_TIMEOUT")
-                        fails += 1
-                    except MavenNoPomInDirectoryException as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="NO_POM")
-                        fails += 1
-                    except MavenResolutionFailedException as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="NO_RESOLVE")
-                        fails += 1
-                    except MavenCompileFailedException as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="NO_COMPILE")
-                        fails += 1
-                    except MavenSurefireTestFailedException as e:
-                        print(e)
-                        result = CompatibilityResult(g, a, v, cv, True, False, err="NO_TEST")
-                        fails += 1
-                else:
-                    # If two versions aren't statically compatible, then they also aren't dynamically compatible
-                    result = CompatibilityResult(g, a, v, cv, False, False)
-                    fails += 1
-            except (BaseJarNotFoundException, CandidateJarNotFoundException):
-                # Quit comparison if the base version cannot be found
-                # If two versions aren't statically compatible, then they also aren't dynamically compatible
-                result = CompatibilityResult(g, a, v, cv, False, False, err="NO_JAR")
-            if result:
-                compatibility_results.append(result)
+    for cv, result in evaluate_in_order(evaluate, cv_versions[:max_versions],
+                                        lambda: fails >= max_consecutive_fails, executor=executor, window=jobs):
+        is_compatible = result.is_compatible(static_only)
+        if is_compatible:
+            fails = 0
+        elif is_compatible is not None:
+            fails += 1
+        compatibility_results.append(result)
     return compatibility_results
 
 
 def get_compatibility_results(g: str, a: str, v: str, cv_versions: list[str], github_link=None,
-                              static_only=False) -> list[CompatibilityResult]:
-    """Given a GAV and a set of candidate versions, it returns the list of compatible candidates."""
+                              static_only=False, jobs=1, rebuild=False, from_source=False,
+                              max_consecutive_fails=3, max_versions=50) -> list[CompatibilityResult]:
+    """
+    Given a GAV and a set of candidate versions, it returns the list of compatible candidates.
+    The results of all checks are stored, and candidates with a decisive stored result are not checked again unless
+    rebuild is set.
+    """
     idx_split = cv_versions.index(v)
     # Versions list should be ordered by newest first (as it appears on maven repo)
     cv_versions_upper = cv_versions[:idx_split]
@@ -201,18 +340,40 @@ def get_compatibility_results(g: str, a: str, v: str, cv_versions: list[str], gi
     # Prepare base for dynamic test: create persistent folder base_templates/g:a:v which contains
     # target/test-classes, target/generates-test-sources and target/surefire-report_BASE
     base_template = None if static_only else BaseTemplate(g, a, v, repo_name=github_link)
-
-    compatible_lower = get_compatibility_results_helper(g, a, v, cv_versions_lower, base_template,
-                                                        static_only=static_only)
-    compatible_upper = get_compatibility_results_helper(g, a, v, cv_versions_upper, base_template,
-                                                        static_only=static_only)
+    store = get_compatibility_store()
+    previous_results = {} if rebuild else load_decisive_results(store, g, a, v, static_only=static_only)
+    compatible_lower, compatible_upper = [], []
+
+    executor = create_executor(jobs)
+    if executor is not None and not static_only:
+        # The baseline candidate template is shared by all candidates, so create it before the workers need it
+        prefetch_jars(g, a, [v])
+        CandidateTemplate(g, a, v, rebuild=rebuild, from_source=from_source)
+    try:
+        compatible_lower = get_compatibility_results_helper(g, a, v, cv_versions_lower, base_template,
+                                                            static_only=static_only, executor=executor, jobs=jobs,
+                                                            rebuild=rebuild, from_source=from_source,
+                                                            max_consecutive_fails=max_consecutive_fails,
+                                                            max_versions=max_versions,
+                                                            previous_results=previous_results)
+        compatible_upper = get_compatibility_results_helper(g, a, v, cv_versions_upper, base_template,
+                                                            static_only=static_only, executor=executor, jobs=jobs,
+                                                            rebuild=rebuild, from_source=from_source,
+                                                            max_consecutive_fails=max_consecutive_fails,
+                                                            max_versions=max_versions,
+                                                            previous_results=previous_results)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        save_results(store, compatible_lower + compatible_upper, previous_results)
     compatibility_results = compatible_lower + compatible_upper
 
     return compatibility_results
 
 
 def find_compatibility_results(g: str, a: str, v: str, max_num=None, silent=False, github_link=None,
-                               static_only=False) -> Optional[list[CompatibilityResult]]:
+                               static_only=False, jobs=1, rebuild=False, from_source=False,
+                               max_consecutive_fails=3, max_versions=50) -> Optional[list[CompatibilityResult]]:
     try:
         candidate_versions = get_available_versions(g, a, max_num=max_num)
         if v not in candidate_versions:
@@ -231,7 +392,10 @@ def find_compatibility_results(g: str, a: str, v: str, max_num=None, silent=Fals
         print(f"Calculating compatibility set for {g}:{a}:{v} with candidates: {candidate_versions}")
 
     compatibility_results = get_compatibility_results(g, a, v, candidate_versions,
-                                                      github_link=github_link, static_only=static_only)
+                                                      github_link=github_link, static_only=static_only, jobs=jobs,
+                                                      rebuild=rebuild, from_source=from_source,
+                                                      max_consecutive_fails=max_consecutive_fails,
+                                                      max_versions=max_versions)
 
     if not silent:
         print(f"Result:\n {g}:{a}:{v} has compatibility results {compatibility_results} "
@@ -240,7 +404,9 @@ def find_compatibility_results(g: str, a: str, v: str, max_num=None, silent=Fals
     return compatibility_results
 
 
-def find_compatible_versions(g: str, a: str, v: str, max_num=None, max_fail=None, silent=False, use_local=False):
+def find_compatible_versions(g: str, a: str, v: str, max_num=None, max_fail=None, silent=False, use_local=False,
+                             jobs=1, rebuild=False, from_source=False, strategy="linear", budget=None,
+                             report_path=None):
     candidate_versions = get_available_versions(g, a, use_remote=use_local)
 
     if max_num is not None:
@@ -256,7 +422,11 @@ def find_compatible_versions(g: str, a: str, v: str, max_num=None, max_fail=None
             print(f"Aborted.")
             return
 
-    compatible_versions = get_compatibility_set(g, a, v, candidate_versions, max_fail=max_fail, use_local=use_local)
+    compatible_versions = get_compatibility_set(g, a, v, candidate_versions, max_fail=max_fail, use_local=use_local,
+                                                jobs=jobs, rebuild=rebuild, from_source=from_source,
+                                                strategy=get_search_strategy(strategy, max_fail=max_fail,
+                                                                             budget=budget),
+                                                report_path=report_path)
 
     if not silent:
         print(f"Result:\n {g}:{a}:{v} has compatible versions {compatible_versions} "
@@ -277,6 +447,20 @@ def main():
     cli.add_argument('--stop_after_n', type=int, default=None, help='stop after the given number of consecutive failures')
     cli.add_argument('--use_local', action='store_true', default=False,
                      help='Flag to indicate use of local Maven repository')
+    cli.add_argument('--jobs', type=int, default=1,
+                     help='number of candidate versions to evaluate in parallel worker processes')
+    cli.add_argument('--rebuild', action='store_true', default=False,
+                     help='Flag to rebuild candidates whose builds failed in earlier runs and to check '
+                          'candidates with stored results again')
+    cli.add_argument('--from_source', action='store_true', default=False,
+                     help='Flag to build candidates from source instead of using their released jars')
+    cli.add_argument('--strategy', choices=STRATEGIES, default="linear",
+                     help='how to search the candidates: one by one, by galloping and bisecting to the compatibility '
+                          'boundary, or like galloping but testing at most --budget candidates per direction')
+    cli.add_argument('--budget', type=int, default=None,
+                     help='maximum number of candidates to test per direction with the budgeted strategy')
+    cli.add_argument('--report', type=str, default=None,
+                     help='path to write the tested and inferred versions to as JSON')
 
     args = cli.parse_args()
     g = args.group_id
@@ -284,4 +468,6 @@ def main():
     v = args.version_id
 
     find_compatible_versions(g, a, v,
-                             max_num=args.max_candidates, max_fail=args.stop_after_n, use_local=args.use_local)
+                             max_num=args.max_candidates, max_fail=args.stop_after_n, use_local=args.use_local,
+                             jobs=args.jobs, rebuild=args.rebuild, from_source=args.from_source,
+                             strategy=args.strategy, budget=args.budget, report_path=args.report)
@@ -3,17 +3,28 @@ import pathlib
 
 from flask import Flask, jsonify, send_from_directory, render_template, request
 
-from server import load_compatibility_store, find_compatible_versions
+from core import LOCAL_REPOSITORY_URL
+from server.config import ENQUEUE_MISSING
+from server.jobs import JobQueue
+from server.store import CompatibilityIndex, refresh_ranges_of_metadata
 
 MAVEN_REPOSITORY = pathlib.Path(__file__).parent.parent.resolve() / "resources" / "maven_repository"
 LISTING_TEMPLATE = pathlib.Path(__file__).parent.resolve() / "templates" / "directory_listing.html"
 
 app = Flask(__name__, template_folder='templates')
+index = CompatibilityIndex()
+queue = JobQueue()
 
 
 def lookup(gav: str):
-    store = load_compatibility_store()
-    return store.get(gav, [])
+    return index.lookup(gav)
+
+
+def enqueue_missing(gav: str) -> int | None:
+    """Enqueues a generation job for a well-formed GAV without a mapping, returns the job id or None."""
+    if not ENQUEUE_MISSING or len(gav.split(":")) != 3 or not all(gav.split(":")):
+        return None
+    return queue.enqueue(gav)
 
 
 @app.route("/")
@@ -21,17 +32,43 @@ def hello_world():
     return jsonify({'message': 'Hello, World!'})
 
 
+@app.route("/stats")
+def stats():
+    return jsonify({**index.stats(), 'jobs': queue.stats()})
+
+
 @app.route('/compatibilities/<gav>', methods=['GET'])
 def compatibilities(gav: str):
     compatible_versions = lookup(gav)
-    # if not compatible_versions:
-    #     g, a, v = gav.split(":")
-    #     find_compatible_versions(g, a, v, max_num=5, silent=True)
-    #     compatible_versions = lookup(gav)
     if compatible_versions:
-        return jsonify({'compatible_versions': compatible_versions})
-    else:
-        return jsonify({'compatible_versions': None})
+        return jsonify({'compatible_versions': compatible_versions, 'range': index.lookup_range(gav)})
+    job_id = enqueue_missing(gav)
+    if job_id is not None:
+        # The mapping is being generated by a worker, poll /jobs/<job_id> for its status
+        return jsonify({'compatible_versions': None, 'range': None, 'job_id': job_id}), 202
+    return jsonify({'compatible_versions': None, 'range': None})
+
+
+@app.route('/compatibilities', methods=['POST'])
+def batch_compatibilities():
+    """Looks up the compatible versions of all GAVs in the request body {'gavs': [gav, ...]} at once."""
+    payload = request.get_json(silent=True)
+    gavs = payload.get('gavs') if isinstance(payload, dict) else None
+    if not isinstance(gavs, list) or not all(isinstance(gav, str) for gav in gavs):
+        return jsonify({'error': "Expected a JSON body of the form {'gavs': [gav, ...]}"}), 400
+    compatibilities = {gav: lookup(gav) or None for gav in gavs}
+    jobs = {gav: enqueue_missing(gav) for gav, versions in compatibilities.items() if versions is None}
+    return jsonify({'compatibilities': compatibilities,
+                    'ranges': {gav: index.lookup_range(gav) for gav in gavs},
+                    'jobs': {gav: job_id for gav, job_id in jobs.items() if job_id is not None}})
+
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id: int):
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"No job with id {job_id}"}), 404
+    return jsonify(job)
 
 
 @app.route('/maven/', defaults={'filename': ""}, methods=['GET'])
@@ -68,6 +105,9 @@ def populate_repository(filename):
     with open(path, 'wb') as file:
         file.write(request.data)
 
+    # A new version changes the available versions that the ranges of the GA were computed from
+    refresh_ranges_of_metadata(f"{LOCAL_REPOSITORY_URL}/{filename}", request.data, store=index.store)
+
     return 'Artifact uploaded successfully', 201
 
 
@@ -0,0 +1,92 @@
+"""
+Persistent cache of the outcomes of Maven builds of candidate templates, keyed by (commit sha, module path, POM digest,
+Maven/JDK version). Failed builds are recorded with their classification, so a version that does not compile is not
+rebuilt (for up to COMPILE_TIMEOUT seconds) on every generator run, unless a rebuild is explicitly requested.
+Transient failures (dependency resolution and timeouts, which depend on the network and the load of the machine) are
+recorded too, but only skipped for BUILD_RETRY_AFTER seconds after the build, and built again after that.
+"""
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import subprocess
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+from server.config import BUILD_CACHE, BUILD_RETRY_AFTER
+
+SUCCESS = "SUCCESS"
+NO_POM = "NO_POM"
+NO_RESOLVE = "NO_RESOLVE"
+NO_COMPILE = "NO_COMPILE"
+COMPILE_TIMEOUT = "CAND_COMPILE_TIMEOUT"
+TRANSIENT_OUTCOMES = {NO_RESOLVE, COMPILE_TIMEOUT}
+
+
+@functools.cache
+def get_toolchain_version() -> str:
+    """Returns the Maven and JDK version used for builds, e.g. 'maven=3.9.6 java=17.0.2'"""
+    try:
+        out = subprocess.run(["mvn", "-v"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             universal_newlines=True, timeout=60).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+    maven = re.search(r"Apache Maven (\S+)", out)
+    java = re.search(r"Java version: ([^,\s]+)", out)
+    return f"maven={maven.group(1) if maven else 'unknown'} java={java.group(1) if java else 'unknown'}"
+
+
+def get_pom_digest(pom_path: Path) -> str:
+    if not os.path.isfile(pom_path):
+        return ""
+    with open(pom_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class BuildCache:
+    """SQLite cache (in WAL mode, so concurrent generators can share it) of build outcomes."""
+
+    def __init__(self, path: Path = BUILD_CACHE):
+        self.path = Path(path)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS builds ("
+                             "commit_sha TEXT NOT NULL, module_path TEXT NOT NULL, pom_digest TEXT NOT NULL, "
+                             "toolchain TEXT NOT NULL, outcome TEXT NOT NULL, message TEXT NOT NULL, "
+                             "artifact TEXT NOT NULL, built_at REAL NOT NULL, "
+                             "PRIMARY KEY (commit_sha, module_path, pom_digest, toolchain))")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def get(self, key: tuple[str, str, str, str], retry_after=BUILD_RETRY_AFTER) -> Optional[tuple[str, str]]:
+        """
+        Returns the (outcome, message) of the build with the given key, or None if it was never built or only failed
+        transiently more than retry_after seconds ago.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT outcome, message, built_at FROM builds WHERE commit_sha = ? "
+                               "AND module_path = ? AND pom_digest = ? AND toolchain = ?", key).fetchone()
+        if row is None:
+            return None
+        outcome, message, built_at = row
+        if outcome in TRANSIENT_OUTCOMES and time.time() - built_at > retry_after:
+            return None
+        return outcome, message
+
+    def put(self, key: tuple[str, str, str, str], outcome: str, message="", artifact=""):
+        """Records the outcome of a build, and for successful builds the path of the resulting template."""
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO builds VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (*key, outcome, message, str(artifact), time.time()))
+
+
+def get_build_key(commit_sha: str, module_path: str, pom_path: Path) -> tuple[str, str, str, str]:
+    return commit_sha, module_path, get_pom_digest(pom_path), get_toolchain_version()
@@ -1,29 +1,49 @@
 """Collection of shared variables and methods."""
 import logging
-import os
 import pathlib
-from pathlib import Path
-
-from git import Repo
-from github import Repository, Commit
 
 from core import get_github_session
-from server.exceptions import GithubRepoDownloadFailedException, GithubRepoNotFoundException
+from server.exceptions import GithubRepoNotFoundException
 
 path_to_repos = pathlib.Path(__file__).parent.parent.resolve() / "resources" / "repos"
 path_to_test_repos = pathlib.Path(__file__).parent.parent.resolve() / "test_resources" / "repos"
 PATH_TO_JARS = pathlib.Path(__file__).parent.parent.resolve() / "resources" / "jars"
 PATH_TO_JAPICMP = (pathlib.Path(__file__).parent.parent.resolve() / "libs" / "japicmp" /
                    "japicmp-0.18.3-jar-with-dependencies.jar")
+PATH_TO_BATCH_JAPICMP = pathlib.Path(__file__).parent.parent.resolve() / "libs" / "japicmp" / "BatchJapicmp.java"
+JAPICMP_TIMEOUT = 120  # Seconds the batch japicmp runner may take for a single jar pair
+JAPICMP_OPTIONS = ["--ignore-missing-classes", "--error-on-binary-incompatibility", "--error-on-source-incompatibility"]
 
 SERVER_RESOURCES = pathlib.Path(__file__).parent.parent.resolve() / "resources"
 # COMPATIBILITY_STORE = SERVER_RESOURCES / "compatibilities.json"
 COMPATIBILITY_STORE = SERVER_RESOURCES / "compatibilities_demo.json"
+COMPATIBILITY_DB = SERVER_RESOURCES / "compatibilities.db"
+COMPATIBILITY_BACKEND = "json"  # Either "json" (COMPATIBILITY_STORE) or "sqlite" (COMPATIBILITY_DB)
+STATIC_VERDICT_CACHE = SERVER_RESOURCES / "static_verdicts.db"
+BUILD_CACHE = SERVER_RESOURCES / "build_outcomes.db"
+RESULT_RETRY_AFTER = 24 * 60 * 60  # Seconds a stored result whose error may change is reused before it is checked again
 BASE_TEMPLATES_DIR = SERVER_RESOURCES / "base_templates"
 CAND_TEMPLATES_DIR = SERVER_RESOURCES / "cand_templates"
+MIRRORS_DIR = SERVER_RESOURCES / "mirrors"  # Bare mirrors of the Github repositories templates are built from
+WORKTREES_DIR = SERVER_RESOURCES / "worktrees"  # Worktrees of the commits whose templates are being prepared
+SCRATCH_DIR = SERVER_RESOURCES / "scratch"  # Per-worker working directories of parallel generator runs
 
 COMPILE_TIMEOUT = 600
+BUILD_RETRY_AFTER = 24 * 60 * 60  # Seconds after which transiently failed builds (timeouts, resolution) are retried
 TEST_TIMEOUT = 300
+REPORT_PARSER_JOBS = 1  # Number of processes parsing the surefire reports of a test run
+FAIL_FAST_TESTS = True  # Stop candidate test runs at the first test failing that passed in the baseline
+REPORT_POLL_INTERVAL = 0.5  # Seconds between two scans of the surefire reports of a fail-fast test run
+SELECT_TESTS = False  # Only run the base tests affected by the changes between base and candidate classes
+TEST_SELECTION_AUDIT_RATE = 0.05  # Share of the selections that are audited with a full test run
+TEST_SHARDS = 1  # Number of parallel surefire runs the base test classes of a candidate test run are split over
+SHARD_TIMEOUT = TEST_TIMEOUT  # Timeout of a single shard
+
+JOB_QUEUE = SERVER_RESOURCES / "jobs.db"  # Queue of the generation jobs enqueued by the server
+ENQUEUE_MISSING = True  # Enqueue a generation job for every looked up GAV without a compatibility mapping
+JOB_POLL_INTERVAL = 5  # Seconds between two polls of an empty job queue
+JOB_RETRY_AFTER = 24 * 60 * 60  # Seconds after which a failed job is enqueued again on the next lookup of its GAV
+JOB_MAX_CANDIDATES = 5  # Maximum number of downgrade/upgrade candidates of a generation job
 
 logger = logging.getLogger(__name__)
 
@@ -35,34 +55,3 @@ def get_repo(repo_name: str):
             raise GithubRepoNotFoundException(f"Could not find repo {repo_name} on Github")
         return repo
 
-
-def download_repo_by_name(repo_name, storage_path=path_to_repos):
-    return download_repo(get_repo(repo_name), storage_path=storage_path)
-
-
-def download_repo_and_return_commit(repo: Repository, storage_path=path_to_repos) -> Commit:
-    print(f"Cloning {repo.full_name} into {storage_path}/{repo.full_name}")
-    download_path = Path.joinpath(storage_path, repo.full_name)
-    if os.path.isdir(download_path):
-        return download_path
-    try:
-        r = Repo.clone_from(f"https://github.com/{repo.full_name}.git", to_path=download_path)
-        assert os.path.isdir(download_path)
-        print("Success.")
-        return r.head.commit
-    except Exception:
-        raise GithubRepoDownloadFailedException(f"Could not clone repo {repo.full_name}.")
-
-
-def download_repo(repo: Repository, storage_path=path_to_repos) -> Path:
-    logger.debug(f"Cloning {repo.full_name} into {storage_path}/{repo.full_name}")
-    download_path = Path.joinpath(storage_path, repo.full_name)
-    if os.path.isdir(download_path):
-        return download_path
-    try:
-        Repo.clone_from(f"https://github.com/{repo.full_name}.git", to_path=download_path)
-        logger.debug("Success.")
-        assert os.path.isdir(download_path)
-        return download_path
-    except Exception:
-        raise GithubRepoDownloadFailedException(f"Could not clone repo {repo.full_name}.")
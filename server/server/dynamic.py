@@ -1,9 +1,19 @@
 """Module containing logic related to checking for dynamic compatibility between a base and a candidate by running
 the base's tests on the source code of the candidate."""
+import hashlib
+import heapq
 import os
 import pathlib
+import random
+import shutil
+import signal
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from xml.etree import ElementTree
 
 from lxml import etree as ET
 
@@ -11,8 +21,15 @@ from core import namespace, dependencies_are_equal, get_text_of_child
 from server.exceptions import MavenSurefireTestFailedException, CandidateMavenTestTimeout
 from server.template.base_template import BaseTemplate
 from server.template.candidate_template import CandidateTemplate
-from server.test_failure import get_test_failures_from_dir, TestFailure
-from server.config import TEST_TIMEOUT
+from server.test_failure import get_test_class_durations, get_test_failures_from_dir, parse_report, TestFailure
+from server.config import (TEST_TIMEOUT, SCRATCH_DIR, FAIL_FAST_TESTS, REPORT_POLL_INTERVAL, SELECT_TESTS,
+                           TEST_SELECTION_AUDIT_RATE, TEST_SHARDS, SHARD_TIMEOUT)
+from server.test_selection import audit_selection, get_file_digests, select_tests as select_affected_tests
+from server.workspace import assemble_workspace
+
+# Sections of a POM that determine its resolved dependencies, and references in them to the version of the project
+DEPENDENCY_SECTIONS = {"parent", "properties", "dependencies", "dependencyManagement", "repositories"}
+PROJECT_VERSION_REFERENCES = ("${project.version}", "${pom.version}", "${version}")
 
 
 def dynamic_check(base: set[TestFailure], candidate: set[TestFailure]) -> bool:
@@ -25,7 +42,9 @@ def dynamic_check(base: set[TestFailure], candidate: set[TestFailure]) -> bool:
     return (candidate - base) == set()
 
 
-def dynamically_compatible(base: BaseTemplate, cv: str, repo_name=None, storage_path=None, use_local=False):
+def dynamically_compatible(base: BaseTemplate, cv: str, repo_name=None, storage_path=None, use_local=False,
+                           rebuild=False, from_source=False, fail_fast=FAIL_FAST_TESTS, select_tests=SELECT_TESTS,
+                           missed_regressions: set[TestFailure] = None):
     """
     Given a base template, runs the base tests in the same "cleaned" environment as the candidates would.
     This is to prevent environment-related factors only affecting the candidate results to gain a more realistic
@@ -33,19 +52,72 @@ def dynamically_compatible(base: BaseTemplate, cv: str, repo_name=None, storage_
     removed.
     :param base: BaseTemplate made from the base version of the GA
     :param cv: candidate version of the GA
+    :param rebuild: build the candidate templates even if the build cache records that their builds fail
+    :param from_source: build the candidate templates from source even if the released jars are available
+    :param fail_fast: stop the candidate test run as soon as a test fails that passed in the baseline
+    :param select_tests: only run the base test classes that reference classes that changed between base and candidate
+    :param missed_regressions: if given, the regressions that an audited test selection missed are added to it
     :return: True if candidate version is dynamically compatible with base version, False otherwise
     """
-    # TODO: store baseline failures in metadata to avoid recomputation
     baseline = CandidateTemplate(base.group_id, base.artifact_id, base.version,
-                                 repo_name=repo_name, repo_storage_path=storage_path, use_local=use_local)
+                                 repo_name=repo_name, repo_storage_path=storage_path, use_local=use_local,
+                                 rebuild=rebuild, from_source=from_source)
     candidate = CandidateTemplate(base.group_id, base.artifact_id, cv,
-                                  repo_name=repo_name, repo_storage_path=storage_path, use_local=use_local)
-    base_failures = run_tests(base, baseline)  # Get baseline failures by running the base with itself
-    # base_failures = get_test_failures_from_dir(base.target_path / "surefire-reports_BASE")  # TODO this would be more efficient, but needs testing => yep it broke everything please test before doing anything
-    candidate_failures = run_tests(base, candidate)
+                                  repo_name=repo_name, repo_storage_path=storage_path, use_local=use_local,
+                                  rebuild=rebuild, from_source=from_source)
+    base_failures = get_baseline_failures(base, baseline)
+    selected = get_selected_tests(base, baseline, candidate) if select_tests else None
+    if selected is not None and random.random() < TEST_SELECTION_AUDIT_RATE:
+        # Audit the selection with a full run, whose result is used either way
+        candidate_failures = run_tests(base, candidate)
+        missed = audit_selection(selected, base_failures, candidate_failures)
+        if missed_regressions is not None:
+            missed_regressions.update(missed)
+        return dynamic_check(base_failures, candidate_failures)
+    if selected is not None and not selected:
+        print(f"No base tests are affected by the changes in {candidate.gav}")
+        return True
+    candidate_failures = run_tests(base, candidate, baseline_failures=base_failures if fail_fast else None,
+                                   tests=selected)
     return dynamic_check(base_failures, candidate_failures)
 
 
+def get_selected_tests(base: BaseTemplate, baseline: CandidateTemplate, candidate: CandidateTemplate):
+    """
+    Returns the base test classes affected by the changes from the baseline to the candidate, or None for all. The
+    selection only compares the classes of the library itself, so all tests run if the candidate brings different
+    dependencies than the baseline.
+    """
+    if get_dependency_signature(get_merged_pom(base.pom_path, baseline.pom_path)) != \
+            get_dependency_signature(get_merged_pom(base.pom_path, candidate.pom_path)):
+        print(f"The dependencies of {candidate.gav} differ from those of {baseline.gav}, running all tests")
+        return None
+    return select_affected_tests(base.target_path / "test-classes", base.target_path / "surefire-reports_BASE",
+                                 baseline.target_path / "classes", candidate.target_path / "classes")
+
+
+def get_classes_digest(classes_dir: pathlib.Path) -> str:
+    """Returns a digest of the paths and contents of all files in the directory."""
+    digests = sorted(get_file_digests(classes_dir).items()) if os.path.isdir(classes_dir) else []
+    return hashlib.sha256("\n".join(f"{path}:{digest}" for path, digest in digests).encode()).hexdigest()
+
+
+def get_baseline_failures(base: BaseTemplate, baseline: CandidateTemplate) -> set[TestFailure]:
+    """
+    Returns the failures of the base tests run on the base code in the cleaned environment. They are computed once
+    and stored in the base template, keyed by the base commit, the origin and classes of the baseline template and the
+    merged POM, so any change to these (e.g. a rebuilt or replaced template) leads to a recomputation.
+    """
+    key = f"{base.commit_sha}:{baseline.get_template_origin()}:" \
+          f"{get_classes_digest(baseline.target_path / 'classes')}:" \
+          f"{get_merged_pom_digest(base.pom_path, baseline.pom_path)}"
+    base_failures = base.load_baseline_failures(key)
+    if base_failures is None:
+        base_failures = run_tests(base, baseline)  # Get baseline failures by running the base with itself
+        base.store_baseline_failures(key, base_failures)
+    return base_failures
+
+
 def get_test_deps(pom: pathlib.Path, tag_name: str) -> list[ET.Element]:
     tree = ET.parse(pom)
     root = tree.getroot()
@@ -104,48 +176,220 @@ def merge_dependencies_in_section(pom_base: pathlib.Path, pom_cand: pathlib.Path
             dependencies_tag.insert(0, dep)
 
 
-def merge_poms(pom_base: pathlib.Path, pom_cand: pathlib.Path, save_to_path: pathlib.Path):
+def get_merged_pom(pom_base: pathlib.Path, pom_cand: pathlib.Path) -> ET.ElementTree:
     tree = ET.parse(pom_cand)
     root = tree.getroot()
     merge_dependencies_in_section(pom_base, pom_cand, root, "dependencies")
     merge_dependencies_in_section(pom_base, pom_cand, root, "dependencyManagement")
+    return tree
+
+
+def get_element_signature(element: ET.Element, version: str) -> tuple:
+    """Returns the tag, text and children of the element, ignoring whitespace and comments."""
+    text = (element.text or "").strip()
+    for reference in PROJECT_VERSION_REFERENCES:
+        text = text.replace(reference, version)
+    return (ET.QName(element).localname, text,
+            tuple(get_element_signature(child, version) for child in element if isinstance(child.tag, str)))
+
+
+def get_dependency_signature(pom: ET.ElementTree) -> tuple:
+    """
+    Returns the sections of the POM that determine the dependencies Maven resolves for it. References to the project
+    version are resolved, as they point to other artifacts in other versions (e.g. modules released together).
+    """
+    root = pom.getroot()
+    version = root.find("maven:version", namespace)
+    if version is None:
+        version = root.find("maven:parent/maven:version", namespace)
+    version = version.text.strip() if version is not None and version.text else ""
+    return tuple(get_element_signature(section, version) for section in root
+                 if isinstance(section.tag, str) and ET.QName(section).localname in DEPENDENCY_SECTIONS)
+
+
+def get_merged_pom_digest(pom_base: pathlib.Path, pom_cand: pathlib.Path) -> str:
+    return hashlib.sha256(ET.tostring(get_merged_pom(pom_base, pom_cand))).hexdigest()
+
+
+def merge_poms(pom_base: pathlib.Path, pom_cand: pathlib.Path, save_to_path: pathlib.Path):
+    tree = get_merged_pom(pom_base, pom_cand)
     tree.write(save_to_path, doctype='<?xml version="1.0" encoding="UTF-8"?>', encoding='UTF-8')
 
 
-def run_tests(base: BaseTemplate, candidate: CandidateTemplate) -> set[TestFailure]:
-    """Runs the base tests on the candidate code and returns the set of test failures."""
-    old_dir = os.getcwd()
+def kill_process_group(process: subprocess.Popen):
+    """Kills the process and everything it started in its session, e.g. the forked surefire JVMs."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
 
-    # Store info in temporary directory
-    with tempfile.TemporaryDirectory() as temp_dir:
+def get_test_command(tests: set[str] = None) -> list[str]:
+    """Returns the command running the base tests, only the given test classes if any."""
+    command = ["mvn", "surefire:test"]
+    if tests:
+        command += [f"-Dtest={','.join(sorted(tests))}", "-Dsurefire.failIfNoSpecifiedTests=false"]
+    return command
+
+
+def run_tests_until_regression(command: list[str], cwd: pathlib.Path, reports_dir: pathlib.Path,
+                               baseline_failures: set[TestFailure] = None, timeout=TEST_TIMEOUT,
+                               stop: threading.Event = None) -> Optional[set[TestFailure]]:
+    """
+    Runs the test command in cwd while watching the reports that appear in reports_dir. If the baseline failures are
+    given, the run is killed as soon as a test fails that did not fail in the baseline, and if the baseline has no
+    failures, surefire itself is also told to skip the remaining tests after the first failure.
+    The run is also killed once the stop event is set, e.g. because another shard found a regression.
+    :return: the failures found up to the first regression or the stop, or None if the run completed
+    """
+    if baseline_failures is not None and not baseline_failures:
+        command = command + ["-Dsurefire.skipAfterFailureCount=1"]
+    process = subprocess.Popen(command, cwd=cwd, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    parsed = set()
+    failures = set()
+    try:
+        while True:
+            finished = process.poll() is not None  # Scan once more after the run ends to see the last reports
+            if baseline_failures is not None and os.path.isdir(reports_dir):
+                for filename in sorted(set(os.listdir(reports_dir)) - parsed):
+                    if not (filename.startswith("TEST-") and filename.endswith(".xml")):
+                        continue
+                    try:
+                        failures.update(parse_report(reports_dir / filename, strict=True)[1])
+                    except ElementTree.ParseError:
+                        continue  # Still being written, parse it on the next scan
+                    parsed.add(filename)
+                    regressions = failures - baseline_failures
+                    if regressions:
+                        print(f"Stopping test run at the first regressions: {regressions}")
+                        return failures
+            if finished:
+                return None
+            if stop is not None and stop.is_set():
+                return failures
+            if time.monotonic() > deadline:
+                raise CandidateMavenTestTimeout(f"mvn surefire:test lasted more than {timeout}s")
+            time.sleep(REPORT_POLL_INTERVAL)
+    finally:
+        if process.poll() is None:
+            kill_process_group(process)
+
+
+def get_shards(test_durations: dict[str, float], shards: int) -> list[set[str]]:
+    """
+    Splits the test classes into at most the given number of shards of about the same total duration, by assigning
+    the longest remaining test class to the shard with the lowest total duration.
+    """
+    heap = [(0.0, i, set()) for i in range(min(shards, len(test_durations)))]
+    for test_class, duration in sorted(test_durations.items(), key=lambda item: (-item[1], item[0])):
+        total, i, shard = heapq.heappop(heap)
+        shard.add(test_class)
+        heapq.heappush(heap, (total + duration, i, shard))
+    return [shard for _, _, shard in sorted(heap, key=lambda entry: entry[1])]
+
+
+def assemble_test_workspace(base: BaseTemplate, candidate: CandidateTemplate, merged_pom: pathlib.Path,
+                            workspace: pathlib.Path):
+    """Assembles the base template target and the candidate template target as target of the workspace."""
+    os.makedirs(workspace, exist_ok=True)
+    if merged_pom != workspace / "pom.xml":
+        shutil.copyfile(merged_pom, workspace / "pom.xml")
+    temp_target = pathlib.Path.joinpath(workspace, "target")
+    stats = assemble_workspace([base.target_path, candidate.target_path], temp_target)
+    print(f"Assembled {temp_target}: {stats}")
+    assert os.path.isdir(temp_target)
+
+
+def run_shard(base: BaseTemplate, candidate: CandidateTemplate, merged_pom: pathlib.Path, workspace: pathlib.Path,
+              tests: set[str], baseline_failures: set[TestFailure], stop: threading.Event) -> set[TestFailure]:
+    """
+    Runs the given test classes in their own workspace, so each shard has its own surefire reports and temporary
+    files, and returns their failures. Sets the stop event when the shard finds a regression or fails.
+    """
+    try:
+        assemble_test_workspace(base, candidate, merged_pom, workspace)
+        reports_dir = workspace / "target" / "surefire-reports"
+        test_failures = run_tests_until_regression(get_test_command(tests), workspace, reports_dir,
+                                                   baseline_failures=baseline_failures, timeout=SHARD_TIMEOUT,
+                                                   stop=stop)
+        if test_failures is not None:
+            if baseline_failures is not None and test_failures - baseline_failures:
+                stop.set()
+            return test_failures
+        return get_test_failures_from_dir(reports_dir) if os.path.isdir(reports_dir) else set()
+    except BaseException:
+        stop.set()
+        raise
+
+
+def run_sharded_tests(base: BaseTemplate, candidate: CandidateTemplate, temp_dir: pathlib.Path,
+                      shards: list[set[str]], baseline_failures: set[TestFailure] = None) -> set[TestFailure]:
+    """Runs the shards in parallel and merges their failures into a single set."""
+    print(f"Running {sum(len(shard) for shard in shards)} test classes in {len(shards)} shards")
+    merged_pom = temp_dir / "pom.xml"
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(run_shard, base, candidate, merged_pom, temp_dir / f"shard-{i}", shard,
+                                   baseline_failures, stop)
+                   for i, shard in enumerate(shards)]
+        test_failures = set()
+        for future in futures:
+            test_failures.update(future.result())
+    if not any(os.path.isdir(temp_dir / f"shard-{i}" / "target" / "surefire-reports") for i in range(len(shards))):
+        raise MavenSurefireTestFailedException(f"Ran {base.tag_name} tests on {candidate.tag_name} source, "
+                                               f"but found no surefire-reports")
+    return test_failures
+
+
+def run_tests(base: BaseTemplate, candidate: CandidateTemplate, baseline_failures: set[TestFailure] = None,
+              tests: set[str] = None, shards=TEST_SHARDS) -> set[TestFailure]:
+    """
+    Runs the base tests on the candidate code and returns the set of test failures.
+    If the baseline failures are given, the run stops at the first test failing that is not one of them, and only the
+    failures found up to that point are returned.
+    If tests are given, only those test classes are run.
+    If shards > 1, the test classes that ran in the base are split into that many shards, which run in parallel in
+    their own workspaces, each under SHARD_TIMEOUT.
+    """
+    # Store info in temporary directory, next to the templates so their files can be hardlinked
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=tempfile.tempdir or SCRATCH_DIR) as temp_dir:
         print(f"Made temp dir: {temp_dir}")
         temp_dir = pathlib.Path(temp_dir)
         assert os.path.isdir(temp_dir)
 
-        # Copy base template target as target in temporary directory
-        print(f"Copying {base.target_path} into {temp_dir}")
-        subprocess.run(["cp", "-r", base.target_path, temp_dir])
-        temp_target = pathlib.Path.joinpath(temp_dir, "target")
-        assert os.path.isdir(temp_target)
-
-        # Copy candidate template into temporary directory
         assert os.path.isfile(candidate.pom_path)
         merge_poms(base.pom_path, candidate.pom_path, save_to_path=temp_dir / "pom.xml")
-        subprocess.run(["cp", "-r", candidate.target_path, temp_dir])
+        if shards > 1:
+            test_durations = get_test_class_durations(base.target_path / "surefire-reports_BASE")
+            if tests is not None:
+                test_durations = {test_class: duration for test_class, duration in test_durations.items()
+                                  if test_class in tests}
+            if len(test_durations) > 1:
+                return run_sharded_tests(base, candidate, temp_dir, get_shards(test_durations, shards),
+                                         baseline_failures=baseline_failures)
+
+        # Assemble the base template target and the candidate template target as target in temporary directory
+        assemble_test_workspace(base, candidate, temp_dir / "pom.xml", temp_dir)
+        temp_target = pathlib.Path.joinpath(temp_dir, "target")
 
         # Run base tests on candidate and collect the results
-        os.chdir(temp_dir)
-        try:
-            subprocess.run(["mvn", "surefire:test"], timeout=TEST_TIMEOUT)
-        except subprocess.TimeoutExpired:
-            os.chdir(old_dir)
-            raise CandidateMavenTestTimeout(f"mvn surefire:test lasted more than {TEST_TIMEOUT}s")
         cand_test_reports_dir = pathlib.Path.joinpath(temp_target, "surefire-reports")
+        command = get_test_command(tests)
+        if baseline_failures is not None:
+            test_failures = run_tests_until_regression(command, temp_dir, cand_test_reports_dir, baseline_failures)
+            if test_failures is not None:
+                return test_failures
+        else:
+            try:
+                subprocess.run(command, cwd=temp_dir, timeout=TEST_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                raise CandidateMavenTestTimeout(f"mvn surefire:test lasted more than {TEST_TIMEOUT}s")
         if not os.path.isdir(cand_test_reports_dir):
-            os.chdir(old_dir)
             raise MavenSurefireTestFailedException(f"Ran {base.tag_name} tests on {candidate.tag_name} source, "
                                                    f"but found no surefire-reports")
         test_failures = get_test_failures_from_dir(cand_test_reports_dir)
-        os.chdir(old_dir)
 
         return test_failures
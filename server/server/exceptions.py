@@ -6,6 +6,10 @@ class CandidateJarNotFoundException(Exception):
     """Raised when a candidate jar used for compatibility comparison with the base jar is not found."""
 
 
+class JapicmpFailedException(Exception):
+    """Raised when japicmp failed on a jar pair for another reason than an incompatibility between the jars."""
+
+
 class PomNotFoundException(Exception):
     """Raised when the pom could not be found."""
 
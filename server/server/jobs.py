@@ -0,0 +1,207 @@
+"""
+Durable queue of compatibility generation jobs. The server enqueues the GAVs it has no mapping for, and a pool of
+generator worker processes (`marco-worker`) consumes the queue, so lookups never block on the generator.
+The queue is an SQLite database in WAL mode, shared by the server and any number of worker pools on the same host.
+"""
+import argparse
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing
+from multiprocessing import Process
+from pathlib import Path
+from typing import Optional
+
+from server import find_compatible_versions
+from server.config import JOB_QUEUE, JOB_POLL_INTERVAL, JOB_RETRY_AFTER, JOB_MAX_CANDIDATES
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+COLUMNS = ["id", "gav", "status", "error", "worker", "attempts", "enqueued_at", "started_at", "finished_at"]
+
+
+def get_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_worker_alive(worker: str) -> bool:
+    """Returns False if the worker ran on this host and its process no longer exists."""
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True  # Cannot tell for workers on other hosts
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """SQLite queue of generation jobs, one row per job. Claims are serialized with immediate transactions."""
+
+    def __init__(self, path: Path = JOB_QUEUE):
+        self.path = Path(path)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                             "id INTEGER PRIMARY KEY AUTOINCREMENT, gav TEXT NOT NULL, status TEXT NOT NULL, "
+                             "error TEXT NOT NULL DEFAULT '', worker TEXT NOT NULL DEFAULT '', "
+                             "attempts INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL, started_at REAL, "
+                             "finished_at REAL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS jobs_gav ON jobs (gav)")
+                conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)  # Transactions are begun explicitly
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def enqueue(self, gav: str, retry_after: float = JOB_RETRY_AFTER) -> int:
+        """
+        Adds a job generating the compatibility mapping of the GAV and returns its id. If the GAV already has a job,
+        its id is returned instead, unless that job failed more than retry_after seconds ago.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id, status, finished_at FROM jobs WHERE gav = ? ORDER BY id DESC LIMIT 1",
+                                   (gav,)).fetchone()
+                if row is not None:
+                    job_id, status, finished_at = row
+                    if status != FAILED or time.time() - finished_at < retry_after:
+                        conn.execute("COMMIT")
+                        return job_id
+                job_id = conn.execute("INSERT INTO jobs (gav, status, enqueued_at) VALUES (?, ?, ?)",
+                                      (gav, QUEUED, time.time())).lastrowid
+                conn.execute("COMMIT")
+                return job_id
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, worker: str) -> Optional[tuple[int, str]]:
+        """Marks the oldest queued job as running on the worker and returns its (id, gav), or None if there is none."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id, gav FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                                   (QUEUED,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started_at = ? "
+                                 "WHERE id = ?", (RUNNING, worker, time.time(), row[0]))
+                conn.execute("COMMIT")
+                return row
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def complete(self, job_id: int):
+        self._finish(job_id, DONE)
+
+    def fail(self, job_id: int, error: str):
+        self._finish(job_id, FAILED, error)
+
+    def _finish(self, job_id: int, status: str, error=""):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                         (status, error, time.time(), job_id))
+
+    def get(self, job_id: int) -> Optional[dict]:
+        """Returns the job with the given id as a dict, or None if there is no such job."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(COLUMNS, row)) if row is not None else None
+
+    def requeue_orphaned(self) -> int:
+        """Puts the running jobs of workers on this host that no longer exist back in the queue."""
+        requeued = 0
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for job_id, worker in conn.execute("SELECT id, worker FROM jobs WHERE status = ?",
+                                                   (RUNNING,)).fetchall():
+                    if not is_worker_alive(worker):
+                        conn.execute("UPDATE jobs SET status = ?, worker = '' WHERE id = ?", (QUEUED, job_id))
+                        requeued += 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return requeued
+
+    def stats(self) -> dict[str, int]:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def run_job(gav: str, max_candidates=JOB_MAX_CANDIDATES, jobs=1):
+    g, a, v = gav.split(":")
+    find_compatible_versions(g, a, v, max_num=max_candidates, silent=True, jobs=jobs)
+
+
+def work(queue_path: Path = JOB_QUEUE, poll_interval: float = JOB_POLL_INTERVAL, max_candidates=JOB_MAX_CANDIDATES,
+         jobs=1):
+    """
+    Consumes the queue forever, running one generation job at a time. Before each claim, the jobs of workers that died
+    (e.g. killed for running out of memory) are put back in the queue, as they would otherwise stay running forever.
+    """
+    queue = JobQueue(queue_path)
+    worker = get_worker_name()
+    print(f"Worker {worker} consuming {queue_path}")
+    while True:
+        requeued = queue.requeue_orphaned()
+        if requeued:
+            print(f"Worker {worker} requeued {requeued} jobs of workers that no longer exist")
+        claimed = queue.claim(worker)
+        if claimed is None:
+            time.sleep(poll_interval)
+            continue
+        job_id, gav = claimed
+        print(f"Worker {worker} generating {gav} (job {job_id})")
+        try:
+            run_job(gav, max_candidates=max_candidates, jobs=jobs)
+        except Exception as e:
+            print(f"Job {job_id} for {gav} failed: {e!r}")
+            queue.fail(job_id, repr(e))
+        else:
+            queue.complete(job_id)
+
+
+def main():
+    """
+    Example: marco-worker --workers 4
+    """
+    cli = argparse.ArgumentParser(description='Compatibility Generation Workers')
+    cli.add_argument('--workers', type=int, default=1, help='number of generator worker processes')
+    cli.add_argument('--jobs', type=int, default=1,
+                     help='number of candidate versions each worker evaluates in parallel')
+    cli.add_argument('--max_candidates', type=int, default=JOB_MAX_CANDIDATES,
+                     help='maximum number of downgrade/upgrade candidates to consider per job')
+    cli.add_argument('--poll_interval', type=float, default=JOB_POLL_INTERVAL,
+                     help='seconds to wait before polling an empty queue again')
+
+    args = cli.parse_args()
+    queue = JobQueue()
+    print(f"Requeued {queue.requeue_orphaned()} jobs of workers that no longer exist")
+    workers = [Process(target=work, kwargs={'poll_interval': args.poll_interval,
+                                            'max_candidates': args.max_candidates, 'jobs': args.jobs})
+               for _ in range(args.workers)]
+    for process in workers:
+        process.start()
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        for process in workers:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Module containing the helpers used to evaluate candidate versions on a pool of worker processes."""
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from server.config import SCRATCH_DIR
+
+# Set in each worker process by init_worker, None in the main process
+_worker_scratch_dir: Optional[Path] = None
+
+
+def init_worker():
+    """
+    Gives the worker process its own scratch directory, which is used for its temporary files (e.g. test workspaces).
+    The directory is removed when the worker exits.
+    """
+    global _worker_scratch_dir
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    _worker_scratch_dir = Path(tempfile.mkdtemp(dir=SCRATCH_DIR, prefix="worker-"))
+    tempfile.tempdir = str(_worker_scratch_dir)
+    Finalize(None, shutil.rmtree, args=(_worker_scratch_dir,), kwargs={'ignore_errors': True}, exitpriority=10)
+
+
+def create_executor(jobs: int) -> Optional[Executor]:
+    """Returns a process pool with the given number of workers, or None if candidates should be evaluated in-process."""
+    if jobs is None or jobs <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=jobs, initializer=init_worker)
+
+
+def evaluate_in_order(evaluate: Callable, candidates: list[str], is_cutoff_reached: Callable[[], bool],
+                      executor: Executor = None, window=1) -> Iterator[tuple[str, object]]:
+    """
+    Yields (candidate, evaluate(candidate)) in the order of the candidates, stopping as soon as is_cutoff_reached()
+    returns True. With an executor, up to window candidates are evaluated ahead of the one that is yielded next, and
+    the outstanding evaluations are cancelled once the cutoff is reached. Because results are still consumed in order,
+    the cutoff is reached at exactly the same candidate as when evaluating one at a time.
+    """
+    if executor is None:
+        for cv in candidates:
+            if is_cutoff_reached():
+                return
+            yield cv, evaluate(cv)
+        return
+
+    remaining = iter(candidates)
+    pending = deque()
+
+    def submit_next():
+        cv = next(remaining, None)
+        if cv is not None:
+            pending.append((cv, executor.submit(evaluate, cv)))
+
+    try:
+        for _ in range(max(window, 1)):
+            submit_next()
+        while pending:
+            if is_cutoff_reached():
+                return
+            cv, future = pending.popleft()
+            result = future.result()
+            submit_next()
+            yield cv, result
+    finally:
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,113 @@
+"""
+Module responsible for downloading the jars of all candidate versions of a GA into PATH_TO_JARS before the static
+checks run, so the candidate loop only reads from PATH_TO_JARS instead of starting Maven once per missing jar.
+"""
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from core import get_repository_url, HTTP_headers
+from core.http_cache import get_session, POOL_MAXSIZE
+from server.config import PATH_TO_JARS
+
+maven_lock = threading.Lock()  # Serializes the Maven fallback of concurrent prefetches in this process
+
+
+def get_jar_path(a: str, v: str) -> Path:
+    return PATH_TO_JARS / f"{a}-{v}.jar"
+
+
+def get_jar_url(g: str, a: str, v: str, repository_url: str) -> str:
+    return f"{repository_url}/{g.replace('.', '/')}/{a}/{v}/{a}-{v}.jar"
+
+
+def get_expected_sha1(jar_url: str) -> Optional[str]:
+    """Returns the published sha1 of the jar, or None if the repository has no .sha1 file for it."""
+    try:
+        response = get_session().get(f"{jar_url}.sha1", headers=HTTP_headers, timeout=30)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200 or not response.text.strip():
+        return None
+    # Some repositories append the file name to the checksum
+    return response.text.split()[0].lower()
+
+
+def download_jar(g: str, a: str, v: str, repository_url: str) -> bool:
+    """
+    Downloads the jar of the GAV into PATH_TO_JARS, verifying it against the published sha1 if there is one.
+    :return: True if the jar is in PATH_TO_JARS afterwards, False otherwise
+    """
+    jar_url = get_jar_url(g, a, v, repository_url)
+    try:
+        response = get_session().get(jar_url, headers=HTTP_headers, timeout=60, stream=True)
+    except requests.RequestException as e:
+        print(f"Could not download {jar_url}: {e}")
+        return False
+    if response.status_code != 200:
+        return False
+
+    os.makedirs(PATH_TO_JARS, exist_ok=True)
+    sha1 = hashlib.sha1()
+    fd, tmp_path = tempfile.mkstemp(dir=PATH_TO_JARS, prefix=f".{a}-{v}-", suffix=".jar")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                sha1.update(chunk)
+                f.write(chunk)
+        expected_sha1 = get_expected_sha1(jar_url)
+        if expected_sha1 is not None and expected_sha1 != sha1.hexdigest():
+            print(f"Checksum mismatch for {jar_url}: expected {expected_sha1}, got {sha1.hexdigest()}")
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, get_jar_path(a, v))  # Never leave a partially downloaded jar in PATH_TO_JARS
+        return True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def copy_jar_with_maven(g: str, a: str, v: str) -> bool:
+    """
+    Fallback for jars the repository does not serve directly, e.g. relocated artifacts. Maven runs one at a time, as
+    concurrent runs contend for the local repository and its lock files.
+    """
+    with maven_lock:
+        subprocess.run(["mvn", "dependency:copy", f"-Dartifact={g}:{a}:{v}",
+                        "-DexcludeTransitive=true", f"-DoutputDirectory={PATH_TO_JARS}"])
+    return os.path.isfile(get_jar_path(a, v))
+
+
+def prefetch_jar(g: str, a: str, v: str, repository_url: str) -> bool:
+    if os.path.isfile(get_jar_path(a, v)):
+        return True
+    return download_jar(g, a, v, repository_url)
+
+
+def prefetch_jars(g: str, a: str, versions: list[str], use_local=False) -> dict[str, bool]:
+    """
+    Makes sure the jars of all given versions of the GA are in PATH_TO_JARS. Missing jars are downloaded concurrently
+    over the pooled HTTP session from Maven Central, or from the MaRCo Maven repository if use_local is set. The jars
+    that could not be downloaded are then copied with Maven, one after the other.
+    :return: dict from version to True if its jar is available, False otherwise
+    """
+    repository_url = get_repository_url(use_local)
+    missing = [v for v in dict.fromkeys(versions) if not os.path.isfile(get_jar_path(a, v))]
+    available = {v: True for v in versions if v not in missing}
+    if missing:
+        print(f"Prefetching {len(missing)} jars of {g}:{a}")
+        with ThreadPoolExecutor(max_workers=min(len(missing), POOL_MAXSIZE)) as executor:
+            results = executor.map(lambda v: prefetch_jar(g, a, v, repository_url), missing)
+            available.update(zip(missing, results))
+        for v in missing:
+            if not available[v]:
+                available[v] = copy_jar_with_maven(g, a, v)
+    return available
@@ -0,0 +1,132 @@
+"""
+Repository cache used to build templates. Each Github repository is cloned once into a bare, blobless mirror
+(git clone --mirror --filter=blob:none), and every commit that needs to be built gets its own lightweight git worktree,
+so templates of different versions of the same repository can be prepared in parallel.
+Worktrees only live while their template is being prepared; `marco-repo-cache gc` prunes any that were left behind.
+"""
+import argparse
+import fcntl
+import os
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from server.config import MIRRORS_DIR, WORKTREES_DIR
+from server.exceptions import GithubRepoDownloadFailedException
+
+
+@contextmanager
+def locked(lock_path: Path):
+    """Holds an exclusive lock on lock_path, shared between threads and processes."""
+    os.makedirs(lock_path.parent, exist_ok=True)
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def git(*args, cwd: Path = None) -> subprocess.CompletedProcess:
+    return subprocess.run(["git"] + list(args), cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def get_mirror_path(repo_name: str) -> Path:
+    return MIRRORS_DIR / f"{repo_name}.git"
+
+
+def has_commit(mirror_path: Path, commit_sha: str) -> bool:
+    return git("cat-file", "-e", f"{commit_sha}^{{commit}}", cwd=mirror_path).returncode == 0
+
+
+def get_mirror(repo_name: str, commit_sha: str = None) -> Path:
+    """
+    Returns the path to the mirror of the Github repository <owner>/<repo>, cloning it if it does not exist yet and
+    fetching if it does not contain the given commit yet.
+    """
+    mirror_path = get_mirror_path(repo_name)
+    with locked(mirror_path.with_name(f"{mirror_path.name}.lock")):
+        if not os.path.isdir(mirror_path):
+            print(f"Mirroring {repo_name} into {mirror_path}")
+            out = git("clone", "--mirror", "--filter=blob:none", f"https://github.com/{repo_name}.git",
+                      str(mirror_path))
+            if out.returncode != 0:
+                shutil.rmtree(mirror_path, ignore_errors=True)
+                raise GithubRepoDownloadFailedException(f"Could not clone repo {repo_name}: {out.stderr}")
+        if commit_sha and not has_commit(mirror_path, commit_sha):
+            git("fetch", "--prune", "origin", cwd=mirror_path)
+            if not has_commit(mirror_path, commit_sha):
+                # Commits that are not reachable from any ref (e.g. of deleted tags) can still be fetched by sha
+                git("fetch", "origin", commit_sha, cwd=mirror_path)
+    return mirror_path
+
+
+@contextmanager
+def worktree(repo_name: str, commit_sha: str, worktrees_dir: Path = WORKTREES_DIR) -> Iterator[Path]:
+    """
+    Checks out the commit of the repository into its own worktree, yields its path and removes the worktree
+    afterwards. Only one user at a time gets the worktree of a commit, as builds write into it.
+    """
+    mirror_path = get_mirror(repo_name, commit_sha)
+    worktree_path = Path(worktrees_dir).resolve() / repo_name / commit_sha
+    with locked(worktree_path.with_name(f"{commit_sha}.lock")):
+        with locked(mirror_path.with_name(f"{mirror_path.name}.lock")):
+            if os.path.isdir(worktree_path):
+                # Left behind by a run that was killed, start from a clean checkout
+                remove_worktree(mirror_path, worktree_path)
+            out = git("worktree", "add", "--detach", "--force", str(worktree_path), commit_sha, cwd=mirror_path)
+            if out.returncode != 0:
+                raise GithubRepoDownloadFailedException(f"Could not check out {commit_sha} of {repo_name}: "
+                                                        f"{out.stderr}")
+        try:
+            yield worktree_path
+        finally:
+            with locked(mirror_path.with_name(f"{mirror_path.name}.lock")):
+                remove_worktree(mirror_path, worktree_path)
+
+
+def remove_worktree(mirror_path: Path, worktree_path: Path):
+    git("worktree", "remove", "--force", str(worktree_path), cwd=mirror_path)
+    shutil.rmtree(worktree_path, ignore_errors=True)
+    git("worktree", "prune", cwd=mirror_path)
+
+
+def gc(max_age: float = 0):
+    """Removes worktrees not modified for max_age seconds and prunes the worktree administration of all mirrors."""
+    now = time.time()
+    if os.path.isdir(WORKTREES_DIR):
+        for owner in os.listdir(WORKTREES_DIR):
+            for repo in os.listdir(WORKTREES_DIR / owner):
+                repo_dir = WORKTREES_DIR / owner / repo
+                for name in os.listdir(repo_dir):
+                    path = repo_dir / name
+                    if os.path.isdir(path) and now - os.path.getmtime(path) >= max_age:
+                        print(f"Removing worktree {path}")
+                        with locked(repo_dir / f"{name}.lock"):
+                            shutil.rmtree(path, ignore_errors=True)
+    if os.path.isdir(MIRRORS_DIR):
+        for owner in os.listdir(MIRRORS_DIR):
+            for name in os.listdir(MIRRORS_DIR / owner):
+                if name.endswith(".git") and os.path.isdir(MIRRORS_DIR / owner / name):
+                    git("worktree", "prune", cwd=MIRRORS_DIR / owner / name)
+
+
+def main():
+    """
+    Example: marco-repo-cache gc --max_age 3600
+    """
+    cli = argparse.ArgumentParser(description='Repository Cache')
+    cli.add_argument('command', choices=['gc'], help='remove left-behind worktrees and prune the mirrors')
+    cli.add_argument('--max_age', type=float, default=0,
+                     help='only remove worktrees that were not modified for the given number of seconds')
+
+    args = cli.parse_args()
+    gc(max_age=args.max_age)
+
+
+if __name__ == "__main__":
+    main()
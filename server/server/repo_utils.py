@@ -1,20 +1,17 @@
-import os
 import subprocess
 from pathlib import Path
 import logging
 
 from server.test_failure import at_least_one_passing_test
-from server.config import COMPILE_TIMEOUT, TEST_TIMEOUT
+from server.config import COMPILE_TIMEOUT, TEST_TIMEOUT, TEST_SHARDS
 
 logger = logging.getLogger(__name__)
 
 
 def get_sha_of_repo_head(repo_path: Path) -> str:
     assert Path.is_dir(repo_path)
-    old_dir = os.getcwd()
-    os.chdir(repo_path)
-    out = subprocess.run(["git", "rev-parse", "--verify", "HEAD"], stdout=subprocess.PIPE, universal_newlines=True)
-    os.chdir(old_dir)
+    out = subprocess.run(["git", "rev-parse", "--verify", "HEAD"], cwd=repo_path, stdout=subprocess.PIPE,
+                         universal_newlines=True)
     sha = out.stdout
     return sha
 
@@ -27,14 +24,15 @@ def repo_has_tests(repo_path: Path) -> bool:
 def run_repo_tests(repo_path: Path) -> bool:
     assert Path.is_dir(repo_path)
     assert Path.is_dir(repo_path / "target")
-    old_dir = os.getcwd()
-    os.chdir(repo_path)
+    repo_path = repo_path.resolve()
     try:
-        subprocess.run(["mvn", "surefire:test"], timeout=TEST_TIMEOUT)
+        command = ["mvn", "surefire:test"]
+        if TEST_SHARDS > 1:
+            command.append(f"-DforkCount={TEST_SHARDS}")  # Spread the test classes over parallel forked JVMs
+        subprocess.run(command, cwd=repo_path, timeout=TEST_TIMEOUT)
         has_tests = at_least_one_passing_test(repo_path / "target" / "surefire-reports")
     except subprocess.TimeoutExpired:
         has_tests = False
-    os.chdir(old_dir)
     return has_tests
 
 
@@ -44,18 +42,16 @@ def repo_compiles(repo_path: Path) -> bool:
 
 def compile_only_repo(repo_path: Path, log_name="compile.log") -> bool:
     assert Path.is_dir(repo_path)
+    repo_path = repo_path.resolve()
     log_path = repo_path / log_name
     compiles = False
-    old_dir = os.getcwd()
-    os.chdir(repo_path)
     try:
-        subprocess.run(["mvn", "clean", "test-compile", "-Dspotbugs.skip=true", "-Dspotless.check.skip=True", "-Dspotless.apply.skip=True", "-l", log_path], timeout=COMPILE_TIMEOUT)
+        subprocess.run(["mvn", "clean", "test-compile", "-Dspotbugs.skip=true", "-Dspotless.check.skip=True", "-Dspotless.apply.skip=True", "-l", log_path], cwd=repo_path, timeout=COMPILE_TIMEOUT)
         if Path.is_file(log_path):
             with open(log_path, 'r') as f:
                 compiles = "BUILD SUCCESS" in f.read()
     except subprocess.TimeoutExpired:
         pass
-    os.chdir(old_dir)
     return compiles
 
 
@@ -65,15 +61,15 @@ def compile_repo(repo_path: Path, use_pom="pom.xml", save_as=None) -> bool:
     be configured by some projects to run during test-compile so we add the skip flags."""
     logger.debug(f"Compiling repo {repo_path}, save log as {save_as}")
     assert Path.is_dir(repo_path)
-    old_dir = os.getcwd()
-    os.chdir(repo_path)
+    repo_path = repo_path.resolve()
     pom_path = repo_path / use_pom
     save_as_command = ["-l", repo_path / save_as] if save_as else []
     try:
         out = subprocess.run(["mvn", "clean", "test-compile", "-Dspotbugs.skip=true",
                               "-Dspotless.check.skip=True", "-Dspotless.apply.skip=True",
                               "-f", pom_path] + save_as_command,
-                             stdout=subprocess.PIPE, universal_newlines=True, timeout=COMPILE_TIMEOUT)
+                             cwd=repo_path, stdout=subprocess.PIPE, universal_newlines=True,
+                             timeout=COMPILE_TIMEOUT)
         if not save_as:
             compiles = "[INFO] BUILD SUCCESS" in out.stdout
         else:
@@ -82,5 +78,4 @@ def compile_repo(repo_path: Path, use_pom="pom.xml", save_as=None) -> bool:
     except subprocess.TimeoutExpired:
         compiles = False
 
-    os.chdir(old_dir)
     return compiles
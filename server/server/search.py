@@ -0,0 +1,231 @@
+"""
+Strategies to search the candidate versions of a GAV for compatible versions. Candidates are ordered going away from
+the base version (upgrades or downgrades). evaluate(cv) returns the result of evaluating a candidate, and
+verdict(result) is True if the candidate is compatible, False if it is not, or None if it could not be evaluated (e.g.
+its jar could not be found); by default the results are the verdicts themselves.
+* linear: evaluates the candidates one by one, until max_fail candidates are incompatible (the original behaviour).
+* galloping: assumes compatibility is monotonic (compatible up to a boundary, incompatible after it), probes at
+  exponentially growing distances from the base until it finds an incompatible candidate, and then bisects to find the
+  boundary. Candidates without a verdict are skipped, going away from the base and then back towards it. Candidates it
+  did not evaluate are inferred from the boundary. With an executor and a window > 1, the probes the search may need
+  next are evaluated speculatively alongside the current one: the following galloping probes, or the midpoints of both
+  halves of the current bisection interval, window candidates at a time.
+* budgeted: galloping, but evaluating at most budget candidates (known results, e.g. from the store, are free). If the
+  budget runs out before the boundary is found, the candidates between the last compatible and the first incompatible
+  probe are left undecided. Speculative evaluations count against the budget.
+"""
+import json
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from server.parallel import evaluate_in_order
+
+STRATEGIES = ["linear", "galloping", "budgeted"]
+DEFAULT_BUDGET = 10
+
+
+class SearchReport:
+    """Records the candidates that were actually tested and those whose verdict was inferred."""
+
+    def __init__(self, strategy: str):
+        self.strategy = strategy
+        self.tested: dict[str, Optional[bool]] = {}
+        self.inferred: dict[str, bool] = {}
+        self.results: dict[str, Any] = {}  # Results of the tested candidates
+        self.missed_regressions: dict[str, list[str]] = {}  # Regressions missed by audited test selections
+
+    def compatible(self) -> set[str]:
+        return {cv for cv, verdict in self.tested.items() if verdict} | \
+               {cv for cv, verdict in self.inferred.items() if verdict}
+
+    def update(self, other: 'SearchReport'):
+        self.tested.update(other.tested)
+        self.inferred.update(other.inferred)
+        self.results.update(other.results)
+        self.missed_regressions.update(other.missed_regressions)
+
+    def to_dict(self) -> dict:
+        return {'strategy': self.strategy, 'tested': self.tested, 'inferred': self.inferred,
+                'missed_regressions': self.missed_regressions}
+
+    def write(self, path: Path, gav: str):
+        with open(path, 'w') as f:
+            json.dump({'gav': gav, **self.to_dict()}, f, indent=4)
+
+    def __repr__(self):
+        return f"SearchReport(strategy={self.strategy}, tested={len(self.tested)}, inferred={len(self.inferred)}, " \
+               f"compatible={len(self.compatible())})"
+
+
+class SearchStrategy(ABC):
+    name = ""
+    sparse = False  # Whether the strategy evaluates only a few of the candidates
+
+    @abstractmethod
+    def search(self, evaluate: Callable[[str], Any], candidates: list[str], executor: Executor = None, window=1,
+               verdict: Callable[[Any], Optional[bool]] = None, known: dict[str, Any] = None) -> SearchReport:
+        """
+        Searches the candidates for compatible versions. known holds the results of candidates evaluated before (e.g.
+        loaded from the store), for which evaluate must return the same result; they are not counted as evaluations.
+        """
+        pass
+
+
+class LinearSearch(SearchStrategy):
+    """Evaluates the candidates in order, stopping after max_fail incompatible candidates if max_fail is set."""
+    name = "linear"
+
+    def __init__(self, max_fail=None):
+        self.max_fail = max_fail
+
+    def search(self, evaluate: Callable[[str], Any], candidates: list[str], executor: Executor = None, window=1,
+               verdict: Callable[[Any], Optional[bool]] = None, known: dict[str, Any] = None) -> SearchReport:
+        report = SearchReport(self.name)
+        fails = 0
+        for cv, result in evaluate_in_order(evaluate, candidates,
+                                            lambda: self.max_fail is not None and fails >= self.max_fail,
+                                            executor=executor, window=window):
+            report.results[cv] = result
+            is_compatible = report.tested[cv] = verdict(result) if verdict is not None else result
+            if is_compatible is False:
+                fails += 1
+        return report
+
+
+class GallopingSearch(SearchStrategy):
+    """Finds the compatibility boundary with exponential probing followed by bisection, see the module docstring."""
+    name = "galloping"
+    sparse = True
+
+    def __init__(self, budget=None):
+        self.budget = budget
+
+    def search(self, evaluate: Callable[[str], Any], candidates: list[str], executor: Executor = None, window=1,
+               verdict: Callable[[Any], Optional[bool]] = None, known: dict[str, Any] = None) -> SearchReport:
+        report = SearchReport(self.name)
+        known = known or {}
+        evaluations = 0
+
+        def record(cv: str, result):
+            report.results[cv] = result
+            report.tested[cv] = verdict(result) if verdict is not None else result
+
+        def evaluate_ahead(indexes: Iterator[int]):
+            """Evaluates the first window candidates of indexes that still have to be evaluated concurrently, within the
+            budget. The search may not need all of them, but it finds those it does need already tested."""
+            nonlocal evaluations
+            if executor is None or window <= 1:
+                return
+            limit = window if self.budget is None else min(window, self.budget - evaluations)
+            pending = []
+            for i in indexes:
+                if len(pending) >= limit:
+                    break
+                cv = candidates[i]
+                if cv not in report.tested and cv not in known and cv not in pending:
+                    pending.append(cv)
+            if len(pending) <= 1:
+                return  # Nothing to gain over evaluating the next probe on its own
+            futures = [(cv, executor.submit(evaluate, cv)) for cv in pending]
+            for cv, future in futures:
+                record(cv, future.result())
+                evaluations += 1
+
+        def get_verdict(i: int) -> tuple[bool, Optional[bool]]:
+            """Returns (False, None) if candidate i still had to be evaluated but the budget is spent, and (True, its
+            verdict) otherwise. Candidates are evaluated at most once, and known results are not evaluated again."""
+            nonlocal evaluations
+            cv = candidates[i]
+            if cv not in report.tested:
+                if cv in known:
+                    result = known[cv]
+                elif self.budget is not None and evaluations >= self.budget:
+                    return False, None
+                else:
+                    result = executor.submit(evaluate, cv).result() if executor is not None else evaluate(cv)
+                    evaluations += 1
+                record(cv, result)
+            return True, report.tested[cv]
+
+        def probe(indexes: range) -> Optional[tuple[int, bool]]:
+            """Evaluates the candidates in order until one has a verdict, returns its index and verdict, or None if none
+            of them has a verdict or the budget is spent."""
+            for i in indexes:
+                available, is_compatible = get_verdict(i)
+                if not available:
+                    return None
+                if is_compatible is not None:
+                    return i, is_compatible
+            return None
+
+        lo = -1  # Index of the farthest known compatible candidate, -1 being the base itself
+        hi = len(candidates)  # Index of the nearest known incompatible candidate
+
+        # Gallop away from the base until an incompatible candidate is found
+        step = 1
+        while lo + step < hi:
+            evaluate_ahead(get_galloping_probes(lo, step, hi))
+            result = probe(range(lo + step, hi))
+            if result is None:
+                break
+            index, is_compatible = result
+            if not is_compatible:
+                hi = index
+                break
+            lo = index
+            step *= 2
+
+        # Bisect between the farthest compatible and the nearest incompatible candidate
+        while hi - lo > 1:
+            evaluate_ahead(get_bisection_probes(lo, hi))
+            mid = (lo + hi) // 2
+            # If no candidate from mid on has a verdict, look for one below mid before giving up
+            result = probe(range(mid, hi)) or probe(range(mid - 1, lo, -1))
+            if result is None:
+                break
+            index, is_compatible = result
+            if is_compatible:
+                lo = index
+            else:
+                hi = index
+
+        # Everything up to the boundary is compatible, everything after it is not
+        for cv in candidates[:lo + 1]:
+            if cv not in report.tested:
+                report.inferred[cv] = True
+        for cv in candidates[hi + 1:]:
+            if cv not in report.tested:
+                report.inferred[cv] = False
+        return report
+
+
+def get_galloping_probes(lo: int, step: int, hi: int) -> Iterator[int]:
+    """Yields the indexes the galloping phase probes from lo on if every probe is compatible."""
+    while lo + step < hi:
+        lo += step
+        yield lo
+        step *= 2
+
+
+def get_bisection_probes(lo: int, hi: int) -> Iterator[int]:
+    """Yields the midpoints the bisection of (lo, hi) can probe, breadth first: the midpoint of the interval, then the
+    midpoints of both its halves, and so on."""
+    intervals = [(lo, hi)]
+    while intervals:
+        lo, hi = intervals.pop(0)
+        if hi - lo > 1:
+            mid = (lo + hi) // 2
+            yield mid
+            intervals += [(lo, mid), (mid, hi)]
+
+
+def get_search_strategy(name: str, max_fail=None, budget=None) -> SearchStrategy:
+    if name == "linear":
+        return LinearSearch(max_fail=max_fail)
+    if name == "galloping":
+        return GallopingSearch()
+    if name == "budgeted":
+        return GallopingSearch(budget=budget if budget is not None else DEFAULT_BUDGET)
+    raise ValueError(f"Unknown search strategy {name}, expected one of {STRATEGIES}")
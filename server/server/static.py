@@ -1,11 +1,14 @@
 """Module containing logic related to checking jars for static compatibility (source + binary)."""
 import os
-import pathlib
+import select
 import subprocess
 from pathlib import Path
+from typing import Optional
 
-from server.config import PATH_TO_JAPICMP, PATH_TO_JARS
-from server.exceptions import BaseJarNotFoundException, CandidateJarNotFoundException
+from server.config import PATH_TO_JAPICMP, PATH_TO_BATCH_JAPICMP, JAPICMP_OPTIONS, JAPICMP_TIMEOUT
+from server.exceptions import BaseJarNotFoundException, CandidateJarNotFoundException, JapicmpFailedException
+from server.prefetch import get_jar_path
+from server.verdict_cache import StaticVerdictCache
 
 
 def run_static_check(path_to_jar_old: Path, path_to_jar_new: Path) -> bool:
@@ -20,35 +23,139 @@ def run_static_check(path_to_jar_old: Path, path_to_jar_new: Path) -> bool:
         raise FileNotFoundError(f"Could not find jar: {path_to_jar_old}")
 
     # Run CLI command
-    out = subprocess.run(["java", "-jar", PATH_TO_JAPICMP, "--ignore-missing-classes",
-                          "--error-on-binary-incompatibility", "--error-on-source-incompatibility",
-                          "--new", path_to_jar_new, "--old", path_to_jar_old],
+    out = subprocess.run(["java", "-jar", PATH_TO_JAPICMP] + JAPICMP_OPTIONS +
+                         ["--new", path_to_jar_new, "--old", path_to_jar_old],
                          stderr=subprocess.PIPE, stdout=subprocess.DEVNULL)
     # If stderr is empty, no source/binary compatibility was detected
     return not out.stderr
 
 
-def statically_compatible(g: str, a: str, v: str, cv: str) -> bool:
+class JapicmpBatchRunner:
     """
+    Long-lived JVM (libs/japicmp/BatchJapicmp.java) that runs japicmp on every jar pair written to its stdin, so the
+    JVM startup and japicmp class loading are paid once instead of once per pair. If the helper cannot be started or
+    dies, the remaining pairs fall back to run_static_check. If it takes more than timeout seconds on a pair, it is
+    killed, that pair falls back to run_static_check and the next pair starts a new helper. If japicmp fails on a pair
+    for another reason than an incompatibility, JapicmpFailedException is raised for that pair.
+    """
+
+    def __init__(self, timeout=JAPICMP_TIMEOUT):
+        self.process: Optional[subprocess.Popen] = None
+        self.failed = False
+        self.timeout = timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        try:
+            self.process = subprocess.Popen(["java", "-cp", PATH_TO_JAPICMP, PATH_TO_BATCH_JAPICMP] + JAPICMP_OPTIONS,
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                            universal_newlines=True, bufsize=1)
+        except OSError as e:
+            print(f"Could not start the batch japicmp runner, falling back to one JVM per pair: {e}")
+            self.failed = True
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    def kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def compare(self, path_to_jar_old: Path, path_to_jar_new: Path) -> bool:
+        """Same contract as run_static_check, but raises JapicmpFailedException if japicmp failed on the pair."""
+        if not os.path.isfile(path_to_jar_new):
+            raise FileNotFoundError(f"Could not find jar: {path_to_jar_new}")
+        if not os.path.isfile(path_to_jar_old):
+            raise FileNotFoundError(f"Could not find jar: {path_to_jar_old}")
+
+        if self.process is None and not self.failed:
+            self.start()
+        if self.failed:
+            return run_static_check(path_to_jar_old, path_to_jar_new)
+
+        try:
+            self.process.stdin.write(f"{path_to_jar_old}\t{path_to_jar_new}\n")
+            self.process.stdin.flush()
+            # The helper answers every pair with exactly one line, so nothing is left in the buffer between pairs
+            ready, _, _ = select.select([self.process.stdout], [], [], self.timeout)
+            if not ready:
+                print(f"The batch japicmp runner took more than {self.timeout}s on {path_to_jar_new}, "
+                      f"falling back to one JVM for this pair")
+                self.kill()
+                return run_static_check(path_to_jar_old, path_to_jar_new)
+            response = self.process.stdout.readline()
+        except (BrokenPipeError, OSError):
+            response = ""
+        verdict, _, _ = response.rstrip("\n").partition("\t")
+        if verdict == "ERROR":
+            cause = response.rstrip("\n").split("\t")[-1]
+            raise JapicmpFailedException(f"japicmp failed on {path_to_jar_old} and {path_to_jar_new}: {cause}")
+        if verdict not in ("OK", "FAIL"):
+            print("The batch japicmp runner stopped unexpectedly, falling back to one JVM per pair")
+            self.close()
+            self.failed = True
+            return run_static_check(path_to_jar_old, path_to_jar_new)
+        return verdict == "OK"
+
+
+def statically_compatible(g: str, a: str, v: str, cv: str, verdicts: dict[str, bool] = None) -> bool:
+    """
+    Compares the jars of the base and candidate version in PATH_TO_JARS, which are put there by server.prefetch.
     :param g: groupId
     :param a: artifactId
     :param v: base version
     :param cv: candidate version
+    :param verdicts: verdicts precomputed by statically_compatible_batch, used instead of running japicmp if present
     :return: True if candidate version is statically compatible with base version, False otherwise
     """
-    old_jar = pathlib.Path.joinpath(PATH_TO_JARS, f"{a}-{v}.jar")
-    new_jar = pathlib.Path.joinpath(PATH_TO_JARS, f"{a}-{cv}.jar")
+    if verdicts and cv in verdicts:
+        return verdicts[cv]
 
-    if not os.path.isfile(old_jar):
-        subprocess.run(["mvn", "dependency:copy", f"-Dartifact={g}:{a}:{v}",
-                        "-DexcludeTransitive=true", f"-DoutputDirectory={PATH_TO_JARS}"])
+    old_jar = get_jar_path(a, v)
     if not os.path.isfile(old_jar):
         raise BaseJarNotFoundException(f"Could not find base jar for the static compatibility check: {old_jar}")
 
-    if not os.path.isfile(new_jar):
-        subprocess.run(["mvn", "dependency:copy", f"-Dartifact={g}:{a}:{cv}",
-                        "-DexcludeTransitive=true", f"-DoutputDirectory={PATH_TO_JARS}"])
+    new_jar = get_jar_path(a, cv)
     if not os.path.isfile(new_jar):
         raise CandidateJarNotFoundException(f"Could not find candidate jar for static compatibility check: {new_jar}")
 
-    return run_static_check(old_jar, new_jar)
+    return StaticVerdictCache().check(old_jar, new_jar, run_static_check)
+
+
+def statically_compatible_batch(g: str, a: str, v: str, cv_versions: list[str]) -> dict[str, bool]:
+    """
+    Checks all candidate versions against the base version in a single JVM.
+    :return: dict from candidate version to True if statically compatible, False otherwise. Candidates whose jar cannot
+    be found are left out, so statically_compatible raises CandidateJarNotFoundException for them. Pairs japicmp failed
+    on in the batch are checked with a single call, whose verdict is not cached.
+    """
+    old_jar = get_jar_path(a, v)
+    if not os.path.isfile(old_jar):
+        raise BaseJarNotFoundException(f"Could not find base jar for the static compatibility check: {old_jar}")
+
+    verdicts = {}
+    cache = StaticVerdictCache()
+    with JapicmpBatchRunner() as runner:  # The JVM is only started if a pair is not in the cache
+        for cv in cv_versions:
+            new_jar = get_jar_path(a, cv)
+            if not os.path.isfile(new_jar):
+                continue
+            try:
+                verdicts[cv] = cache.check(old_jar, new_jar, runner.compare)
+            except JapicmpFailedException as e:
+                print(f"{e}, falling back to one JVM for this pair")
+                verdicts[cv] = run_static_check(old_jar, new_jar)
+    return verdicts
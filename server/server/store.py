@@ -0,0 +1,504 @@
+"""Module containing the compatibility store backends and the in-memory index used to serve compatibility mappings
+without re-reading the store."""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from core import get_available_versions, get_metadata_ga, parse_available_versions, MavenMetadataNotFound
+from core.range_converter import convert_to_range
+from server.config import COMPATIBILITY_STORE, COMPATIBILITY_DB, COMPATIBILITY_BACKEND
+
+
+def set_default(obj):
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError
+
+
+def split_gav(gav: str) -> tuple[str, str, str]:
+    g, a, v = gav.split(":")
+    return g, a, v
+
+
+def get_file_fingerprint(path: Path):
+    """Returns (inode, mtime, size) of the given file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class CompatibilityStore(ABC):
+    """Abstract class for the backends storing the compatibility mappings (GAV => compatible versions)."""
+
+    @abstractmethod
+    def load(self) -> dict[str, set]:
+        """Returns all compatibility mappings in the store."""
+        pass
+
+    @abstractmethod
+    def get(self, gav: str) -> set[str]:
+        """Returns the compatible versions of the given GAV, or an empty set if the GAV is not in the store."""
+        pass
+
+    @abstractmethod
+    def get_by_ga(self, g: str, a: str) -> dict[str, set]:
+        """Returns the compatibility mappings of all stored versions of the given GA."""
+        pass
+
+    @abstractmethod
+    def upsert(self, gav: str, versions: set[str]) -> set[str]:
+        """Adds the given versions to the compatibility mapping of the GAV and returns the updated mapping."""
+        pass
+
+    @abstractmethod
+    def get_range(self, gav: str) -> str | None:
+        """Returns the precomputed Maven range spec of the compatible versions of the GAV, if there is one."""
+        pass
+
+    @abstractmethod
+    def load_ranges(self) -> dict[str, tuple[str, str]]:
+        """Returns all precomputed ranges as {gav: (range, digest of the versions it was computed from)}."""
+        pass
+
+    @abstractmethod
+    def set_range(self, gav: str, range_spec: str, available_digest: str):
+        """Stores the range spec of the GAV and the digest of the versions it was computed from."""
+        pass
+
+    @abstractmethod
+    def get_results(self, gav: str) -> dict[str, dict]:
+        """Returns the stored results of the compatibility checks of the GAV as {candidate version: result record}."""
+        pass
+
+    @abstractmethod
+    def put_results(self, gav: str, results: list[dict]):
+        """Stores the given result records of the GAV, replacing earlier records of the same candidate versions."""
+        pass
+
+    @abstractmethod
+    def fingerprint(self):
+        """Returns a value that changes whenever the content of the store changes."""
+        pass
+
+    def save(self, compatibility_store: dict[str, set]):
+        """Adds all the given compatibility mappings to the store."""
+        for gav, versions in compatibility_store.items():
+            self.upsert(gav, set(versions))
+
+    def import_json(self, path: Path):
+        """Adds the compatibility mappings of a JSON store (e.g. compatibilities.json) to this store."""
+        self.save(JsonCompatibilityStore(path).load())
+
+    def export_json(self, path: Path):
+        """Writes the full content of this store to path in the JSON store format."""
+        write_json_atomically(self.load(), path)
+
+
+def write_json_atomically(content: dict, path: Path):
+    """Writes to a temporary file first and then renames it, so readers never see a partially written file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{Path(path).stem}-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(content, f, indent=4, default=set_default)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JsonCompatibilityStore(CompatibilityStore):
+    """
+    Store backed by a single JSON file. Writes are serialized with a lock file and the file is replaced atomically.
+    Precomputed ranges and the results of the compatibility checks are kept in separate <store>_ranges.json and
+    <store>_results.json files, so the store itself keeps its shareable format.
+    """
+    def __init__(self, path: Path = COMPATIBILITY_STORE):
+        self.path = Path(path)
+        self.ranges_path = self.path.with_name(f"{self.path.stem}_ranges.json")
+        self.results_path = self.path.with_name(f"{self.path.stem}_results.json")
+
+    @contextmanager
+    def _locked(self):
+        with open(f"{self.path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def load(self) -> dict[str, set]:
+        try:
+            with open(self.path, 'r') as f:
+                return {gav: set(versions) for gav, versions in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+    def get(self, gav: str) -> set[str]:
+        return self.load().get(gav, set())
+
+    def get_by_ga(self, g: str, a: str) -> dict[str, set]:
+        return {gav: versions for gav, versions in self.load().items() if split_gav(gav)[:2] == (g, a)}
+
+    def upsert(self, gav: str, versions: set[str]) -> set[str]:
+        with self._locked():
+            compatibility_store = self.load()
+            stored_set = compatibility_store.get(gav, set())
+            stored_set.update(versions)
+            compatibility_store[gav] = stored_set
+            write_json_atomically(compatibility_store, self.path)
+        return stored_set
+
+    def save(self, compatibility_store: dict[str, set]):
+        with self._locked():
+            stored = self.load()
+            for gav, versions in compatibility_store.items():
+                stored.setdefault(gav, set()).update(versions)
+            write_json_atomically(stored, self.path)
+
+    def get_range(self, gav: str) -> str | None:
+        range_spec, _ = self.load_ranges().get(gav, (None, None))
+        return range_spec
+
+    def load_ranges(self) -> dict[str, tuple[str, str]]:
+        try:
+            with open(self.ranges_path, 'r') as f:
+                return {gav: (entry['range'], entry['available_digest']) for gav, entry in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+    def set_range(self, gav: str, range_spec: str, available_digest: str):
+        with self._locked():
+            ranges = {key: {'range': r, 'available_digest': d} for key, (r, d) in self.load_ranges().items()}
+            ranges[gav] = {'range': range_spec, 'available_digest': available_digest}
+            write_json_atomically(ranges, self.ranges_path)
+
+    def load_results(self) -> dict[str, dict[str, dict]]:
+        try:
+            with open(self.results_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get_results(self, gav: str) -> dict[str, dict]:
+        return self.load_results().get(gav, {})
+
+    def put_results(self, gav: str, results: list[dict]):
+        with self._locked():
+            stored = self.load_results()
+            stored.setdefault(gav, {}).update({result['version']: result for result in results})
+            write_json_atomically(stored, self.results_path)
+
+    def fingerprint(self):
+        return get_file_fingerprint(self.path), get_file_fingerprint(self.ranges_path)
+
+
+class SqliteCompatibilityStore(CompatibilityStore):
+    """
+    Store backed by an SQLite database in WAL mode, storing one row per compatible version pair, and one row per
+    checked version pair in the results table.
+    Each upsert is a single transaction that only touches the rows of its own GAV, so concurrent generators
+    no longer overwrite each other's results. The primary key indexes lookups by GAV, the ga index lookups by GA.
+    """
+    def __init__(self, path: Path = COMPATIBILITY_DB):
+        self.path = Path(path)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS compatibilities ("
+                             "group_id TEXT NOT NULL, artifact_id TEXT NOT NULL, version TEXT NOT NULL, "
+                             "compatible_version TEXT NOT NULL, "
+                             "PRIMARY KEY (group_id, artifact_id, version, compatible_version))")
+                conn.execute("CREATE INDEX IF NOT EXISTS compatibilities_ga "
+                             "ON compatibilities (group_id, artifact_id)")
+                conn.execute("CREATE TABLE IF NOT EXISTS ranges ("
+                             "group_id TEXT NOT NULL, artifact_id TEXT NOT NULL, version TEXT NOT NULL, "
+                             "range TEXT NOT NULL, available_digest TEXT NOT NULL, "
+                             "PRIMARY KEY (group_id, artifact_id, version))")
+                conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                             "group_id TEXT NOT NULL, artifact_id TEXT NOT NULL, version TEXT NOT NULL, "
+                             "candidate_version TEXT NOT NULL, statically_compatible INTEGER, "
+                             "dynamically_compatible INTEGER, err TEXT NOT NULL, seconds REAL, tested_at REAL, "
+                             "retry_after REAL, PRIMARY KEY (group_id, artifact_id, version, candidate_version))")
+                if "retry_after" not in {column for _, column, *_ in conn.execute("PRAGMA table_info(results)")}:
+                    conn.execute("ALTER TABLE results ADD COLUMN retry_after REAL")  # Stores of earlier versions
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def load(self) -> dict[str, set]:
+        compatibility_store = {}
+        with closing(self._connect()) as conn:
+            for g, a, v, cv in conn.execute("SELECT group_id, artifact_id, version, compatible_version "
+                                            "FROM compatibilities"):
+                compatibility_store.setdefault(f"{g}:{a}:{v}", set()).add(cv)
+        return compatibility_store
+
+    def get(self, gav: str) -> set[str]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT compatible_version FROM compatibilities "
+                                "WHERE group_id = ? AND artifact_id = ? AND version = ?", split_gav(gav))
+            return {cv for (cv,) in rows}
+
+    def get_by_ga(self, g: str, a: str) -> dict[str, set]:
+        compatibility_store = {}
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT version, compatible_version FROM compatibilities "
+                                "WHERE group_id = ? AND artifact_id = ?", (g, a))
+            for v, cv in rows:
+                compatibility_store.setdefault(f"{g}:{a}:{v}", set()).add(cv)
+        return compatibility_store
+
+    def upsert(self, gav: str, versions: set[str]) -> set[str]:
+        g, a, v = split_gav(gav)
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO compatibilities VALUES (?, ?, ?, ?)",
+                                 [(g, a, v, cv) for cv in versions])
+        return self.get(gav)
+
+    def save(self, compatibility_store: dict[str, set]):
+        rows = [(*split_gav(gav), cv) for gav, versions in compatibility_store.items() for cv in versions]
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO compatibilities VALUES (?, ?, ?, ?)", rows)
+
+    def get_range(self, gav: str) -> str | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT range FROM ranges WHERE group_id = ? AND artifact_id = ? AND version = ?",
+                               split_gav(gav)).fetchone()
+            return row[0] if row else None
+
+    def load_ranges(self) -> dict[str, tuple[str, str]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT group_id, artifact_id, version, range, available_digest FROM ranges")
+            return {f"{g}:{a}:{v}": (range_spec, digest) for g, a, v, range_spec, digest in rows}
+
+    def set_range(self, gav: str, range_spec: str, available_digest: str):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO ranges VALUES (?, ?, ?, ?, ?)",
+                             (*split_gav(gav), range_spec, available_digest))
+
+    def get_results(self, gav: str) -> dict[str, dict]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT candidate_version, statically_compatible, dynamically_compatible, err, "
+                                "seconds, tested_at, retry_after FROM results "
+                                "WHERE group_id = ? AND artifact_id = ? AND version = ?", split_gav(gav))
+            return {cv: {'version': cv,
+                         'statically_compatible': None if static is None else bool(static),
+                         'dynamically_compatible': None if dynamic is None else bool(dynamic),
+                         'err': err, 'seconds': seconds, 'tested_at': tested_at, 'retry_after': retry_after}
+                    for cv, static, dynamic, err, seconds, tested_at, retry_after in rows}
+
+    def put_results(self, gav: str, results: list[dict]):
+        g, a, v = split_gav(gav)
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [(g, a, v, result['version'], result['statically_compatible'],
+                                   result['dynamically_compatible'], result['err'], result['seconds'],
+                                   result['tested_at'], result.get('retry_after')) for result in results])
+
+    def fingerprint(self):
+        # Committed WAL transactions only touch the -wal file until the next checkpoint
+        return get_file_fingerprint(self.path), get_file_fingerprint(Path(f"{self.path}-wal"))
+
+
+def get_compatibility_store(backend=COMPATIBILITY_BACKEND) -> CompatibilityStore:
+    """Returns the compatibility store of the configured backend ('json' or 'sqlite')."""
+    if backend == "json":
+        return JsonCompatibilityStore()
+    if backend == "sqlite":
+        return SqliteCompatibilityStore()
+    raise ValueError(f"Unknown compatibility store backend: {backend}")
+
+
+def get_range_digest(compatible_versions: set[str], available_versions: list[str]) -> str:
+    """Returns a digest of the compatible and available versions a range is computed from."""
+    content = "\n".join(sorted(compatible_versions)) + "\n\n" + "\n".join(available_versions)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def update_range(store: CompatibilityStore, gav: str, available_versions: list[str] = None,
+                 use_local=False, compatible_versions: set[str] = None) -> str | None:
+    """
+    Precomputes the Maven range spec of the compatible versions of the GAV and stores it alongside the mapping,
+    so clients do not need the GA's maven-metadata.xml or a range converter. Returns the range spec, or None if the
+    available versions of the GA cannot be found.
+    """
+    g, a, _ = split_gav(gav)
+    if available_versions is None:
+        try:
+            available_versions = get_available_versions(g, a, use_remote=use_local)
+        except MavenMetadataNotFound as e:
+            print(e)
+            return None
+    compatible_versions = store.get(gav) if compatible_versions is None else compatible_versions
+    range_spec = convert_to_range(sorted(compatible_versions), available_versions)
+    store.set_range(gav, range_spec, get_range_digest(compatible_versions, available_versions))
+    return range_spec
+
+
+def refresh_ga_ranges(store: CompatibilityStore, available_versions: list[str], mappings: dict[str, set],
+                      ranges: dict[str, tuple[str, str]] = None) -> int:
+    """
+    Recomputes the ranges of the given mappings of a single GA that have no range yet, or whose range was computed from
+    other compatible or available versions. Returns the number of updated ranges.
+    """
+    ranges = store.load_ranges() if ranges is None else ranges
+    updated = 0
+    for gav, versions in mappings.items():
+        _, stored_digest = ranges.get(gav, (None, None))
+        if stored_digest != get_range_digest(versions, available_versions):
+            update_range(store, gav, available_versions=available_versions, compatible_versions=versions)
+            updated += 1
+    return updated
+
+
+def refresh_ranges(store: CompatibilityStore, use_local=False, gavs=None) -> int:
+    """
+    Recomputes the stored ranges whose mapping or GA's available versions changed since they were computed, or that
+    have no range yet, only those of the given GAVs if any. The available versions are fetched once per GA.
+    Returns the number of updated ranges.
+    """
+    ranges = store.load_ranges()
+    mappings_per_ga = {}
+    for gav, versions in store.load().items():
+        if gavs is None or gav in gavs:
+            mappings_per_ga.setdefault(split_gav(gav)[:2], {})[gav] = versions
+
+    updated = 0
+    for (g, a), mappings in mappings_per_ga.items():
+        try:
+            available_versions = get_available_versions(g, a, use_remote=use_local)
+        except MavenMetadataNotFound as e:
+            print(e)
+            continue
+        updated += refresh_ga_ranges(store, available_versions, mappings, ranges=ranges)
+    return updated
+
+
+def refresh_ranges_of_metadata(url: str, content: bytes, store: CompatibilityStore = None) -> int:
+    """
+    Recomputes the ranges of the GA whose maven-metadata.xml at the url changed to the given content, e.g. because a
+    new version was released or put into the local repository. Returns the number of updated ranges.
+    """
+    ga = get_metadata_ga(url)
+    if ga is None:
+        return 0
+    store = store if store is not None else get_compatibility_store()
+    mappings = store.get_by_ga(*ga)
+    if not mappings:
+        return 0
+    try:
+        available_versions = parse_available_versions(content)
+    except MavenMetadataNotFound as e:
+        print(f"{e} at {url}")
+        return 0
+    updated = refresh_ga_ranges(store, available_versions, mappings)
+    if updated:
+        print(f"Updated {updated} ranges of {':'.join(ga)} after its maven-metadata.xml changed")
+    return updated
+
+
+class CompatibilityIndex:
+    """
+    In-memory index of the compatibility store, mapping each GAV to its compatible versions and precomputed range.
+    The store is loaded once and only reloaded when the store's fingerprint changes (e.g. the file's inode, mtime or
+    size differ). A reload builds a new index and swaps it in as a whole, so lookups never see a partially loaded store.
+    """
+    def __init__(self, store: CompatibilityStore = None):
+        self.store = store if store is not None else get_compatibility_store()
+        self._index: dict[str, tuple[str, ...]] = {}
+        self._ranges: dict[str, str] = {}
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()  # Separate from _lock so lookups do not wait for reloads
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.last_reload_seconds = 0.0
+        self.total_reload_seconds = 0.0
+
+    def refresh(self, force=False):
+        """Reloads the index if the store changed since the last load."""
+        if not force and self.store.fingerprint() == self._fingerprint:
+            return
+        with self._lock:
+            fingerprint = self.store.fingerprint()
+            if not force and fingerprint == self._fingerprint:
+                return  # Another thread reloaded while we were waiting for the lock
+            start = time.perf_counter()
+            index = {gav: tuple(sorted(versions)) for gav, versions in self.store.load().items()}
+            ranges = {gav: range_spec for gav, (range_spec, _) in self.store.load_ranges().items()}
+            self._index, self._ranges = index, ranges
+            self._fingerprint = fingerprint
+            self.last_reload_seconds = time.perf_counter() - start
+            self.total_reload_seconds += self.last_reload_seconds
+            self.reloads += 1
+
+    def lookup(self, gav: str) -> list[str]:
+        """Returns the compatible versions of the given GAV, or an empty list if the GAV is not in the store."""
+        self.refresh()
+        versions = self._index.get(gav)
+        with self._counter_lock:
+            if versions is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return list(versions) if versions is not None else []
+
+    def lookup_range(self, gav: str) -> str | None:
+        """Returns the precomputed range spec of the given GAV, or None if there is none."""
+        self.refresh()
+        return self._ranges.get(gav)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._index),
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'last_reload_seconds': self.last_reload_seconds,
+            'total_reload_seconds': self.total_reload_seconds,
+        }
+
+
+def main():
+    """
+    Example: marco-store export compatibilities.json
+    """
+    cli = argparse.ArgumentParser(description='Compatibility Store')
+    cli.add_argument('command', choices=['import', 'export', 'refresh_ranges'],
+                     help='import from or export to a JSON store, or recompute outdated ranges')
+    cli.add_argument('path', type=str, nargs='?', help='/path/to/compatibilities.json')
+    cli.add_argument('--backend', type=str, default=COMPATIBILITY_BACKEND, choices=['json', 'sqlite'],
+                     help='backend of the compatibility store')
+    cli.add_argument('--use_local', action='store_true', default=False,
+                     help='Flag to indicate use of local Maven repository')
+
+    args = cli.parse_args()
+    store = get_compatibility_store(args.backend)
+    if args.command == "refresh_ranges":
+        print(f"Updated {refresh_ranges(store, use_local=args.use_local)} ranges")
+    elif not args.path:
+        cli.error(f"{args.command} requires a path")
+    elif args.command == "import":
+        store.import_json(Path(args.path).resolve())
+        print(f"Updated {refresh_ranges(store, use_local=args.use_local)} ranges")
+    else:
+        store.export_json(Path(args.path).resolve())
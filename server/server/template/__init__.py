@@ -1,16 +1,19 @@
 import json
 import os
 import pathlib
+import shutil
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Optional
 
 from github import Repository
 
-from core import (get_github_session, PomNotFoundException,
+from core import (LazyRepository, PomNotFoundException,
                   get_github_repo_and_tag)
-from server.config import download_repo
+from server.config import WORKTREES_DIR
 from server.exceptions import GithubRepoNotFoundException, GithubTagNotFoundException
+from server.repo_cache import worktree
+from server.store import write_json_atomically
 
 
 class Template(ABC):
@@ -25,6 +28,8 @@ class Template(ABC):
         self.repo_name = repo_name
         self.tag_name = tag_name
         self.commit_sha = commit_sha
+        self.use_local = use_local
+        self.module_path = ""  # Path of the Maven module in the repository, if the GA is not built from its root
 
         self.base_dir: Path = self.get_base_dir()
 
@@ -34,9 +39,15 @@ class Template(ABC):
         assert os.path.isdir(self.path)
         assert os.path.isdir(self.target_path)
 
+        if self.template_exists() and self.template_is_stale():
+            print(f"Discarding the template of {self.gav}, it was prepared differently")
+            self.remove_template()
+
+        if self.prepare_template_from_release():
+            return  # No repository needed
+
         if self.repo_name:
-            with get_github_session() as session:
-                repo: Repository = session.get_repo(repo_name)
+            repo: Repository = LazyRepository(repo_name)  # Only calls the GitHub API if the template must be built
             if self.tag_name and self.commit_sha:
                 self.store_metadata(self.repo_name, self.tag_name, self.commit_sha)
             else:
@@ -47,15 +58,16 @@ class Template(ABC):
             repo: Repository = self.get_github_metadata(pom_path=pom_path)
 
         if not self.template_exists():
-            if repo_storage_path:
-                self.repo_path: Path = download_repo(repo, storage_path=repo_storage_path)  # Downloads repo (unless it exists) and returns its path
-            else:
-                self.repo_path: Path = download_repo(repo)  # Downloads repo (unless it exists) and returns its path
-            module_path = self.repo_path / self.artifact_id
-            if Path.is_dir(module_path):
-                self.repo_path = module_path
-                print(f"Found module path, repo_path={self.repo_path}")
-            self.prepare_template()  # Generate test files and move them into the template
+            # Check out the commit into its own worktree of the repository mirror, removed once the template is ready
+            worktrees_dir = Path(repo_storage_path) if repo_storage_path else WORKTREES_DIR
+            with worktree(repo.full_name, self.commit_sha, worktrees_dir=worktrees_dir) as worktree_path:
+                self.repo_path: Path = worktree_path
+                module_path = self.repo_path / self.artifact_id
+                if Path.is_dir(module_path):
+                    self.repo_path = module_path
+                    self.module_path = self.artifact_id
+                    print(f"Found module path, repo_path={self.repo_path}")
+                self.prepare_template()  # Generate test files and move them into the template
 
     @abstractmethod
     def template_exists(self) -> bool:
@@ -73,9 +85,27 @@ class Template(ABC):
     def prepare_template(self):
         pass
 
+    def prepare_template_from_release(self) -> bool:
+        """
+        Prepares the template from released artifacts instead of sources if possible, returns whether it did. Called
+        for existing templates too, which may be replaced by one prepared from the release.
+        """
+        return False
+
+    def template_is_stale(self) -> bool:
+        """Returns whether the existing template must be discarded, e.g. because it was prepared differently."""
+        return False
+
+    def remove_template(self):
+        """Removes the template contents and metadata, keeping an empty template directory."""
+        shutil.rmtree(self.target_path, ignore_errors=True)
+        for name in ["pom.xml", "_metadata.json"]:
+            if os.path.isfile(self.path / name):
+                os.remove(self.path / name)
+        os.makedirs(self.target_path, exist_ok=True)
+
     def get_or_create_template_dir(self) -> Path:
         """Creates <base_dir>/gav/target/ if it does not already exist and returns the path to <base_dir>/gav"""
-        old_dir = os.getcwd()
         gav = f"{self.group_id}:{self.artifact_id}:{self.version}"
         template_path = pathlib.Path.joinpath(self.base_dir, gav)
 
@@ -84,19 +114,15 @@ class Template(ABC):
             return template_path
 
         # Otherwise, create the template and return the path
-        os.chdir(self.base_dir)
-        os.mkdir(gav)
-        os.chdir(template_path)
-        os.mkdir("target")
-        os.chdir(old_dir)
+        os.makedirs(template_path / "target", exist_ok=True)
 
         return template_path
 
     def load_metadata(self):
         metadata = read_template_metadata(self.path)
-        self.repo_name = metadata['repo_name']
-        self.tag_name = metadata['tag_name']
-        self.commit_sha = metadata['commit_sha']
+        self.repo_name = metadata.get('repo_name', "")
+        self.tag_name = metadata.get('tag_name', "")
+        self.commit_sha = metadata.get('commit_sha', "")
 
     def store_metadata(self, repo_name: str, tag_name: str, commit_sha: str):
         self.repo_name = repo_name
@@ -138,9 +164,18 @@ def read_template_metadata(path: Path):
 
 
 def write_template_metadata(repo_name: str, tag_name: str, commit_sha: str, path: Path):
-    metadata = {
+    """Writes the Github metadata of the template, keeping any other entries."""
+    filepath = pathlib.Path.joinpath(path, "_metadata.json")
+    metadata = read_template_metadata(path) if os.path.isfile(filepath) else {}
+    metadata.update({
         'repo_name': repo_name, 'tag_name': tag_name, 'commit_sha': commit_sha
-    }
-    with open(pathlib.Path.joinpath(path, "_metadata.json"), 'w') as f:
-        json.dump(metadata, f, indent=4)
+    })
+    write_json_atomically(metadata, filepath)
+
 
+def write_template_origin(origin: str, path: Path):
+    """Records whether the template was prepared from the released artifacts or built from source."""
+    filepath = pathlib.Path.joinpath(path, "_metadata.json")
+    metadata = read_template_metadata(path) if os.path.isfile(filepath) else {}
+    metadata['origin'] = origin
+    write_json_atomically(metadata, filepath)
@@ -1,3 +1,4 @@
+import json
 import os
 import pathlib
 import subprocess
@@ -6,13 +7,16 @@ from typing import Optional
 
 from github import Repository
 
-from core import get_github_session
+from core import LazyRepository
 from server.config import BASE_TEMPLATES_DIR, COMPILE_TIMEOUT, TEST_TIMEOUT
-from server.exceptions import (GithubRepoNotFoundException, MavenSurefireTestFailedException,
+from server.exceptions import (MavenSurefireTestFailedException,
                                MavenNoPomInDirectoryException, BaseMavenCompileTimeout, BaseMavenTestTimeout,
                                MavenCompileFailedException, MavenResolutionFailedException)
+from server.store import write_json_atomically
 from server.template import Template
-from server.test_failure import at_least_one_passing_test
+from server.test_failure import at_least_one_passing_test, TestFailure
+
+BASELINE_FAILURES_FILE = "_baseline_failures.json"  # Failures of the base tests against the base version
 
 
 class BaseTemplate(Template):
@@ -37,60 +41,75 @@ class BaseTemplate(Template):
             if os.path.isdir(pathlib.Path.joinpath(self.target_path, "surefire-reports_BASE")):  # TODO: remove
                 if os.path.isfile(pathlib.Path.joinpath(self.path, "_metadata.json")):
                     self.load_metadata()
-                    with get_github_session() as session:
-                        repo = session.get_repo(self.repo_name)
-                        if repo is None:
-                            raise GithubRepoNotFoundException(f"Could not find repo {self.repo_name} on Github")
-                        return repo
+                    # Reusing the template needs no GitHub API call, the repo is only looked up if it must be cloned
+                    return LazyRepository(self.repo_name)
         return None
 
+    def load_baseline_failures(self, key: str) -> Optional[set[TestFailure]]:
+        """Returns the baseline failures stored under the given key, or None if they have not been computed yet."""
+        baseline_path = self.path / BASELINE_FAILURES_FILE
+        if not os.path.isfile(baseline_path):
+            return None
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('key') != key:
+            return None
+        return {TestFailure.from_dict(d) for d in baseline['failures']}
+
+    def store_baseline_failures(self, key: str, failures: set[TestFailure]):
+        """Stores the baseline failures next to the template metadata, replacing those stored under any other key."""
+        write_json_atomically({'key': key, 'failures': [f.to_dict() for f in failures]},
+                              self.path / BASELINE_FAILURES_FILE)
+
+    def clear_baseline_failures(self):
+        clear_baseline_failures(self.path)
+
     def prepare_template(self):
+        # The baseline failures were computed against the previous template contents
+        self.clear_baseline_failures()
+
         # Compile test classes and sources of the base and move them to temp/target/
-        old_dir = os.getcwd()
-        os.chdir(self.repo_path)
-        subprocess.run(["git", "checkout", "-f", self.commit_sha])
+        repo_target_path = self.repo_path / "target"
         print("Running mvn clean test-compile...")
         try:
             out = subprocess.run(["mvn", "clean", "test-compile", "-Dspotbugs.skip=true",
                                   "-Dspotless.check.skip=true", "-Dspotless.apply.skip=true"],
-                                 stdout=subprocess.PIPE, universal_newlines=True, timeout=COMPILE_TIMEOUT)
+                                 cwd=self.repo_path, stdout=subprocess.PIPE, universal_newlines=True,
+                                 timeout=COMPILE_TIMEOUT)
             if "there is no POM in this directory" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenNoPomInDirectoryException(f"Found no POM for base {self.gav}")
             elif "Could not resolve dependencies" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenResolutionFailedException(f"Failed to resolve dependencies for base {self.gav}")
             elif "Compilation failure" in out.stdout or "Fatal error compiling" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenCompileFailedException(f"Failed to compile for base {self.gav}")
             elif "BUILD FAILURE" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenCompileFailedException(f"Failed to compile for base {self.gav}")
         except subprocess.TimeoutExpired:
-            os.chdir(old_dir)
             raise BaseMavenCompileTimeout(f"mvn clean compile lasted more than {COMPILE_TIMEOUT}s")
 
         try:
-            out = subprocess.run(["mvn", "surefire:test"],
+            out = subprocess.run(["mvn", "surefire:test"], cwd=self.repo_path,
                                  stdout=subprocess.PIPE, universal_newlines=True, timeout=TEST_TIMEOUT)
             if "No tests to run" in out.stdout or "Tests are skipped" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenSurefireTestFailedException(f"Found no running tests for base {self.gav}")
         except subprocess.TimeoutExpired:
-            os.chdir(old_dir)
             raise BaseMavenTestTimeout(f"mvn surefire:test lasted more than {TEST_TIMEOUT}s")
         print("Done.")
 
-        surefire_path = pathlib.Path.joinpath(self.repo_path).resolve() / "target" / "surefire-reports"
+        surefire_path = repo_target_path / "surefire-reports"
         if not at_least_one_passing_test(surefire_path):
-            os.chdir(old_dir)
             raise MavenSurefireTestFailedException(f"Found no running tests for base {self.gav}")
         try:
-            subprocess.run(["mv", "target/generated-test-sources", self.target_path])
+            subprocess.run(["mv", repo_target_path / "generated-test-sources", self.target_path])
         except Exception:
             pass
-        subprocess.run(["mv", "target/test-classes", self.target_path])
-        subprocess.run(["mv", "target/surefire-reports", pathlib.Path.joinpath(self.target_path,
-                                                                               "surefire-reports_BASE")])
-        subprocess.run(["cp", "pom.xml", self.path])
-        os.chdir(old_dir)
+        subprocess.run(["mv", repo_target_path / "test-classes", self.target_path])
+        subprocess.run(["mv", surefire_path, pathlib.Path.joinpath(self.target_path, "surefire-reports_BASE")])
+        subprocess.run(["cp", self.repo_path / "pom.xml", self.path])
+
+
+def clear_baseline_failures(template_path: Path):
+    """Removes the baseline failures stored in the base template at the given path, if there are any."""
+    baseline_path = template_path / BASELINE_FAILURES_FILE
+    if os.path.isfile(baseline_path):
+        os.remove(baseline_path)
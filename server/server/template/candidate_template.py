@@ -1,23 +1,44 @@
 import os
 import pathlib
+import shutil
 import subprocess
+import tempfile
+import zipfile
 from pathlib import Path
 from typing import Optional
 
 from github import Repository
 
-from core import get_github_session
-from server.config import CAND_TEMPLATES_DIR, COMPILE_TIMEOUT
-from server.exceptions import (GithubRepoNotFoundException, MavenCompileFailedException,
+from core import LazyRepository, fetch, get_cache_ttl, get_repository_url, HTTP_headers
+from server.build_cache import (BuildCache, get_build_key, SUCCESS, NO_POM, NO_RESOLVE, NO_COMPILE,
+                                COMPILE_TIMEOUT as COMPILE_TIMEOUT_OUTCOME)
+from server.config import BASE_TEMPLATES_DIR, CAND_TEMPLATES_DIR, COMPILE_TIMEOUT
+from server.exceptions import (MavenCompileFailedException,
                                MavenNoPomInDirectoryException, CandidateMavenCompileTimeout,
                                MavenResolutionFailedException)
-from server.template import Template
+from server.prefetch import get_jar_path
+from server.template import Template, read_template_metadata, write_template_origin
+from server.template.base_template import clear_baseline_failures
+
+# Build outcomes recorded in the build cache, and the exceptions raised for them
+BUILD_FAILURES = {
+    NO_POM: MavenNoPomInDirectoryException,
+    NO_RESOLVE: MavenResolutionFailedException,
+    NO_COMPILE: MavenCompileFailedException,
+    COMPILE_TIMEOUT_OUTCOME: CandidateMavenCompileTimeout,
+}
+
+# Origins of candidate templates, recorded in their metadata
+RELEASE = "release"
+SOURCE = "source"
 
 
 class CandidateTemplate(Template):
     """Class responsible for the creation of candidate templates containing classes and generated-sources."""
     def __init__(self, g: str, a: str, v: str, repo_storage_path="", pom_path="", repo_name="", tag_name="",
-                 commit_sha="", use_local=False):
+                 commit_sha="", use_local=False, rebuild=False, from_source=False):
+        self.rebuild = rebuild  # Build even if the build cache records that this build fails
+        self.from_source = from_source  # Build from source even if the released jar is available
         super().__init__(g, a, v, repo_storage_path=repo_storage_path, pom_path=pom_path, repo_name=repo_name,
                          tag_name=tag_name, commit_sha=commit_sha, use_local=use_local)
 
@@ -33,46 +54,112 @@ class CandidateTemplate(Template):
         if os.path.isdir(pathlib.Path.joinpath(self.target_path, "classes")):
             if os.path.isfile(pathlib.Path.joinpath(self.path, "_metadata.json")):
                 self.load_metadata()
-                with get_github_session() as session:
-                    repo = session.get_repo(self.repo_name)
-                    if repo is None:
-                        raise GithubRepoNotFoundException(f"Could not find repo {self.repo_name} on Github")
-                    return repo
+                # Reusing the template needs no GitHub API call, the repo is only looked up if it must be cloned
+                return LazyRepository(self.repo_name)
         return None
 
+    def get_template_origin(self) -> Optional[str]:
+        """Returns RELEASE or SOURCE, or None for templates prepared before origins were recorded."""
+        if not os.path.isfile(self.path / "_metadata.json"):
+            return None
+        return read_template_metadata(self.path).get('origin')
+
+    def template_is_stale(self) -> bool:
+        """A template prepared from the released jar is discarded when building from source."""
+        return self.from_source and self.get_template_origin() == RELEASE
+
+    def remove_template(self):
+        super().remove_template()
+        self.invalidate_dependents()
+
+    def invalidate_dependents(self):
+        """
+        Discards what was computed against earlier contents of the template, i.e. the baseline failures stored in the
+        base template of the same version, which ran the base tests on this template.
+        """
+        clear_baseline_failures(BASE_TEMPLATES_DIR / self.gav)
+
+    def prepare_template_from_release(self) -> bool:
+        """
+        Unpacks the released jar of the candidate (put in PATH_TO_JARS by the static check) into target/classes and
+        uses its released POM, so the candidate sources need not be cloned and compiled. A template built from source is
+        replaced if the released jar is available, and kept otherwise.
+        """
+        jar = get_jar_path(self.artifact_id, self.version)
+        if self.from_source or not os.path.isfile(jar):
+            return False
+        if self.template_exists() and self.get_template_origin() != SOURCE:
+            return False  # Prepared from the release, or before origins were recorded
+        pom_url = f"{get_repository_url(self.use_local)}/{self.group_id.replace('.', '/')}/{self.artifact_id}/" \
+                  f"{self.version}/{self.artifact_id}-{self.version}.pom"
+        response = fetch(pom_url, headers=HTTP_headers, ttl=get_cache_ttl(pom_url))
+        if response.status_code != 200:
+            print(f"Could not download {pom_url}, building {self.gav} from source")
+            return False
+
+        print(f"Preparing {self.gav} from its released jar {jar}")
+        unpacked_path = tempfile.mkdtemp(dir=self.target_path, prefix=".classes-")
+        try:
+            with zipfile.ZipFile(jar) as z:
+                z.extractall(unpacked_path)
+        except zipfile.BadZipFile as e:
+            shutil.rmtree(unpacked_path, ignore_errors=True)
+            print(f"Could not unpack {jar}, building {self.gav} from source: {e}")
+            return False
+        with open(self.pom_path, 'wb') as f:
+            f.write(response.content)
+        write_template_origin(RELEASE, self.path)
+        # Move the classes in place last, the template only exists once both the pom and the classes are there
+        shutil.rmtree(self.target_path / "classes", ignore_errors=True)
+        os.replace(unpacked_path, self.target_path / "classes")
+        self.invalidate_dependents()
+        return True
+
     def prepare_template(self):
+        """Builds the template, unless the build cache records that the same build failed before."""
+        build_cache = BuildCache()
+        build_key = get_build_key(self.commit_sha, self.module_path, self.repo_path / "pom.xml")
+        cached = build_cache.get(build_key)
+        if cached is not None and cached[0] in BUILD_FAILURES and not self.rebuild:
+            outcome, message = cached
+            print(f"Skipping build of {self.gav}, it failed before with {outcome}")
+            raise BUILD_FAILURES[outcome](f"{message} (cached, rebuild to retry)")
+
+        try:
+            self.build()
+        except tuple(BUILD_FAILURES.values()) as e:
+            outcome = next(outcome for outcome, exception in BUILD_FAILURES.items() if isinstance(e, exception))
+            build_cache.put(build_key, outcome, message=str(e))
+            raise
+        build_cache.put(build_key, SUCCESS, artifact=self.path)
+        write_template_origin(SOURCE, self.path)
+        self.invalidate_dependents()
+
+    def build(self):
         # Compile test classes and sources of the base and move them to temp/target/
-        old_dir = os.getcwd()
-        os.chdir(self.repo_path)
-        subprocess.run(["git", "checkout", "-f", self.commit_sha])
+        repo_target_path = self.repo_path / "target"
         try:
             out = subprocess.run(["mvn", "clean", "test-compile", "-Dspotbugs.skip=true", "-Dspotless.check.skip=true", "-Dspotless.apply.skip=true"],
-                                 stdout=subprocess.PIPE, universal_newlines=True, timeout=COMPILE_TIMEOUT)
+                                 cwd=self.repo_path, stdout=subprocess.PIPE, universal_newlines=True,
+                                 timeout=COMPILE_TIMEOUT)
             if "there is no POM in this directory" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenNoPomInDirectoryException(f"Found no POM for candidate {self.gav}")
             elif "Could not resolve dependencies" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenResolutionFailedException(f"Failed to resolve dependencies for candidate {self.gav}")
             elif "Compilation failure" in out.stdout or "Fatal error compiling" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenCompileFailedException(f"Failed to compile for candidate {self.gav}")
             elif "BUILD FAILURE" in out.stdout:
-                os.chdir(old_dir)
                 raise MavenCompileFailedException(f"Failed to compile for base {self.gav}")
         except subprocess.TimeoutExpired:
-            os.chdir(old_dir)
             raise CandidateMavenCompileTimeout(f"mvn clean test-compile lasted more than {COMPILE_TIMEOUT}s")
 
-        classes_path = pathlib.Path.joinpath(self.repo_path).resolve() / "target" / "classes"
+        classes_path = repo_target_path / "classes"
         if not os.path.isdir(classes_path):
-            os.chdir(old_dir)
             raise MavenCompileFailedException(f"Failed to compile {self.gav}")
 
         try:
-            subprocess.run(["mv", "target/generated-sources", self.target_path])
+            subprocess.run(["mv", repo_target_path / "generated-sources", self.target_path])
         except Exception:
             pass
-        subprocess.run(["mv", "target/classes", self.target_path])
-        subprocess.run(["cp", "pom.xml", self.path])
-        os.chdir(old_dir)
+        subprocess.run(["mv", classes_path, self.target_path])
+        subprocess.run(["cp", self.repo_path / "pom.xml", self.path])
@@ -1,8 +1,11 @@
 """Module containing logic related to the creation of TestFailures from surefire test reports."""
 import os
 import pathlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from xml.etree import ElementTree
+
+from server.config import REPORT_PARSER_JOBS
 # from lxml import etree as ET
 
 # TODO: refactor TestFailure into TestResult maybe?
@@ -28,40 +31,115 @@ class TestFailure:
     def __repr__(self):
         return f"TestFailure(suite={self.testsuite_name}, case={self.testcase_name}, class={self.testcase_classname})"
 
+    def to_dict(self) -> dict:
+        return {'testsuite_name': self.testsuite_name, 'testcase_name': self.testcase_name,
+                'testcase_classname': self.testcase_classname, 'type': self.type}
 
-def get_test_failures_from_file(path_to_filename: Path) -> set[TestFailure]:
-    """Parses the given .xml test report and creates TestFailures for each <testcase> with a <failure> or <error> tag"""
-    # TODO: can a report contain more than one testsuite (this code assumes not)? What happens then?
+    @staticmethod
+    def from_dict(d: dict) -> 'TestFailure':
+        return TestFailure(d['testsuite_name'], d['testcase_name'], d['testcase_classname'], d['type'])
+
+
+def get_empty_results() -> dict:
+    return {
+        'pass': 0,
+        'failure': 0,
+        'error': 0,
+        'skipped': 0,
+    }
+
+
+def parse_report(path_to_filename: Path, strict=False) -> tuple[dict, set[TestFailure]]:
+    """
+    Streams the given .xml test report and returns its test results ({'pass': int, 'failure': int, 'error': int,
+    'skipped': int}) and a TestFailure for each <testcase> with a <failure>, <error> or <skipped> tag.
+    Elements are discarded as soon as they are processed, so captured <system-out> and <system-err> output is never
+    kept in memory as a whole. Reports that cannot be parsed count as empty, unless strict is set, in which case the
+    ElementTree.ParseError is raised (e.g. for reports that are still being written).
+    """
     assert os.path.isfile(path_to_filename) and path_to_filename.suffix == ".xml"
+    results = get_empty_results()
+    failures = set()
+    testsuite, testsuite_name = None, None
+    subtags = set()
     try:
-        tree = ElementTree.parse(path_to_filename)
+        for event, elem in ElementTree.iterparse(path_to_filename, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "testsuite":
+                    testsuite, testsuite_name = elem, elem.get("name")
+                elif elem.tag == "testcase":
+                    subtags = set()
+                continue
+            if elem.tag in ("failure", "error", "skipped"):
+                subtags.add(elem.tag)
+            elif elem.tag == "testcase":
+                failure_type = next((tag for tag in ("failure", "error", "skipped") if tag in subtags), "")
+                if failure_type:
+                    results[failure_type] += 1
+                    failures.add(TestFailure(testsuite_name, elem.get("name"), elem.get("classname"), failure_type))
+                else:
+                    results['pass'] += 1
+                if testsuite is not None:
+                    testsuite.clear()  # Drops the testcases processed so far, the suite name is already known
+            if elem.tag != "testsuite":
+                elem.clear()
     except ElementTree.ParseError as e:
+        if strict:
+            raise
         print(e)
-        return set()
+        # This happens for orphan-oss/ognl/target/surefire-reports/TEST-org.ognl.test.NumericConversionTest.xml
+        return get_empty_results(), set()
+    return results, failures
 
-    root = tree.getroot()
-    testsuite_name = root.get("name")
-    testcases = root.findall("testcase")
 
-    failures = set()
-    for testcase in testcases:
-        testcase_name = testcase.get("name")
-        testcase_classname = testcase.get("classname")
-        failure_subtag = testcase.find("failure")
-        error_subtag = testcase.find("error")
-        skipped_subtag = testcase.find("skipped")
-
-        failure_type = ""
-        if failure_subtag is not None:
-            failure_type = "failure"
-        elif error_subtag is not None:
-            failure_type = "error"
-        elif skipped_subtag is not None:
-            failure_type = "skipped"
-        if failure_type:
-            failures.add(TestFailure(testsuite_name, testcase_name, testcase_classname, failure_type))
-
-    return failures
+def parse_reports_dir(path_to_dir: Path, jobs=REPORT_PARSER_JOBS) -> tuple[dict, set[TestFailure]]:
+    """
+    Parses all .xml test reports of the given surefire-reports directory in a single scan, and returns their overall
+    test results and TestFailures. With jobs > 1, the reports are parsed on a pool of jobs processes.
+    """
+    assert os.path.isdir(path_to_dir)
+    paths = [pathlib.Path.joinpath(path_to_dir, filename) for filename in os.listdir(path_to_dir)
+             if filename.endswith(".xml")]
+    if jobs is not None and jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+            reports = list(executor.map(parse_report, paths))
+    else:
+        reports = [parse_report(path) for path in paths]
+
+    overall_results = get_empty_results()
+    all_failures = set()
+    for results, failures in reports:
+        for key, count in results.items():
+            overall_results[key] += count
+        all_failures.update(failures)
+    return overall_results, all_failures
+
+
+def get_test_class_durations(path_to_dir: Path) -> dict[str, float]:
+    """
+    Returns {test class: seconds} of the TEST-<class>.xml reports in the given surefire-reports directory, reading only
+    the time attribute of their <testsuite> tag.
+    """
+    durations = {}
+    if not os.path.isdir(path_to_dir):
+        return durations
+    for filename in os.listdir(path_to_dir):
+        if not (filename.startswith("TEST-") and filename.endswith(".xml")):
+            continue
+        duration = 0.0
+        try:
+            for _, elem in ElementTree.iterparse(pathlib.Path.joinpath(path_to_dir, filename), events=("start",)):
+                duration = float(elem.get("time", "0").replace(",", ""))
+                break  # The root <testsuite> tag is all we need
+        except (ElementTree.ParseError, ValueError):
+            pass
+        durations[filename[len("TEST-"):-len(".xml")]] = duration
+    return durations
+
+
+def get_test_failures_from_file(path_to_filename: Path) -> set[TestFailure]:
+    """Parses the given .xml test report and creates TestFailures for each <testcase> with a <failure> or <error> tag"""
+    return parse_report(path_to_filename)[1]
 
 
 def at_least_one_passing_test(path_to_dir: Path) -> bool:
@@ -74,69 +152,15 @@ def at_least_one_passing_test(path_to_dir: Path) -> bool:
 
 def get_test_results_from_file(path_to_filename: Path) -> dict:
     """returns dict of tests results: {'pass': int, 'failure': int, 'error': int, 'skipped': int}"""
-    assert os.path.isfile(path_to_filename) and path_to_filename.suffix == ".xml"
-    try:
-        tree = ElementTree.parse(path_to_filename)
-    except ElementTree.ParseError as e:
-        print(e)
-        # This happens for orphan-oss/ognl/target/surefire-reports/TEST-org.ognl.test.NumericConversionTest.xml
-        return {}
-
-    root = tree.getroot()
-    testcases = root.findall("testcase")
-    results = {
-        'pass': 0,
-        'failure': 0,
-        'error': 0,
-        'skipped': 0,
-    }
-
-    for testcase in testcases:
-        failure_subtag = testcase.find("failure")
-        error_subtag = testcase.find("error")
-        skipped_subtag = testcase.find("skipped")
-
-        if failure_subtag is not None:
-            results['failure'] += 1
-        elif error_subtag is not None:
-            results['error'] += 1
-        elif skipped_subtag is not None:
-            results['skipped'] += 1
-        else:
-            results['pass'] += 1
-
-    return results
+    return parse_report(path_to_filename)[0]
 
 
 def get_test_results_from_dir(path_to_dir: Path) -> dict:
     """Parses test results from the given surefire-reports directory."""
-    assert os.path.isdir(path_to_dir)
-    overall_results = {
-        'pass': 0,
-        'failure': 0,
-        'error': 0,
-        'skipped': 0,
-    }
-    for filename in os.listdir(path_to_dir):
-        if filename.endswith(".xml"):
-            path_to_filename = pathlib.Path.joinpath(path_to_dir, filename)
-            single_results = get_test_results_from_file(path_to_filename)
-            if not single_results:
-                continue
-            overall_results['pass'] += single_results['pass']
-            overall_results['failure'] += single_results['failure']
-            overall_results['error'] += single_results['error']
-            overall_results['skipped'] += single_results['skipped']
-    return overall_results
+    return parse_reports_dir(path_to_dir)[0]
 
 
 def get_test_failures_from_dir(path_to_dir: Path) -> set[TestFailure]:
     """Parses TestFailures from the given surefire-reports directory."""
     print(f"get_test_results_from_dir with dir={path_to_dir}")
-    assert os.path.isdir(path_to_dir)
-    all_failures = set()
-    for filename in os.listdir(path_to_dir):
-        if filename.endswith(".xml"):
-            path_to_filename = pathlib.Path.joinpath(path_to_dir, filename)
-            all_failures.update(get_test_failures_from_file(path_to_filename))
-    return all_failures
+    return parse_reports_dir(path_to_dir)[1]
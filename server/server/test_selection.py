@@ -0,0 +1,174 @@
+"""
+Change-impact test selection for the dynamic checks. The production classes of the base and the candidate are compared
+by the digests of their class files, the base test classes are mapped to the classes they (transitively) reference by
+scanning the constant pools of the class files, and only the test classes that can reach a changed class are run.
+The selection cannot see references made through reflection (e.g. ServiceLoader or dependency injection), so a share
+of the selections is audited by running the full suite and comparing the regressions. Changes to the dependencies of
+the library are not visible in its class files either, so the dynamic checks do not select tests for those.
+"""
+import hashlib
+import os
+import re
+import struct
+from pathlib import Path
+from typing import Optional
+
+from server.test_failure import TestFailure
+
+CLASS_MAGIC = b"\xca\xfe\xba\xbe"
+# Sizes of the constant pool entries that are skipped, by tag
+CONSTANT_SIZES = {3: 4, 4: 4, 5: 8, 6: 8, 8: 2, 9: 4, 10: 4, 11: 4, 12: 4, 15: 3, 16: 2, 17: 4, 18: 4, 19: 2, 20: 2}
+CONSTANT_UTF8 = 1
+CONSTANT_CLASS = 7
+DESCRIPTOR_CLASS = re.compile(r"L([\w/$]+)[;<]")
+# Build metadata that differs between any two released jars (e.g. the version in pom.properties) but does not affect
+# the tests. Other resources, e.g. META-INF/services, do.
+IGNORED_FILES = ("META-INF/MANIFEST.MF", "META-INF/maven/")
+
+
+def get_top_level_class(class_name: str) -> str:
+    """Nested classes are folded into their top-level class, e.g. a.b.C$D => a.b.C"""
+    return class_name.split("$")[0]
+
+
+def get_file_digests(classes_dir: Path) -> dict[str, str]:
+    """Returns {path relative to classes_dir: sha256} of all files in the directory."""
+    digests = {}
+    for root, _, files in os.walk(classes_dir):
+        for name in files:
+            path = Path(root) / name
+            with open(path, 'rb') as f:
+                digests[os.path.relpath(path, classes_dir)] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+def get_class_name(relative_path: str) -> str:
+    return relative_path[:-len(".class")].replace(os.sep, ".")
+
+
+def get_changed_classes(base_classes_dir: Path, cand_classes_dir: Path) -> Optional[set[str]]:
+    """
+    Returns the top-level classes that were added, removed or changed between the two directories, or None if another
+    file (e.g. a resource) changed, in which case any test could be affected. Changes to IGNORED_FILES are ignored.
+    """
+    base_digests = get_file_digests(base_classes_dir)
+    cand_digests = get_file_digests(cand_classes_dir)
+    changed = set()
+    for relative_path in base_digests.keys() | cand_digests.keys():
+        if base_digests.get(relative_path) == cand_digests.get(relative_path):
+            continue
+        if Path(relative_path).as_posix().startswith(IGNORED_FILES):
+            continue
+        if not relative_path.endswith(".class"):
+            return None
+        changed.add(get_top_level_class(get_class_name(relative_path)))
+    return changed
+
+
+def get_referenced_classes(class_file: Path) -> set[str]:
+    """Returns the classes referenced from the constant pool of the class file, including those in descriptors."""
+    with open(class_file, 'rb') as f:
+        data = f.read()
+    if data[:4] != CLASS_MAGIC:
+        return set()
+    count = struct.unpack_from(">H", data, 8)[0]
+    offset, index = 10, 1
+    strings = {}
+    class_indexes = []
+    try:
+        while index < count:
+            tag = data[offset]
+            offset += 1
+            if tag == CONSTANT_UTF8:
+                length = struct.unpack_from(">H", data, offset)[0]
+                strings[index] = data[offset + 2:offset + 2 + length].decode("utf-8", errors="replace")
+                offset += 2 + length
+            elif tag == CONSTANT_CLASS:
+                class_indexes.append(struct.unpack_from(">H", data, offset)[0])
+                offset += 2
+            else:
+                offset += CONSTANT_SIZES[tag]
+            index += 2 if tag in (5, 6) else 1  # Longs and doubles take two entries
+    except (KeyError, IndexError, struct.error):
+        print(f"Could not parse the constant pool of {class_file}")
+        return set()
+
+    referenced = set()
+    for class_index in class_indexes:
+        name = strings.get(class_index, "")
+        if name and not name.startswith("["):
+            referenced.add(name)
+    for string in strings.values():
+        referenced.update(DESCRIPTOR_CLASS.findall(string))
+    return {name.replace("/", ".") for name in referenced}
+
+
+def get_reference_graph(classes_dirs: list[Path]) -> dict[str, set[str]]:
+    """Returns {top-level class: top-level classes it references} of all class files in the directories."""
+    graph = {}
+    for classes_dir in classes_dirs:
+        for root, _, files in os.walk(classes_dir):
+            for name in files:
+                if not name.endswith(".class"):
+                    continue
+                path = Path(root) / name
+                class_name = get_top_level_class(get_class_name(os.path.relpath(path, classes_dir)))
+                references = {get_top_level_class(reference) for reference in get_referenced_classes(path)}
+                graph.setdefault(class_name, set()).update(references - {class_name})
+    return graph
+
+
+def get_baseline_test_classes(reports_dir: Path) -> set[str]:
+    """Returns the test classes that ran in the baseline, from the names of their TEST-<class>.xml reports."""
+    if not os.path.isdir(reports_dir):
+        return set()
+    return {filename[len("TEST-"):-len(".xml")] for filename in os.listdir(reports_dir)
+            if filename.startswith("TEST-") and filename.endswith(".xml")}
+
+
+def is_affected(test_class: str, graph: dict[str, set[str]], changed: set[str]) -> bool:
+    """Returns True if the test class transitively references one of the changed classes."""
+    seen = set()
+    stack = [get_top_level_class(test_class)]
+    while stack:
+        class_name = stack.pop()
+        if class_name in changed:
+            return True
+        if class_name in seen:
+            continue
+        seen.add(class_name)
+        stack.extend(graph.get(class_name, ()))
+    return False
+
+
+def select_tests(test_classes_dir: Path, base_reports_dir: Path, base_classes_dir: Path,
+                 cand_classes_dir: Path) -> Optional[set[str]]:
+    """
+    Returns the base test classes that can be affected by the changes between the base and candidate classes, or None
+    if all tests must run (no class files to compare, or a changed resource).
+    """
+    test_classes = get_baseline_test_classes(base_reports_dir)
+    if not test_classes or not os.path.isdir(base_classes_dir) or not os.path.isdir(cand_classes_dir):
+        return None
+    changed = get_changed_classes(base_classes_dir, cand_classes_dir)
+    if changed is None:
+        return None
+    graph = get_reference_graph([test_classes_dir, base_classes_dir, cand_classes_dir])
+    selected = {test_class for test_class in test_classes if is_affected(test_class, graph, changed)}
+    print(f"Selected {len(selected)} of {len(test_classes)} test classes affected by {len(changed)} changed classes")
+    return selected
+
+
+def audit_selection(selected: set[str], base_failures: set[TestFailure],
+                    full_failures: set[TestFailure]) -> set[TestFailure]:
+    """
+    Compares the regressions of a full test run with the selected test classes, and returns the regressions the
+    selection would have missed.
+    """
+    missed = {failure for failure in full_failures - base_failures
+              if get_top_level_class(failure.testcase_classname or "") not in selected}
+    if missed:
+        print(f"Test selection audit failed, the selection missed regressions: {missed}")
+    else:
+        print("Test selection audit passed")
+    return missed
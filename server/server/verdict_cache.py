@@ -0,0 +1,139 @@
+"""
+Persistent cache of static compatibility verdicts. Verdicts are keyed by the contents of the jars (their sha256) rather
+than by GAV, together with the japicmp version and options, so a pair of jars is only ever compared once, whichever
+base or candidate GAVs they belong to.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Optional
+
+from server.config import STATIC_VERDICT_CACHE, PATH_TO_JAPICMP, JAPICMP_OPTIONS
+
+# Digests of jars already hashed by this process, keyed by (path, size, mtime)
+_jar_digests: dict[tuple[str, int, int], str] = {}
+
+
+def get_japicmp_version(path_to_japicmp: Path = PATH_TO_JAPICMP) -> str:
+    """Returns the japicmp version of the jar name, e.g. 0.18.3 for japicmp-0.18.3-jar-with-dependencies.jar"""
+    match = re.match(r"japicmp-(.+?)(-jar-with-dependencies)?\.jar$", Path(path_to_japicmp).name)
+    return match.group(1) if match else Path(path_to_japicmp).name
+
+
+def get_jar_digest(path_to_jar: Path) -> str:
+    stat = os.stat(path_to_jar)
+    key = (str(path_to_jar), stat.st_size, stat.st_mtime_ns)
+    if key not in _jar_digests:
+        digest = hashlib.sha256()
+        with open(path_to_jar, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _jar_digests[key] = digest.hexdigest()
+    return _jar_digests[key]
+
+
+class StaticVerdictCache:
+    """
+    SQLite cache (in WAL mode, so concurrent generators can share it) from (sha256 old jar, sha256 new jar, japicmp
+    version, japicmp options) to the verdict of the static check. The hit and miss counters are stored alongside the
+    verdicts, so the hit rate covers all runs.
+    """
+    def __init__(self, options: list[str] = JAPICMP_OPTIONS, path: Path = STATIC_VERDICT_CACHE,
+                 japicmp_version: str = None):
+        self.path = Path(path)
+        self.options = " ".join(options)
+        self.japicmp_version = japicmp_version or get_japicmp_version()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS verdicts ("
+                             "old_digest TEXT NOT NULL, new_digest TEXT NOT NULL, japicmp_version TEXT NOT NULL, "
+                             "options TEXT NOT NULL, compatible INTEGER NOT NULL, "
+                             "PRIMARY KEY (old_digest, new_digest, japicmp_version, options))")
+                conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _count(self, conn: sqlite3.Connection, name: str):
+        conn.execute("INSERT INTO stats VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET count = count + 1", (name,))
+
+    def get(self, old_digest: str, new_digest: str) -> Optional[bool]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT compatible FROM verdicts WHERE old_digest = ? AND new_digest = ? "
+                               "AND japicmp_version = ? AND options = ?",
+                               (old_digest, new_digest, self.japicmp_version, self.options)).fetchone()
+            with conn:
+                self._count(conn, "hit" if row is not None else "miss")
+        return bool(row[0]) if row is not None else None
+
+    def put(self, old_digest: str, new_digest: str, compatible: bool):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)",
+                             (old_digest, new_digest, self.japicmp_version, self.options, int(compatible)))
+
+    def check(self, path_to_jar_old: Path, path_to_jar_new: Path, static_check: Callable[[Path, Path], bool]) -> bool:
+        """Returns the cached verdict of the jar pair, or runs static_check on it and caches its verdict."""
+        old_digest = get_jar_digest(path_to_jar_old)
+        new_digest = get_jar_digest(path_to_jar_new)
+        if old_digest == new_digest:
+            # Identical jars are trivially compatible
+            with closing(self._connect()) as conn:
+                with conn:
+                    self._count(conn, "identical")
+            return True
+
+        compatible = self.get(old_digest, new_digest)
+        if compatible is None:
+            compatible = static_check(path_to_jar_old, path_to_jar_new)
+            self.put(old_digest, new_digest, compatible)
+        return compatible
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT name, count FROM stats"))
+            (verdicts,) = conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+        hits, misses, identical = counts.get("hit", 0), counts.get("miss", 0), counts.get("identical", 0)
+        lookups = hits + misses + identical
+        return {
+            'verdicts': verdicts,
+            'hits': hits,
+            'misses': misses,
+            'identical': identical,
+            'hit_rate': (hits + identical) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute("DELETE FROM verdicts")
+                conn.execute("DELETE FROM stats")
+
+
+def main():
+    """
+    Example: marco-static-cache stats
+    """
+    cli = argparse.ArgumentParser(description='Static Verdict Cache')
+    cli.add_argument('command', choices=['stats', 'clear'],
+                     help='show the number of cached verdicts and the hit rate, or remove all verdicts and stats')
+
+    args = cli.parse_args()
+    cache = StaticVerdictCache()
+    if args.command == "stats":
+        for name, value in cache.stats().items():
+            print(f"{name}: {value:.2%}" if name == "hit_rate" else f"{name}: {value}")
+    else:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Module responsible for assembling the workspaces in which the base tests are run on candidate code. Instead of copying
+the template directories, their class files are hardlinked into the workspace, and the other files reflinked
+(copy-on-write clones) where possible and only copied as a last resort.
+Hardlinked files share their contents with the template, so they are made read-only: a test that tries to rewrite a
+class file fails instead of corrupting the template. Resources (e.g. files in test-classes that tests may rewrite) are
+never hardlinked, so the test runs can modify them freely.
+"""
+import errno
+import fcntl
+import os
+import shutil
+import stat
+from pathlib import Path
+
+FICLONE = 0x40049409  # Linux ioctl cloning a file on copy-on-write filesystems (btrfs, xfs, ...)
+LINKED_SUFFIXES = {".class"}  # Files that are hardlinked, only read by the test runs
+WRITE_PERMISSIONS = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+
+
+class WorkspaceStats:
+    """Counts how the files of a workspace were materialized."""
+
+    def __init__(self):
+        self.linked = 0
+        self.reflinked = 0
+        self.copied = 0
+        self.bytes_copied = 0
+
+    def __repr__(self):
+        return f"WorkspaceStats(linked={self.linked}, reflinked={self.reflinked}, copied={self.copied}, " \
+               f"bytes_copied={self.bytes_copied})"
+
+
+def reflink(src: Path, dst: Path) -> bool:
+    """Clones src into dst without copying its data, returns False if the filesystem does not support it."""
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def make_read_only(path: Path):
+    mode = os.stat(path).st_mode
+    if mode & WRITE_PERMISSIONS:
+        os.chmod(path, mode & ~WRITE_PERMISSIONS)
+
+
+def place_file(src: Path, dst: Path, stats: WorkspaceStats):
+    if os.path.lexists(dst):
+        os.remove(dst)  # Later layers override earlier ones, as with cp -r
+    if src.suffix in LINKED_SUFFIXES:
+        try:
+            make_read_only(src)  # The link shares the inode, so this protects the template file too
+            os.link(src, dst)
+            stats.linked += 1
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+    if reflink(src, dst):
+        stats.reflinked += 1
+        return
+    shutil.copy2(src, dst)
+    stats.copied += 1
+    stats.bytes_copied += os.path.getsize(dst)
+
+
+def add_layer(src: Path, dst: Path, stats: WorkspaceStats):
+    """Recreates the directory tree of src in dst and places every file of src in it, replacing existing files."""
+    for root, dirs, files in os.walk(src):
+        target_root = dst / os.path.relpath(root, src)
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            source = Path(root) / name
+            if os.path.islink(source):
+                if os.path.lexists(target_root / name):
+                    os.remove(target_root / name)
+                os.symlink(os.readlink(source), target_root / name)
+            else:
+                place_file(source, target_root / name, stats)
+
+
+def assemble_workspace(layers: list[Path], dst: Path) -> WorkspaceStats:
+    """
+    Assembles dst from the given directories, later layers overriding files of earlier ones.
+    For example, assemble_workspace([base.target_path, candidate.target_path], temp_dir / "target") is equivalent to
+    running cp -r base.target_path temp_dir followed by cp -r candidate.target_path temp_dir.
+    """
+    stats = WorkspaceStats()
+    for layer in layers:
+        add_layer(layer, dst, stats)
+    return stats
@@ -18,7 +18,11 @@ setup(
     },
     entry_points={
         'console_scripts': [
-                'marco-generator=server:main'
+                'marco-generator=server:main',
+                'marco-store=server.store:main',
+                'marco-static-cache=server.verdict_cache:main',
+                'marco-repo-cache=server.repo_cache:main',
+                'marco-worker=server.jobs:main'
         ]
     }
 )
@@ -0,0 +1,75 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+# Stands in for "mvn surefire:test": writes a surefire report for each test class of the plan (only those given with
+# -Dtest if any) after the delay of the class, and starts a child process like the JVM forked by surefire
+FAKE_MVN = f"""#!{sys.executable}
+import json, os, subprocess, sys, time
+from pathlib import Path
+
+plan = json.loads(Path(os.environ["FAKE_MVN_PLAN"]).read_text())
+tests = next((arg[len("-Dtest="):].split(",") for arg in sys.argv if arg.startswith("-Dtest=")), list(plan))
+child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+
+def record(**entry):
+    with open(os.environ["FAKE_MVN_LOG"], "a") as log:
+        log.write(json.dumps(entry) + "\\n")
+
+
+record(event="start", cwd=os.getcwd(), args=sys.argv[1:], tests=tests, child=child.pid)
+reports_dir = Path("target") / "surefire-reports"
+reports_dir.mkdir(parents=True, exist_ok=True)
+for test_class in tests:
+    spec = plan[test_class]
+    time.sleep(spec.get("delay", 0))
+    cases = "".join(f'<testcase name="{{name}}" classname="{{test_class}}"><failure/></testcase>'
+                    for name in spec.get("failures", []))
+    cases += f'<testcase name="testPass" classname="{{test_class}}"/>'
+    (reports_dir / f"TEST-{{test_class}}.xml").write_text(
+        f'<?xml version="1.0"?><testsuite name="{{test_class}}" time="{{spec.get("time", 1)}}">{{cases}}</testsuite>')
+    record(event="report", cwd=os.getcwd(), test_class=test_class)
+child.kill()
+record(event="done", cwd=os.getcwd())
+"""
+
+
+class FakeMaven:
+    def __init__(self, bin_dir):
+        self.plan_path = bin_dir / "plan.json"
+        self.log_path = bin_dir / "log.jsonl"
+        self.log_path.touch()
+
+    def plan(self, plan: dict):
+        """Sets {test class: {'delay': seconds, 'failures': [test cases], 'time': seconds}} of the next runs."""
+        self.plan_path.write_text(json.dumps(plan))
+
+    def log(self, event=None) -> list[dict]:
+        entries = [json.loads(line) for line in self.log_path.read_text().splitlines()]
+        return [entry for entry in entries if event is None or entry['event'] == event]
+
+
+@pytest.fixture
+def fake_mvn(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    mvn = bin_dir / "mvn"
+    mvn.write_text(FAKE_MVN)
+    mvn.chmod(mvn.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_MVN_PLAN", str(bin_dir / "plan.json"))
+    monkeypatch.setenv("FAKE_MVN_LOG", str(bin_dir / "log.jsonl"))
+    return FakeMaven(bin_dir)
+
+
+def is_running(pid: int) -> bool:
+    """Zombies count as stopped, as nothing reaps them in some containers."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from server import dynamic
+from server.template import write_template_origin
+from server.template.base_template import BaseTemplate
+from server.template.candidate_template import CandidateTemplate, RELEASE, SOURCE
+from server.test_failure import TestFailure
+
+FAILURE = TestFailure("a.FlakyTest", "testFlaky", "a.FlakyTest", "failure")
+
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    base = object.__new__(BaseTemplate)
+    base.path, base.commit_sha, base.pom_path = tmp_path / "base", "0123abcd", tmp_path / "base" / "pom.xml"
+    baseline = object.__new__(CandidateTemplate)
+    baseline.path = tmp_path / "baseline"
+    baseline.target_path, baseline.pom_path = baseline.path / "target", baseline.path / "pom.xml"
+    os.makedirs(base.path)
+    os.makedirs(baseline.target_path / "classes" / "a")
+    with open(baseline.target_path / "classes" / "a" / "A.class", 'wb') as f:
+        f.write(b"source")
+    write_template_origin(SOURCE, baseline.path)
+    monkeypatch.setattr(dynamic, "get_merged_pom_digest", lambda pom_base, pom_cand: "merged")
+    runs = []
+    monkeypatch.setattr(dynamic, "run_tests", lambda base, candidate: runs.append(candidate) or {FAILURE})
+    return base, baseline, runs
+
+
+def test_baseline_failures_are_computed_once(templates):
+    base, baseline, runs = templates
+    assert dynamic.get_baseline_failures(base, baseline) == {FAILURE}
+    assert dynamic.get_baseline_failures(base, baseline) == {FAILURE}
+    assert len(runs) == 1
+
+
+def test_rebuilt_baseline_classes_invalidate_the_baseline_failures(templates):
+    base, baseline, runs = templates
+    dynamic.get_baseline_failures(base, baseline)
+    with open(baseline.target_path / "classes" / "a" / "A.class", 'wb') as f:
+        f.write(b"rebuilt")
+    dynamic.get_baseline_failures(base, baseline)
+    assert len(runs) == 2
+
+
+def test_baseline_origin_invalidates_the_baseline_failures(templates):
+    base, baseline, runs = templates
+    dynamic.get_baseline_failures(base, baseline)
+    write_template_origin(RELEASE, baseline.path)
+    dynamic.get_baseline_failures(base, baseline)
+    assert len(runs) == 2
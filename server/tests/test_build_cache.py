@@ -0,0 +1,37 @@
+import time
+
+from server.build_cache import BuildCache, NO_COMPILE, NO_RESOLVE, COMPILE_TIMEOUT, SUCCESS
+
+KEY = ("0123abcd", "", "pomdigest", "maven=3.9.6 java=17")
+
+
+def test_failed_build_is_cached(tmp_path):
+    cache = BuildCache(tmp_path / "builds.db")
+    assert cache.get(KEY) is None
+    cache.put(KEY, NO_COMPILE, message="Failed to compile")
+    assert cache.get(KEY) == (NO_COMPILE, "Failed to compile")
+    cache.put(KEY, SUCCESS, artifact=tmp_path)
+    assert cache.get(KEY) == (SUCCESS, "")
+
+
+def test_transient_failures_are_cached_until_they_expire(tmp_path):
+    cache = BuildCache(tmp_path / "builds.db")
+    for outcome in [NO_RESOLVE, COMPILE_TIMEOUT]:
+        cache.put(KEY, outcome, message="transient")
+        assert cache.get(KEY, retry_after=60) == (outcome, "transient")
+        assert cache.get(KEY, retry_after=0) is None
+
+
+def test_expired_transient_failure_is_retried(tmp_path, monkeypatch):
+    cache = BuildCache(tmp_path / "builds.db")
+    cache.put(KEY, COMPILE_TIMEOUT)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 3600)
+    assert cache.get(KEY, retry_after=7200) == (COMPILE_TIMEOUT, "")
+    assert cache.get(KEY, retry_after=1800) is None
+
+
+def test_decisive_failures_do_not_expire(tmp_path):
+    cache = BuildCache(tmp_path / "builds.db")
+    cache.put(KEY, NO_COMPILE)
+    assert cache.get(KEY, retry_after=0) == (NO_COMPILE, "")
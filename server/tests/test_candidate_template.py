@@ -0,0 +1,105 @@
+import json
+import os
+import zipfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import server.template
+from server.build_cache import BuildCache
+from server.template import read_template_metadata, write_template_metadata, write_template_origin
+from server.template import candidate_template
+from server.template.base_template import BASELINE_FAILURES_FILE
+from server.template.candidate_template import CandidateTemplate, RELEASE, SOURCE
+
+G, A, V = "marco.demo", "c", "2"
+GAV = f"{G}:{A}:{V}"
+RELEASED_POM = b"<project>released</project>"
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    dirs = SimpleNamespace(cand=tmp_path / "cand_templates", base=tmp_path / "base_templates", jar=tmp_path / "c-2.jar")
+    monkeypatch.setattr(candidate_template, "CAND_TEMPLATES_DIR", dirs.cand)
+    monkeypatch.setattr(candidate_template, "BASE_TEMPLATES_DIR", dirs.base)
+    monkeypatch.setattr(candidate_template, "get_jar_path", lambda a, v: dirs.jar)
+    monkeypatch.setattr(candidate_template, "fetch",
+                        lambda url, **kwargs: SimpleNamespace(status_code=200, content=RELEASED_POM))
+    monkeypatch.setattr(candidate_template, "BuildCache", lambda: BuildCache(tmp_path / "builds.db"))
+    os.makedirs(dirs.base / GAV)
+    with open(dirs.base / GAV / BASELINE_FAILURES_FILE, 'w') as f:
+        json.dump({'key': "computed against the previous template", 'failures': []}, f)
+    return dirs
+
+
+def write_jar(path, classes: dict[str, bytes]):
+    with zipfile.ZipFile(path, 'w') as z:
+        for name, content in classes.items():
+            z.writestr(name, content)
+
+
+def write_template(path, origin, classes: dict[str, bytes]):
+    for name, content in classes.items():
+        os.makedirs((path / "target" / "classes" / name).parent, exist_ok=True)
+        with open(path / "target" / "classes" / name, 'wb') as f:
+            f.write(content)
+    with open(path / "pom.xml", 'wb') as f:
+        f.write(b"<project>source</project>")
+    write_template_metadata("marco/demo", "v2", "0123abcd", path)
+    write_template_origin(origin, path)
+
+
+def baseline_failures_exist(dirs) -> bool:
+    return os.path.isfile(dirs.base / GAV / BASELINE_FAILURES_FILE)
+
+
+def test_source_template_is_replaced_by_the_release(dirs):
+    write_template(dirs.cand / GAV, SOURCE, {"a/A.class": b"source", "a/Removed.class": b"source"})
+    write_jar(dirs.jar, {"a/A.class": b"release"})
+    template = CandidateTemplate(G, A, V)
+    assert read_template_metadata(template.path)['origin'] == RELEASE
+    assert sorted(os.listdir(template.target_path / "classes" / "a")) == ["A.class"]
+    with open(template.pom_path, 'rb') as f:
+        assert f.read() == RELEASED_POM
+    assert not baseline_failures_exist(dirs)
+
+
+def test_source_template_is_kept_without_the_release(dirs):
+    write_template(dirs.cand / GAV, SOURCE, {"a/A.class": b"source"})
+    template = CandidateTemplate(G, A, V)
+    assert read_template_metadata(template.path)['origin'] == SOURCE
+    assert baseline_failures_exist(dirs)
+
+
+def test_release_template_is_kept(dirs):
+    write_template(dirs.cand / GAV, RELEASE, {"a/A.class": b"release"})
+    write_jar(dirs.jar, {"a/A.class": b"newer"})
+    template = CandidateTemplate(G, A, V)
+    with open(template.target_path / "classes" / "a" / "A.class", 'rb') as f:
+        assert f.read() == b"release"
+    assert baseline_failures_exist(dirs)
+
+
+def test_stale_release_template_is_built_from_source(dirs, tmp_path, monkeypatch):
+    write_template(dirs.cand / GAV, RELEASE, {"a/A.class": b"release"})
+    write_jar(dirs.jar, {"a/A.class": b"release"})
+
+    @contextmanager
+    def worktree(repo_name, commit_sha, worktrees_dir=None):
+        os.makedirs(tmp_path / "worktree", exist_ok=True)
+        yield tmp_path / "worktree"
+
+    def build(self):
+        assert not self.template_exists()  # The release template was discarded first
+        write_template(self.path, SOURCE, {"a/A.class": b"built"})
+
+    monkeypatch.setattr(server.template, "LazyRepository", lambda repo_name: SimpleNamespace(full_name=repo_name))
+    monkeypatch.setattr(server.template, "worktree", worktree)
+    monkeypatch.setattr(CandidateTemplate, "build", build)
+    template = CandidateTemplate(G, A, V, repo_name="marco/demo", tag_name="v2", commit_sha="0123abcd",
+                                 from_source=True)
+    assert read_template_metadata(template.path)['origin'] == SOURCE
+    with open(template.target_path / "classes" / "a" / "A.class", 'rb') as f:
+        assert f.read() == b"built"
+    assert not baseline_failures_exist(dirs)
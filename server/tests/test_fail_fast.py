@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+import server.dynamic as dynamic
+from conftest import is_running
+from server.exceptions import CandidateMavenTestTimeout
+from server.test_failure import TestFailure
+
+BASELINE = {TestFailure("a.ATest", "testOld", "a.ATest", "failure")}
+REGRESSION = TestFailure("b.BTest", "testNew", "b.BTest", "failure")
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(dynamic, "REPORT_POLL_INTERVAL", 0.05)
+
+
+def run(tmp_path, baseline_failures, timeout=30):
+    return dynamic.run_tests_until_regression(["mvn", "surefire:test"], tmp_path,
+                                              tmp_path / "target" / "surefire-reports",
+                                              baseline_failures=baseline_failures, timeout=timeout)
+
+
+def test_stops_at_first_regression(tmp_path, fake_mvn):
+    fake_mvn.plan({"a.ATest": {"failures": ["testOld"]}, "b.BTest": {"delay": 0.2, "failures": ["testNew"]},
+                   "c.CTest": {"delay": 30}})
+    start = time.monotonic()
+    failures = run(tmp_path, BASELINE)
+    assert time.monotonic() - start < 10
+    assert failures == BASELINE | {REGRESSION}
+    assert not fake_mvn.log("done")
+    # The whole process group is killed, including the forked test JVM
+    assert not is_running(fake_mvn.log("start")[0]['child'])
+
+
+def test_baseline_failures_do_not_stop_the_run(tmp_path, fake_mvn):
+    fake_mvn.plan({"a.ATest": {"failures": ["testOld"]}, "b.BTest": {"delay": 0.2}})
+    assert run(tmp_path, BASELINE) is None
+    assert fake_mvn.log("done")
+
+
+def test_skip_after_failure_only_without_baseline_failures(tmp_path, fake_mvn):
+    fake_mvn.plan({"b.BTest": {"failures": ["testNew"]}})
+    assert run(tmp_path, set()) == {REGRESSION}
+    assert "-Dsurefire.skipAfterFailureCount=1" in fake_mvn.log("start")[0]['args']
+    (tmp_path / "rerun").mkdir()
+    run(tmp_path / "rerun", BASELINE)
+    assert "-Dsurefire.skipAfterFailureCount=1" not in fake_mvn.log("start")[1]['args']
+
+
+def test_timeout_kills_the_run(tmp_path, fake_mvn):
+    fake_mvn.plan({"a.ATest": {"delay": 30}})
+    with pytest.raises(CandidateMavenTestTimeout):
+        run(tmp_path, BASELINE, timeout=0.5)
+    assert not is_running(fake_mvn.log("start")[0]['child'])
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+
+import pytest
+
+from server import jobs
+from server.jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED, get_worker_name, is_worker_alive
+
+
+def claim_all(path, results):
+    queue = JobQueue(path)
+    worker = get_worker_name()
+    claimed = []
+    while (job := queue.claim(worker)) is not None:
+        claimed.append(job[0])
+    results.put(claimed)
+
+
+def claim_and_die(path, count):
+    """Claims jobs and exits without finishing them, like a crashed worker."""
+    queue = JobQueue(path)
+    for _ in range(count):
+        queue.claim(get_worker_name())
+    os._exit(0)
+
+
+def requeue(path, results):
+    results.put(JobQueue(path).requeue_orphaned())
+
+
+def run_processes(target, args, count=4) -> list:
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=target, args=(*args, results)) for _ in range(count)]
+    for process in processes:
+        process.start()
+    collected = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+
+def test_enqueue_returns_existing_job(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    job_id = queue.enqueue("marco.demo:c:1")
+    assert queue.enqueue("marco.demo:c:1") == job_id
+    queue.fail(job_id, "boom")
+    assert queue.enqueue("marco.demo:c:1") == job_id  # Failed too recently
+    retried = queue.enqueue("marco.demo:c:1", retry_after=0)
+    assert retried != job_id and queue.get(retried)['status'] == QUEUED
+
+
+def test_concurrent_claims_take_each_job_once(tmp_path):
+    path = tmp_path / "jobs.db"
+    queue = JobQueue(path)
+    job_ids = [queue.enqueue(f"marco.demo:c:{i}") for i in range(40)]
+    claimed = [job_id for claims in run_processes(claim_all, (path,)) for job_id in claims]
+    assert sorted(claimed) == job_ids
+    assert queue.stats() == {RUNNING: 40}
+    assert all(queue.get(job_id)['attempts'] == 1 for job_id in job_ids)
+
+
+def test_concurrent_requeue_of_orphaned_jobs(tmp_path):
+    path = tmp_path / "jobs.db"
+    queue = JobQueue(path)
+    for i in range(6):
+        queue.enqueue(f"marco.demo:c:{i}")
+    crashed = multiprocessing.Process(target=claim_and_die, args=(path, 3))
+    crashed.start()
+    crashed.join()
+    live_job, _ = queue.claim(get_worker_name())
+    remote_job, _ = queue.claim("elsewhere:1")
+    assert not is_worker_alive(queue.get(1)['worker'])
+
+    assert sum(run_processes(requeue, (path,), count=3)) == 3
+    assert queue.stats() == {QUEUED: 4, RUNNING: 2}
+    assert queue.get(live_job)['status'] == RUNNING and queue.get(remote_job)['status'] == RUNNING
+    # Requeued jobs are claimed again, in their original order
+    assert queue.claim("worker:2")[0] == 1
+
+
+def test_finished_jobs(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    done, failed = queue.enqueue("marco.demo:c:1"), queue.enqueue("marco.demo:c:2")
+    for _ in range(2):
+        queue.claim("worker:1")
+    queue.complete(done)
+    queue.fail(failed, "RuntimeError('boom')")
+    assert queue.get(done)['status'] == DONE and queue.get(failed)['error'] == "RuntimeError('boom')"
+    assert queue.stats() == {DONE: 1, FAILED: 1}
+    assert queue.get(42) is None
+
+
+class StopWorker(BaseException):
+    pass
+
+
+def test_worker_requeues_jobs_of_dead_workers(tmp_path, monkeypatch):
+    path = tmp_path / "jobs.db"
+    queue = JobQueue(path)
+    job_id = queue.enqueue("marco.demo:c:1")
+    crashed = multiprocessing.Process(target=claim_and_die, args=(path, 1))
+    crashed.start()
+    crashed.join()
+    assert queue.get(job_id)['status'] == RUNNING
+    assert queue.enqueue("marco.demo:c:1") == job_id
+
+    def run_job(gav, **kwargs):
+        assert queue.get(job_id)['worker'] == get_worker_name()
+        raise StopWorker(gav)
+
+    monkeypatch.setattr(jobs, "run_job", run_job)
+    with pytest.raises(StopWorker, match="marco.demo:c:1"):
+        jobs.work(path, poll_interval=0)
+    assert queue.get(job_id)['attempts'] == 2
@@ -0,0 +1,31 @@
+import threading
+import time
+
+import server.prefetch as prefetch
+
+
+def test_maven_fallback_runs_one_at_a_time(tmp_path, monkeypatch):
+    running, overlaps, copied = [], [], []
+    lock = threading.Lock()
+
+    def run(command, **kwargs):
+        with lock:
+            running.append(command)
+            overlaps.append(len(running))
+        time.sleep(0.05)
+        artifact = next(arg for arg in command if arg.startswith("-Dartifact="))
+        g, a, v = artifact[len("-Dartifact="):].split(":")
+        (tmp_path / f"{a}-{v}.jar").write_bytes(b"PK")
+        copied.append(v)
+        with lock:
+            running.remove(command)
+
+    monkeypatch.setattr(prefetch, "PATH_TO_JARS", tmp_path)
+    monkeypatch.setattr(prefetch, "download_jar", lambda g, a, v, repository_url: v == "1")
+    monkeypatch.setattr(prefetch.subprocess, "run", run)
+    (tmp_path / "c-0.jar").write_bytes(b"PK")
+
+    available = prefetch.prefetch_jars("marco.demo", "c", ["0", "1", "2", "3", "4"])
+    assert available == {"0": True, "1": True, "2": True, "3": True, "4": True}
+    assert sorted(copied) == ["2", "3", "4"]
+    assert max(overlaps) == 1
@@ -0,0 +1,80 @@
+import pytest
+
+import server
+from server import store as store_module
+from server.store import (JsonCompatibilityStore, SqliteCompatibilityStore, refresh_ranges, refresh_ranges_of_metadata,
+                          update_range)
+
+GAV = "marco.demo:c:1"
+METADATA_URL = "http://127.0.0.1:5000/maven/marco/demo/c/maven-metadata.xml"
+
+
+def metadata(versions: list[str]) -> bytes:
+    listed = "".join(f"<version>{v}</version>" for v in versions)
+    return f"<metadata><groupId>marco.demo</groupId><artifactId>c</artifactId><versioning>" \
+           f"<versions>{listed}</versions></versioning></metadata>".encode()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        return JsonCompatibilityStore(tmp_path / "compatibilities.json")
+    return SqliteCompatibilityStore(tmp_path / "compatibilities.db")
+
+
+@pytest.fixture
+def available(monkeypatch):
+    available = {"versions": ["3", "2", "1"], "fetches": 0}
+
+    def get_available_versions(g, a, use_remote=False):
+        available["fetches"] += 1
+        return available["versions"]
+
+    monkeypatch.setattr(store_module, "get_available_versions", get_available_versions)
+    return available
+
+
+def test_mapping_writes_outdate_ranges(store, available):
+    store.upsert(GAV, {"1", "2"})
+    assert update_range(store, GAV) == "[1,2]"
+    assert refresh_ranges(store) == 0
+    store.save({GAV: {"3"}})
+    assert refresh_ranges(store) == 1
+    assert store.get_range(GAV) == "[1,3]"
+
+
+def test_new_available_versions_outdate_ranges(store, available):
+    store.upsert(GAV, {"1", "2"})
+    available["versions"] = ["2", "1"]
+    update_range(store, GAV)
+    available["versions"] = ["2", "1.5", "1"]
+    assert refresh_ranges(store) == 1
+    assert store.get_range(GAV) == "[1],[2]"
+
+
+def test_saved_mappings_get_ranges(tmp_path, available):
+    path = tmp_path / "compatibilities.json"
+    server.save_compatibility_store({GAV: {"1", "2"}, "marco.demo:c:2": {"2"}}, write_to_path=path)
+    assert JsonCompatibilityStore(path).load_ranges().keys() == {GAV, "marco.demo:c:2"}
+    assert JsonCompatibilityStore(path).get_range(GAV) == "[1,2]"
+    assert available["fetches"] == 1  # Once per GA
+
+
+def test_changed_metadata_refreshes_ranges(store, available):
+    store.upsert(GAV, {"1", "2"})
+    available["versions"] = ["2", "1"]
+    update_range(store, GAV)
+    assert refresh_ranges_of_metadata(METADATA_URL, metadata(["1", "2"]), store=store) == 0
+    assert refresh_ranges_of_metadata(METADATA_URL, metadata(["1", "1.5", "2"]), store=store) == 1
+    assert store.get_range(GAV) == "[1],[2]"
+    assert available["fetches"] == 1
+
+
+def test_unrelated_metadata_is_ignored(store, available):
+    store.upsert(GAV, {"1", "2"})
+    update_range(store, GAV)
+    other_ga = METADATA_URL.replace("/c/", "/b/")
+    assert refresh_ranges_of_metadata(other_ga, metadata(["1", "1.5", "2"]), store=store) == 0
+    assert refresh_ranges_of_metadata(METADATA_URL.replace("maven-metadata.xml", "1/c-1.pom"), b"<project/>",
+                                      store=store) == 0
+    assert refresh_ranges_of_metadata(METADATA_URL, b"Not Found", store=store) == 0
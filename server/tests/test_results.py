@@ -0,0 +1,99 @@
+import sqlite3
+import time
+
+import pytest
+
+import server
+from server import (CompatibilityResult, RETRY_ERRORS, get_compatibility_result, load_decisive_results,
+                    save_results)
+from server.build_cache import TRANSIENT_OUTCOMES
+from server.store import JsonCompatibilityStore, SqliteCompatibilityStore
+
+G, A, V = "marco.demo", "c", "2"
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        return JsonCompatibilityStore(tmp_path / "compatibilities.json")
+    return SqliteCompatibilityStore(tmp_path / "compatibilities.db")
+
+
+def result(cv, static=True, dynamic=True, err="", retry_after=None):
+    return CompatibilityResult(G, A, V, cv, static, dynamic, err=err, seconds=1.0, tested_at=0.0,
+                               retry_after=retry_after)
+
+
+def test_transient_build_failures_are_retried():
+    assert TRANSIENT_OUTCOMES <= RETRY_ERRORS
+
+
+def test_only_decisive_results_are_reused(store):
+    save_results(store, [result("1"), result("3", dynamic=False, err="NO_COMPILE"),
+                         result("4", dynamic=False, err="NO_RESOLVE"),
+                         result("5", static=False, dynamic=False, err="NO_JAR")], {})
+    reused = load_decisive_results(store, G, A, V)
+    assert sorted(reused) == ["1", "3"]
+    assert reused["3"].err == "NO_COMPILE" and reused["3"].is_compatible() is False
+
+
+def test_previous_results_are_not_saved_again(store):
+    previous = {"1": result("1")}
+    save_results(store, [previous["1"], result("3", dynamic=False)], previous)
+    assert sorted(store.get_results(f"{G}:{A}:{V}")) == ["3"]
+
+
+def test_retryable_results_are_reused_until_their_retry_time(store):
+    save_results(store, [result("4", dynamic=False, err="NO_RESOLVE", retry_after=time.time() + 60),
+                         result("5", dynamic=False, err="CAND_COMPILE_TIMEOUT", retry_after=time.time() - 60),
+                         result("6", dynamic=False, err="NO_TAG")], {})
+    reused = load_decisive_results(store, G, A, V)
+    assert sorted(reused) == ["4"]
+    assert reused["4"].err == "NO_RESOLVE" and reused["4"].retry_after is not None
+
+
+def test_retryable_results_get_a_retry_time(monkeypatch):
+    monkeypatch.setattr(server, "run_compatibility_checks",
+                        lambda g, a, v, cv, **kwargs: result(cv, dynamic=False, err="CAND_TEST_TIMEOUT"))
+    timed_out = get_compatibility_result(G, A, V, "3")
+    assert timed_out.retry_after == timed_out.tested_at + server.RESULT_RETRY_AFTER
+    assert timed_out.is_decisive()
+    monkeypatch.setattr(server, "run_compatibility_checks", lambda g, a, v, cv, **kwargs: result(cv))
+    assert get_compatibility_result(G, A, V, "3").retry_after is None
+
+
+def test_sqlite_store_of_earlier_versions_is_migrated(tmp_path):
+    path = tmp_path / "compatibilities.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE results (group_id TEXT NOT NULL, artifact_id TEXT NOT NULL, version TEXT NOT NULL, "
+                     "candidate_version TEXT NOT NULL, statically_compatible INTEGER, dynamically_compatible INTEGER, "
+                     "err TEXT NOT NULL, seconds REAL, tested_at REAL, "
+                     "PRIMARY KEY (group_id, artifact_id, version, candidate_version))")
+        conn.execute("INSERT INTO results VALUES (?, ?, ?, '1', 1, 1, '', 1.0, 0.0)", (G, A, V))
+    conn.close()
+    store = SqliteCompatibilityStore(path)
+    assert store.get_results(f"{G}:{A}:{V}")["1"]["retry_after"] is None
+    save_results(store, [result("4", dynamic=False, err="NO_RESOLVE", retry_after=time.time() + 60)], {})
+    assert sorted(load_decisive_results(store, G, A, V)) == ["1", "4"]
+
+
+def test_retry_replaces_stored_result(store):
+    save_results(store, [result("4", dynamic=False, err="NO_RESOLVE")], {})
+    assert load_decisive_results(store, G, A, V) == {}
+    save_results(store, [result("4")], {})
+    assert load_decisive_results(store, G, A, V)["4"].is_compatible() is True
+
+
+def test_reused_results_are_not_checked_again(monkeypatch):
+    checked = []
+
+    def run_compatibility_checks(g, a, v, cv, **kwargs):
+        checked.append(cv)
+        return result(cv)
+
+    monkeypatch.setattr(server, "run_compatibility_checks", run_compatibility_checks)
+    previous = {"1": result("1", dynamic=False)}
+    assert get_compatibility_result(G, A, V, "1", previous_results=previous) is previous["1"]
+    fresh = get_compatibility_result(G, A, V, "3", previous_results=previous)
+    assert checked == ["3"]
+    assert fresh.is_compatible() and fresh.seconds is not None and fresh.tested_at is not None
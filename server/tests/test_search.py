@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from server.search import GallopingSearch, LinearSearch, get_search_strategy
+
+CANDIDATES = [str(i) for i in range(12)]
+
+
+def make_evaluate(boundary: int, no_verdict=(), evaluated: list = None):
+    """Candidates before the boundary are compatible, those in no_verdict have no verdict (e.g. NO_JAR)."""
+    def evaluate(cv):
+        if evaluated is not None:
+            evaluated.append(cv)
+        if int(cv) in no_verdict:
+            return None
+        return int(cv) < boundary
+    return evaluate
+
+
+@pytest.mark.parametrize("boundary", range(len(CANDIDATES) + 1))
+def test_galloping_finds_boundary(boundary):
+    report = GallopingSearch().search(make_evaluate(boundary), CANDIDATES)
+    assert report.compatible() == set(CANDIDATES[:boundary])
+    assert set(report.tested) | set(report.inferred) == set(CANDIDATES)
+    assert len(report.tested) < len(CANDIDATES) or len(CANDIDATES) <= 4
+
+
+def test_galloping_probes_below_gap():
+    # 4 and 5 have no verdict, so the bisection must look below them to find that 3 is compatible
+    report = GallopingSearch().search(make_evaluate(4, no_verdict={4, 5}), CANDIDATES)
+    assert report.compatible() == {"0", "1", "2", "3"}
+    assert report.tested["4"] is None and report.tested["5"] is None
+    assert "4" not in report.inferred and "5" not in report.inferred
+    assert all(report.inferred[cv] is False for cv in CANDIDATES[7:])
+
+
+@pytest.mark.parametrize("no_verdict", [{1}, {2, 3}, {0, 1, 2}, {5, 6, 7, 8, 9}, set(range(12))])
+def test_galloping_with_gaps_never_infers_wrong_verdicts(no_verdict):
+    boundary = 6
+    report = GallopingSearch().search(make_evaluate(boundary, no_verdict=no_verdict), CANDIDATES)
+    for cv, is_compatible in report.inferred.items():
+        assert is_compatible == (int(cv) < boundary)
+    for cv, is_compatible in report.tested.items():
+        assert is_compatible == (None if int(cv) in no_verdict else int(cv) < boundary)
+    # The boundary is found whenever a candidate on each side of it has a verdict
+    if {boundary - 1, boundary}.isdisjoint(no_verdict):
+        assert all(cv in report.tested or cv in report.inferred for cv in CANDIDATES if int(cv) not in no_verdict)
+
+
+def test_galloping_evaluates_candidates_once():
+    evaluated = []
+    GallopingSearch().search(make_evaluate(4, no_verdict={4, 5}, evaluated=evaluated), CANDIDATES)
+    assert len(evaluated) == len(set(evaluated))
+
+
+def test_budget_limits_evaluations():
+    evaluated = []
+    report = GallopingSearch(budget=3).search(make_evaluate(9, evaluated=evaluated), CANDIDATES)
+    assert len(evaluated) == 3
+    assert report.compatible() <= set(CANDIDATES[:9])
+
+
+def test_known_results_are_not_evaluated_nor_counted():
+    evaluated = []
+    known = {cv: True for cv in CANDIDATES[:4]}
+    report = GallopingSearch(budget=3).search(make_evaluate(9, evaluated=evaluated), CANDIDATES, known=known)
+    assert not set(evaluated) & set(known)
+    assert len(evaluated) == 3
+    assert report.tested["2"] is True and report.results["2"] is True  # Known results are part of the report
+
+
+@pytest.mark.parametrize("boundary", range(len(CANDIDATES) + 1))
+@pytest.mark.parametrize("window", [2, 3, 4])
+def test_galloping_with_window_finds_boundary(boundary, window):
+    evaluated = []
+    with ThreadPoolExecutor(window) as executor:
+        report = GallopingSearch().search(make_evaluate(boundary, no_verdict={5}, evaluated=evaluated), CANDIDATES,
+                                          executor=executor, window=window)
+    assert len(evaluated) == len(set(evaluated))
+    for cv, is_compatible in report.tested.items():
+        assert is_compatible == (None if cv == "5" else int(cv) < boundary)
+    for cv, is_compatible in report.inferred.items():
+        assert is_compatible == (int(cv) < boundary)
+    sequential = GallopingSearch().search(make_evaluate(boundary, no_verdict={5}), CANDIDATES)
+    assert report.compatible() == sequential.compatible()
+
+
+def test_galloping_evaluates_probes_concurrently():
+    running, overlapped = set(), []
+    lock = threading.Lock()
+
+    def evaluate(cv):
+        with lock:
+            running.add(cv)
+            overlapped.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(cv)
+        return int(cv) < 7
+
+    with ThreadPoolExecutor(3) as executor:
+        report = GallopingSearch().search(evaluate, CANDIDATES, executor=executor, window=3)
+    assert max(overlapped) > 1
+    assert report.compatible() == set(CANDIDATES[:7])
+
+
+def test_window_respects_budget():
+    evaluated = []
+    with ThreadPoolExecutor(4) as executor:
+        GallopingSearch(budget=3).search(make_evaluate(9, evaluated=evaluated), CANDIDATES, executor=executor,
+                                         window=4)
+    assert len(evaluated) == 3
+
+
+def test_linear_stops_after_max_fail():
+    evaluated = []
+    report = LinearSearch(max_fail=2).search(make_evaluate(3, evaluated=evaluated), CANDIDATES)
+    assert evaluated == ["0", "1", "2", "3", "4"]
+    assert report.compatible() == {"0", "1", "2"} and not report.inferred
+
+
+def test_get_search_strategy():
+    assert get_search_strategy("budgeted", budget=5).budget == 5
+    assert get_search_strategy("galloping").sparse and not get_search_strategy("linear").sparse
+    with pytest.raises(ValueError):
+        get_search_strategy("random")
+
+
+def test_galloping_checks_candidates_lazily(monkeypatch):
+    fetched, checked = [], []
+    monkeypatch.setattr(server, "get_static_verdicts", lambda *args, **kwargs: pytest.fail("checked all candidates"))
+    monkeypatch.setattr(server, "prefetch_jars", lambda g, a, versions, use_local=False: fetched.extend(versions))
+
+    def run_compatibility_checks(g, a, v, cv, **kwargs):
+        checked.append(cv)
+        return server.CompatibilityResult(g, a, v, cv, int(cv) < 4, int(cv) < 4)
+
+    monkeypatch.setattr(server, "run_compatibility_checks", run_compatibility_checks)
+    base = SimpleNamespace(group_id="marco.demo", artifact_id="c", version="base")
+    previous = {"0": server.CompatibilityResult("marco.demo", "c", "base", "0", True, True)}
+    report = server.get_compatible_candidates(base, CANDIDATES, strategy=GallopingSearch(budget=4),
+                                              previous_results=previous)
+    assert report.compatible() == {"0", "1", "2", "3"}
+    assert "0" not in checked and fetched == checked and len(checked) <= 4
@@ -0,0 +1,67 @@
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import server
+import server.dynamic as dynamic
+from conftest import is_running
+from server.test_failure import TestFailure
+
+DEMO_POM = Path(server.__file__).parent.parent / "resources" / "cand_templates" / "marco.demo:c:1" / "pom.xml"
+DURATIONS = {"a.ATest": 3.0, "b.BTest": 2.0, "c.CTest": 1.0}
+BASELINE = {TestFailure("a.ATest", "testOld", "a.ATest", "failure")}
+
+
+@pytest.fixture(autouse=True)
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(dynamic, "SCRATCH_DIR", tmp_path / "scratch")
+    monkeypatch.setattr(dynamic, "REPORT_POLL_INTERVAL", 0.05)
+
+
+@pytest.fixture
+def templates(tmp_path):
+    """Base template whose baseline ran the test classes of DURATIONS, and a candidate template."""
+    base = SimpleNamespace(pom_path=DEMO_POM, target_path=tmp_path / "base" / "target", tag_name="base")
+    candidate = SimpleNamespace(pom_path=DEMO_POM, target_path=tmp_path / "candidate" / "target", tag_name="candidate")
+    (base.target_path / "test-classes").mkdir(parents=True)
+    (base.target_path / "test-classes" / "ATest.class").write_bytes(b"\xca\xfe\xba\xbe")
+    reports_dir = base.target_path / "surefire-reports_BASE"
+    reports_dir.mkdir()
+    for test_class, duration in DURATIONS.items():
+        (reports_dir / f"TEST-{test_class}.xml").write_text(f'<testsuite name="{test_class}" time="{duration}"/>')
+    (candidate.target_path / "classes").mkdir(parents=True)
+    (candidate.target_path / "classes" / "A.class").write_bytes(b"\xca\xfe\xba\xbe")
+    return base, candidate
+
+
+def test_get_shards_balances_durations():
+    shards = dynamic.get_shards({"a": 5.0, "b": 4.0, "c": 3.0, "d": 2.0, "e": 1.0}, 2)
+    assert shards == [{"a", "d", "e"}, {"b", "c"}]
+    assert dynamic.get_shards({"a": 1.0}, 4) == [{"a"}]
+
+
+def test_shard_failures_are_merged(templates, fake_mvn):
+    fake_mvn.plan({"a.ATest": {"failures": ["testOld"]}, "b.BTest": {}, "c.CTest": {"failures": ["testNew"]}})
+    failures = dynamic.run_tests(*templates, shards=2)
+    assert failures == BASELINE | {TestFailure("c.CTest", "testNew", "c.CTest", "failure")}
+    starts = fake_mvn.log("start")
+    assert sorted(sorted(start['tests']) for start in starts) == [["a.ATest"], ["b.BTest", "c.CTest"]]
+    assert len({start['cwd'] for start in starts}) == 2  # Every shard has its own workspace
+
+
+def test_selected_tests_are_sharded(templates, fake_mvn):
+    fake_mvn.plan({"a.ATest": {}, "b.BTest": {}, "c.CTest": {}})
+    assert dynamic.run_tests(*templates, tests={"b.BTest", "c.CTest"}, shards=2) == set()
+    assert sorted(test for start in fake_mvn.log("start") for test in start['tests']) == ["b.BTest", "c.CTest"]
+
+
+def test_regression_stops_all_shards(templates, fake_mvn):
+    fake_mvn.plan({"a.ATest": {"delay": 30}, "b.BTest": {"failures": ["testNew"]}, "c.CTest": {"delay": 30}})
+    start = time.monotonic()
+    failures = dynamic.run_tests(*templates, baseline_failures=BASELINE, shards=2)
+    assert time.monotonic() - start < 10
+    assert TestFailure("b.BTest", "testNew", "b.BTest", "failure") in failures
+    assert not fake_mvn.log("done")
+    assert not any(is_running(start['child']) for start in fake_mvn.log("start"))
@@ -0,0 +1,90 @@
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from server import static
+from server.exceptions import JapicmpFailedException
+from server.static import JapicmpBatchRunner, statically_compatible_batch
+from server.verdict_cache import StaticVerdictCache
+
+# Stands in for the JVM: "java -jar japicmp.jar" writes to stderr for incompatible pairs, and the batch helper answers
+# each pair written to its stdin, hanging on pairs with a "slow" candidate jar and failing on "broken" ones
+FAKE_JAVA = f"""#!{sys.executable}
+import sys, time
+if sys.argv[1] == "-jar":
+    with open(sys.argv[0] + ".single", "a") as f:
+        f.write(sys.argv[-3] + "\\n")
+    if "bad" in " ".join(sys.argv):
+        print("incompatible", file=sys.stderr)
+    sys.exit(0)
+with open(sys.argv[0] + ".starts", "a") as f:
+    f.write("started\\n")
+for line in sys.stdin:
+    old, new = line.rstrip("\\n").split("\\t")
+    if "slow" in new:
+        time.sleep(60)
+    if "broken" in new:
+        print("ERROR\\t" + old + "\\t" + new + "\\tjava.lang.OutOfMemoryError: Java heap space", flush=True)
+        continue
+    print(("FAIL" if "bad" in new else "OK") + "\\t" + old + "\\t" + new, flush=True)
+"""
+
+
+@pytest.fixture
+def fake_java(tmp_path, monkeypatch):
+    java = tmp_path / "bin" / "java"
+    java.parent.mkdir()
+    java.write_text(FAKE_JAVA)
+    java.chmod(java.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{java.parent}{os.pathsep}{os.environ['PATH']}")
+    return java
+
+
+def make_jars(tmp_path, *names):
+    for name in names:
+        (tmp_path / name).write_bytes(b"PK" + name.encode())  # Distinct contents, identical jars are not compared
+    return [tmp_path / name for name in names]
+
+
+def test_batch_verdicts(tmp_path, fake_java):
+    old, good, bad = make_jars(tmp_path, "c-1.jar", "c-2.jar", "c-bad.jar")
+    with JapicmpBatchRunner() as runner:
+        assert runner.compare(old, good) is True
+        assert runner.compare(old, bad) is False
+    assert fake_java.with_suffix(".starts").read_text().count("started") == 1
+
+
+def test_slow_pair_falls_back_and_restarts_helper(tmp_path, fake_java):
+    old, slow, good = make_jars(tmp_path, "c-1.jar", "c-slow.jar", "c-2.jar")
+    with JapicmpBatchRunner(timeout=1) as runner:
+        start = time.monotonic()
+        assert runner.compare(old, slow) is True  # Verdict of the single japicmp call
+        assert time.monotonic() - start < 10
+        assert runner.compare(old, good) is True
+    assert fake_java.with_suffix(".starts").read_text().count("started") == 2
+
+
+def test_failed_pair_raises(tmp_path, fake_java):
+    old, broken, good = make_jars(tmp_path, "c-1.jar", "c-broken.jar", "c-2.jar")
+    with JapicmpBatchRunner() as runner:
+        with pytest.raises(JapicmpFailedException, match="OutOfMemoryError"):
+            runner.compare(old, broken)
+        assert runner.compare(old, good) is True  # The helper keeps running
+    assert fake_java.with_suffix(".starts").read_text().count("started") == 1
+
+
+def test_failed_pair_falls_back_uncached(tmp_path, fake_java, monkeypatch):
+    make_jars(tmp_path, "c-1.jar", "c-broken.jar", "c-bad.jar")
+    monkeypatch.setattr(static, "get_jar_path", lambda a, v: tmp_path / f"{a}-{v}.jar")
+    cache_path = tmp_path / "verdicts.db"
+    monkeypatch.setattr(static, "StaticVerdictCache", lambda: StaticVerdictCache(path=cache_path))
+
+    assert statically_compatible_batch("g", "c", "1", ["broken", "bad"]) == {"broken": True, "bad": False}
+    assert fake_java.with_suffix(".single").read_text().splitlines() == [str(tmp_path / "c-broken.jar")]
+
+    # Only the verdict of the batch is cached, the pair japicmp failed on is checked again
+    assert statically_compatible_batch("g", "c", "1", ["broken", "bad"]) == {"broken": True, "bad": False}
+    assert fake_java.with_suffix(".single").read_text().splitlines() == [str(tmp_path / "c-broken.jar")] * 2
@@ -0,0 +1,52 @@
+from xml.etree import ElementTree
+
+import pytest
+
+from server.test_failure import TestFailure, get_test_class_durations, parse_report, parse_reports_dir
+
+REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="a.ATest" time="1,234.5" tests="4" errors="1" skipped="1" failures="1">
+  <properties><property name="java.version" value="17"/></properties>
+  <testcase name="testPass" classname="a.ATest" time="0.1"><system-out>{output}</system-out></testcase>
+  <testcase name="testFailure" classname="a.ATest" time="0.1"><failure message="boom">trace</failure></testcase>
+  <testcase name="testError" classname="a.ATest" time="0.1"><error type="java.lang.NullPointerException"/></testcase>
+  <testcase name="testSkipped" classname="a.ATest" time="0"><skipped/></testcase>
+</testsuite>
+"""
+
+
+@pytest.fixture
+def reports_dir(tmp_path):
+    (tmp_path / "TEST-a.ATest.xml").write_text(REPORT.format(output="x" * 100000))
+    (tmp_path / "TEST-b.BTest.xml").write_text('<testsuite name="b.BTest" time="2">'
+                                               '<testcase name="testPass" classname="b.BTest"/></testsuite>')
+    (tmp_path / "a.ATest.txt").write_text("not a report")
+    return tmp_path
+
+
+def test_parse_report(reports_dir):
+    results, failures = parse_report(reports_dir / "TEST-a.ATest.xml")
+    assert results == {'pass': 1, 'failure': 1, 'error': 1, 'skipped': 1}
+    assert failures == {TestFailure("a.ATest", "testFailure", "a.ATest", "failure"),
+                        TestFailure("a.ATest", "testError", "a.ATest", "error"),
+                        TestFailure("a.ATest", "testSkipped", "a.ATest", "skipped")}
+    assert {failure.type for failure in failures} == {"failure", "error", "skipped"}
+
+
+def test_partial_report(tmp_path):
+    partial = tmp_path / "TEST-a.ATest.xml"
+    partial.write_text(REPORT.format(output="")[:300])
+    assert parse_report(partial) == ({'pass': 0, 'failure': 0, 'error': 0, 'skipped': 0}, set())
+    with pytest.raises(ElementTree.ParseError):
+        parse_report(partial, strict=True)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_parse_reports_dir(reports_dir, jobs):
+    results, failures = parse_reports_dir(reports_dir, jobs=jobs)
+    assert results == {'pass': 2, 'failure': 1, 'error': 1, 'skipped': 1}
+    assert len(failures) == 3
+
+
+def test_test_class_durations(reports_dir):
+    assert get_test_class_durations(reports_dir) == {"a.ATest": 1234.5, "b.BTest": 2.0}
@@ -0,0 +1,109 @@
+import zipfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import server
+from server import dynamic
+from server.search import LinearSearch
+from server.test_failure import TestFailure
+from server.test_selection import audit_selection, get_changed_classes, select_tests
+
+RESOURCES = Path(server.__file__).parent.parent / "resources"
+DEMO_JARS = RESOURCES / "maven_repository" / "marco" / "demo" / "c"
+DEMO_BASE = RESOURCES / "base_templates" / "marco.demo:c:1" / "target"
+
+
+def pom(version: str) -> Path:
+    return DEMO_JARS / version / f"c-{version}.pom"
+
+
+def template(version: str, tmp_path: Path, pom_path: Path = None) -> SimpleNamespace:
+    classes_dir = unpack(version, tmp_path)
+    return SimpleNamespace(gav=f"marco.demo:c:{version}", target_path=classes_dir.parent,
+                           pom_path=pom_path or pom(version))
+
+
+def write_pom(path: Path, version: str, dependency: str) -> Path:
+    """Writes the POM of the demo version with an additional compile dependency."""
+    path.write_text(pom(version).read_text().replace("<dependencies>", f"<dependencies>{dependency}"))
+    return path
+
+
+def unpack(version: str, tmp_path: Path) -> Path:
+    """Unpacks a demo jar the way candidate templates are prepared from released jars."""
+    classes_dir = tmp_path / version / "classes"
+    with zipfile.ZipFile(DEMO_JARS / version / f"c-{version}.jar") as z:
+        z.extractall(classes_dir)
+    return classes_dir
+
+
+def test_jar_metadata_is_ignored(tmp_path):
+    assert get_changed_classes(unpack("1", tmp_path), unpack("3", tmp_path)) == {"marco.demo.c.CoreMath"}
+
+
+def test_selection_on_jar_templates(tmp_path):
+    selected = select_tests(DEMO_BASE / "test-classes", DEMO_BASE / "surefire-reports_BASE",
+                            unpack("1", tmp_path), unpack("3", tmp_path))
+    assert selected == {"marco.demo.c.CoreMathTest"}
+
+
+def test_unchanged_jar_selects_nothing(tmp_path):
+    base_classes = unpack("1", tmp_path)
+    (base_classes / "META-INF" / "MANIFEST.MF").write_text("Manifest-Version: 1.0\nBuilt-By: someone else\n")
+    cand_classes = unpack("1", tmp_path / "candidate")
+    assert select_tests(DEMO_BASE / "test-classes", DEMO_BASE / "surefire-reports_BASE",
+                        base_classes, cand_classes) == set()
+
+
+def test_changed_service_file_runs_all_tests(tmp_path):
+    base_classes, cand_classes = unpack("1", tmp_path), unpack("3", tmp_path)
+    (cand_classes / "META-INF" / "services").mkdir()
+    (cand_classes / "META-INF" / "services" / "marco.demo.c.Plugin").write_text("marco.demo.c.CoreMath\n")
+    assert get_changed_classes(base_classes, cand_classes) is None
+
+
+def test_selection_with_the_same_dependencies(tmp_path):
+    base = SimpleNamespace(target_path=DEMO_BASE, pom_path=pom("1"))
+    selected = dynamic.get_selected_tests(base, template("1", tmp_path), template("3", tmp_path))
+    assert selected == {"marco.demo.c.CoreMathTest"}
+
+
+def test_changed_dependencies_run_all_tests(tmp_path):
+    base = SimpleNamespace(target_path=DEMO_BASE, pom_path=pom("1"))
+    dependency = "<dependency><groupId>marco.demo</groupId><artifactId>b</artifactId><version>{}</version></dependency>"
+    baseline = template("1", tmp_path, write_pom(tmp_path / "c-1.pom", "1", dependency.format("1")))
+    same = template("3", tmp_path / "same", write_pom(tmp_path / "c-3-same.pom", "3", dependency.format("1")))
+    other = template("3", tmp_path / "other", write_pom(tmp_path / "c-3-other.pom", "3", dependency.format("2")))
+    assert dynamic.get_selected_tests(base, baseline, same) == {"marco.demo.c.CoreMathTest"}
+    assert dynamic.get_selected_tests(base, baseline, other) is None
+
+
+def test_dependencies_on_the_project_version_run_all_tests(tmp_path):
+    base = SimpleNamespace(target_path=DEMO_BASE, pom_path=pom("1"))
+    dependency = "<dependency><groupId>marco.demo</groupId><artifactId>b</artifactId>" \
+                 "<version>${project.version}</version></dependency>"
+    baseline = template("1", tmp_path, write_pom(tmp_path / "c-1.pom", "1", dependency))
+    candidate = template("3", tmp_path / "candidate", write_pom(tmp_path / "c-3.pom", "3", dependency))
+    assert dynamic.get_selected_tests(base, baseline, candidate) is None
+
+
+def test_audit_returns_missed_regressions():
+    baseline = {TestFailure("a.ATest", "testOld", "a.ATest", "failure")}
+    selected_regression = TestFailure("a.ATest", "testNew", "a.ATest", "failure")
+    missed_regression = TestFailure("b.BTest", "testNew", "b.BTest$Nested", "error")
+    full_run = baseline | {selected_regression, missed_regression}
+    assert audit_selection({"a.ATest"}, baseline, full_run) == {missed_regression}
+    assert audit_selection({"a.ATest", "b.BTest"}, baseline, full_run) == set()
+
+
+def test_missed_regressions_are_reported(monkeypatch):
+    def run_compatibility_checks(g, a, v, cv, **kwargs):
+        return server.CompatibilityResult(g, a, v, cv, True, False,
+                                          missed_regressions=["b.BTest#testNew"] if cv == "2" else [])
+
+    monkeypatch.setattr(server, "get_static_verdicts", lambda *args, **kwargs: {})
+    monkeypatch.setattr(server, "run_compatibility_checks", run_compatibility_checks)
+    base = SimpleNamespace(group_id="marco.demo", artifact_id="c", version="1")
+    report = server.get_compatible_candidates(base, ["2", "3"], strategy=LinearSearch())
+    assert report.missed_regressions == {"2": ["b.BTest#testNew"]}
+    assert report.to_dict()["missed_regressions"] == {"2": ["b.BTest#testNew"]}
@@ -0,0 +1,46 @@
+import os
+import stat
+
+from server.workspace import assemble_workspace
+
+
+def write(path, content: bytes):
+    os.makedirs(path.parent, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def read(path) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_class_files_are_linked_read_only(tmp_path):
+    write(tmp_path / "base" / "test-classes" / "a" / "ATest.class", b"test")
+    write(tmp_path / "cand" / "classes" / "a" / "A.class", b"code")
+    stats = assemble_workspace([tmp_path / "base", tmp_path / "cand"], tmp_path / "workspace")
+    assert stats.linked == 2
+    for relative_path in ["test-classes/a/ATest.class", "classes/a/A.class"]:
+        linked = tmp_path / "workspace" / relative_path
+        assert os.path.samefile(linked, tmp_path / ("base" if "test" in relative_path else "cand") / relative_path)
+        assert not os.stat(linked).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+
+
+def test_rewritten_resources_leave_the_template_intact(tmp_path):
+    template_resource = tmp_path / "base" / "test-classes" / "fixture.json"
+    write(template_resource, b"{}")
+    stats = assemble_workspace([tmp_path / "base"], tmp_path / "workspace")
+    assert stats.linked == 0 and stats.reflinked + stats.copied == 1
+    workspace_resource = tmp_path / "workspace" / "test-classes" / "fixture.json"
+    assert not os.path.samefile(workspace_resource, template_resource)
+    with open(workspace_resource, 'wb') as f:
+        f.write(b"{\"rewritten\": true}")
+    assert read(template_resource) == b"{}"
+
+
+def test_later_layers_override_earlier_ones(tmp_path):
+    write(tmp_path / "base" / "classes" / "a" / "A.class", b"base")
+    write(tmp_path / "cand" / "classes" / "a" / "A.class", b"cand")
+    assemble_workspace([tmp_path / "base", tmp_path / "cand"], tmp_path / "workspace")
+    assert read(tmp_path / "workspace" / "classes" / "a" / "A.class") == b"cand"
+    assert read(tmp_path / "base" / "classes" / "a" / "A.class") == b"base"